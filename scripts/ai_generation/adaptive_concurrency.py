@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Contrôle adaptatif de la concurrence des appels Ollama (AIMD)
+Remplace les constantes MAX_WORKERS / TIMEOUT ajustées à la main
+
+Objectif:
+- Augmentation additive (+1 requête en vol) tant que la fenêtre observée est
+  saine : p95 de latence sous le plafond et taux d'erreur faible
+- Diminution multiplicative (×0.5) sur timeout, erreur 5xx / 429 ou
+  connexion refusée, et quand le p95 dérape
+- Une seule diminution par fenêtre (pas d'effondrement sur une rafale
+  de timeouts issus des mêmes requêtes)
+- Même contrôleur pour les scripts à threads (AdaptiveLimiter) et le moteur
+  asyncio (AsyncOllamaEngine)
+
+Le plafond de latence « sain » est relatif : p95 ≤ latency_tolerance × meilleur
+p95 observé (la latence d'un modèle local croît avec la file d'attente), et
+toujours sous latency_ceiling (typiquement une fraction du timeout).
+
+Le plafond se règle sans toucher au code : --max-concurrency N (scripts sans
+argparse) ou OLLAMA_MAX_CONCURRENCY, sinon la valeur par défaut du script.
+
+Usage:
+    MAX_WORKERS = max_concurrency_from_argv(sys.argv, default=4)
+    limiter = configure_limiter(max_limit=args.max_in_flight, latency_ceiling=TIMEOUT / 2)
+    with ThreadPoolExecutor(max_workers=limiter.controller.max_limit) as executor:
+        ...
+        with get_limiter().slot() as slot:
+            response = requests.post(...)
+            slot.status(response.status_code)
+"""
+
+import asyncio
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Optional, Sequence
+
+try:
+    import requests
+except ImportError:  # requests n'est utilisé que pour classer ses exceptions
+    requests = None
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+DEFAULT_INITIAL_LIMIT = 2
+DEFAULT_MIN_LIMIT = 1
+DEFAULT_MAX_LIMIT = 8
+DECREASE_FACTOR = 0.5
+LATENCY_TOLERANCE = 2.0  # p95 sain ≤ 2 × meilleur p95 observé
+MAX_ERROR_RATE = 0.1  # Au-delà de 10% d'erreurs dans la fenêtre : diminution
+MIN_WINDOW = 4  # Échantillons minimum avant de décider
+
+OVERLOAD = 'overload'
+ERROR = 'error'
+
+def max_concurrency_from_argv(argv: Sequence[str], default: int) -> int:
+    """
+    Plafond de requêtes simultanées pour les scripts sans argparse :
+    --max-concurrency N, sinon OLLAMA_MAX_CONCURRENCY, sinon default.
+    """
+    value = os.getenv("OLLAMA_MAX_CONCURRENCY")
+    if "--max-concurrency" in argv:
+        idx = list(argv).index("--max-concurrency")
+        if idx + 1 < len(argv):
+            value = argv[idx + 1]
+    return max(1, int(value)) if value else default
+
+def classify_error(exc: BaseException) -> str:
+    """
+    OVERLOAD si l'erreur traduit un serveur saturé (timeout, 5xx, 429,
+    connexion refusée), ERROR sinon (réponse invalide, bug...).
+    """
+    if isinstance(exc, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return OVERLOAD
+    if requests is not None and isinstance(
+        exc, (requests.exceptions.Timeout, requests.exceptions.ConnectionError)
+    ):
+        return OVERLOAD
+
+    # ollama.ResponseError, requests.HTTPError, httpx.HTTPStatusError
+    status = getattr(exc, 'status_code', None)
+    response = getattr(exc, 'response', None)
+    if status is None and response is not None:
+        status = getattr(response, 'status_code', None)
+    if isinstance(status, int) and (status >= 500 or status == 429):
+        return OVERLOAD
+
+    # httpx.ReadTimeout, httpx.ConnectError... sans importer httpx
+    name = type(exc).__name__
+    if 'Timeout' in name or 'ConnectError' in name:
+        return OVERLOAD
+
+    return ERROR
+
+# =============================================================================
+# CONTRÔLEUR
+# =============================================================================
+
+class AIMDController:
+    """Limite de concurrence pilotée par les latences et erreurs observées (thread-safe)."""
+
+    def __init__(
+        self,
+        initial_limit: int = DEFAULT_INITIAL_LIMIT,
+        min_limit: int = DEFAULT_MIN_LIMIT,
+        max_limit: int = DEFAULT_MAX_LIMIT,
+        latency_ceiling: Optional[float] = None,
+        latency_tolerance: float = LATENCY_TOLERANCE,
+        max_error_rate: float = MAX_ERROR_RATE,
+        decrease_factor: float = DECREASE_FACTOR
+    ):
+        """
+        Args:
+            initial_limit: Requêtes en vol au démarrage
+            min_limit / max_limit: Bornes de la limite
+            latency_ceiling: p95 maximum absolu (s), None = pas de plafond
+            latency_tolerance: p95 sain ≤ tolérance × meilleur p95 observé
+            max_error_rate: Taux d'erreurs toléré dans une fenêtre
+            decrease_factor: Facteur de diminution multiplicative
+        """
+        if not 1 <= min_limit <= max_limit:
+            raise ValueError("Bornes invalides : 1 ≤ min_limit ≤ max_limit requis")
+
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_ceiling = latency_ceiling
+        self.latency_tolerance = latency_tolerance
+        self.max_error_rate = max_error_rate
+        self.decrease_factor = decrease_factor
+
+        self._limit = float(min(max(initial_limit, min_limit), max_limit))
+        self._lock = threading.Lock()
+        self._latencies: List[float] = []
+        self._errors = 0
+        self._overloaded = False
+        self._best_p95: Optional[float] = None
+
+        # Statistiques pour les rapports
+        self.increases = 0
+        self.decreases = 0
+        self.peak_limit = int(self._limit)
+
+    @property
+    def limit(self) -> int:
+        """Nombre de requêtes autorisées en vol actuellement."""
+        return int(self._limit)
+
+    def _window_size(self) -> int:
+        """Une fenêtre ≈ une « génération » de requêtes à la limite courante."""
+        return max(MIN_WINDOW, self.limit)
+
+    def record(self, latency: float, outcome: Optional[str] = None):
+        """
+        Enregistre une requête terminée.
+
+        Args:
+            latency: Durée de la requête (s)
+            outcome: None (succès), ERROR ou OVERLOAD
+        """
+        with self._lock:
+            if outcome == OVERLOAD and not self._overloaded:
+                # Diminution immédiate, une seule fois par fenêtre
+                self._decrease()
+                self._overloaded = True
+
+            self._latencies.append(latency)
+            if outcome is not None:
+                self._errors += 1
+
+            if len(self._latencies) >= self._window_size():
+                self._evaluate_window()
+
+    def _evaluate_window(self):
+        """Décide +1 ou ×decrease_factor à la fin d'une fenêtre (appelé sous verrou)."""
+        latencies = sorted(self._latencies)
+        p95 = latencies[min(len(latencies) - 1, math.ceil(0.95 * len(latencies)) - 1)]
+        error_rate = self._errors / len(latencies)
+
+        healthy = error_rate <= self.max_error_rate
+        if self.latency_ceiling is not None and p95 > self.latency_ceiling:
+            healthy = False
+        if self._best_p95 is not None and p95 > self._best_p95 * self.latency_tolerance:
+            healthy = False
+
+        if healthy:
+            if self._best_p95 is None or p95 < self._best_p95:
+                self._best_p95 = p95
+            if not self._overloaded:
+                self._increase()
+        elif self.limit == self.min_limit and error_rate <= self.max_error_rate:
+            # Déjà au minimum : la latence de référence a changé (prompts plus longs...)
+            self._best_p95 = p95
+        elif not self._overloaded:
+            self._decrease()
+
+        self._latencies = []
+        self._errors = 0
+        self._overloaded = False
+
+    def _increase(self):
+        if self._limit < self.max_limit:
+            self._limit = min(self.max_limit, self._limit + 1)
+            self.increases += 1
+            self.peak_limit = max(self.peak_limit, self.limit)
+
+    def _decrease(self):
+        if self._limit > self.min_limit:
+            self._limit = max(self.min_limit, math.floor(self._limit * self.decrease_factor))
+            self.decreases += 1
+
+    def summary(self) -> str:
+        """Résumé lisible pour les rapports de fin de script."""
+        best = f", meilleur p95 {self._best_p95:.1f}s" if self._best_p95 is not None else ""
+        return (f"limite {self.limit} (pic {self.peak_limit}, bornes {self.min_limit}-{self.max_limit}), "
+                f"{self.increases} hausses / {self.decreases} baisses{best}")
+
+# =============================================================================
+# LIMITEUR (THREADS)
+# =============================================================================
+
+class SlotOutcome:
+    """Issue d'un appel, renseignée dans le bloc `with limiter.slot()`."""
+
+    def __init__(self):
+        self.kind: Optional[str] = None
+
+    def status(self, status_code: int):
+        """Classe un code HTTP (5xx / 429 = surcharge, 4xx = erreur)."""
+        if status_code >= 500 or status_code == 429:
+            self.kind = OVERLOAD
+        elif status_code >= 400:
+            self.kind = ERROR
+
+    def error(self, exc: Optional[BaseException] = None):
+        """Marque l'appel en échec (réponse inexploitable si exc est None)."""
+        self.kind = classify_error(exc) if exc is not None else ERROR
+
+class AdaptiveLimiter:
+    """Porte d'entrée bloquante pour les threads, bornée par AIMDController."""
+
+    def __init__(self, controller: AIMDController):
+        self.controller = controller
+        self._in_flight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            self._cond.wait_for(lambda: self._in_flight < self.controller.limit)
+            self._in_flight += 1
+
+    def release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self):
+        """
+        Exécute un appel sous la limite courante et en mesure la latence.
+
+        Une exception levée dans le bloc est classée automatiquement
+        (classify_error) puis propagée.
+        """
+        self.acquire()
+        outcome = SlotOutcome()
+        start = time.monotonic()
+        try:
+            yield outcome
+        except Exception as e:
+            outcome.error(e)
+            raise
+        finally:
+            # Enregistré avant release() : les threads réveillés voient la nouvelle limite
+            self.controller.record(time.monotonic() - start, outcome.kind)
+            self.release()
+
+# =============================================================================
+# INSTANCE PARTAGÉE
+# =============================================================================
+
+_limiter: Optional[AdaptiveLimiter] = None
+
+def configure_limiter(adaptive: bool = True, max_limit: int = DEFAULT_MAX_LIMIT,
+                      initial_limit: int = DEFAULT_INITIAL_LIMIT,
+                      latency_ceiling: Optional[float] = None) -> AdaptiveLimiter:
+    """
+    (Re)configure le limiteur partagé du processus (appelé depuis main).
+
+    adaptive=False fige la limite à max_limit (ancien comportement).
+    """
+    global _limiter
+    if adaptive:
+        controller = AIMDController(initial_limit=initial_limit, max_limit=max_limit,
+                                    latency_ceiling=latency_ceiling)
+    else:
+        controller = AIMDController(initial_limit=max_limit, min_limit=max_limit,
+                                    max_limit=max_limit)
+    _limiter = AdaptiveLimiter(controller)
+    return _limiter
+
+def get_limiter() -> AdaptiveLimiter:
+    """Limiteur partagé, configuré avec les valeurs par défaut si besoin."""
+    global _limiter
+    if _limiter is None:
+        _limiter = AdaptiveLimiter(AIMDController())
+    return _limiter
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Backends d'inférence CPU pour l'encodeur BioBERT (token CLS)
+Utilisé par biobert_client.BioBERTScorer
+
+Objectif:
+- torch     : PyTorch fp32 (référence)
+- int8      : quantification dynamique int8 des couches Linear (PyTorch)
+- onnx      : export ONNX unique puis ONNX Runtime fp32
+- onnx-int8 : export ONNX + quantification dynamique int8 (ONNX Runtime)
+- Les exports ONNX sont faits une seule fois par révision des poids
+  (cache/biobert/, révision dans le nom du fichier), les runs suivants ne
+  chargent plus le modèle PyTorch ; un modèle mis à jour est réexporté
+- Écart de score à vérifier avec biobert_client.py --calibrate N (référence
+  fp32 chargée depuis les mêmes poids que l'export)
+
+Usage:
+    encoder = load_encoder("dmis-lab/biobert-base-cased-v1.1", backend="onnx-int8")
+    cls = encoder(tokenizer.pad(features, return_tensors="pt"))  # np.ndarray (n, hidden)
+"""
+
+import hashlib
+import os
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+import torch
+from transformers import AutoConfig, AutoModel
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+BACKENDS = ("torch", "int8", "onnx", "onnx-int8")
+DEFAULT_BACKEND = os.getenv("BIOBERT_BACKEND", "torch")
+DEFAULT_EXPORT_DIR = Path(os.getenv("BIOBERT_CACHE_DIR", "cache/biobert"))
+ONNX_OPSET = 17
+ONNX_INPUTS = ["input_ids", "attention_mask", "token_type_ids"]
+WEIGHT_FILES = ("model.safetensors", "pytorch_model.bin")
+
+# =============================================================================
+# ENCODEURS
+# =============================================================================
+
+class CLSHead(torch.nn.Module):
+    """Encodeur réduit à la sortie utile : état caché du token CLS."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask, token_type_ids):
+        outputs = self.model(input_ids=input_ids, attention_mask=attention_mask,
+                             token_type_ids=token_type_ids)
+        return outputs.last_hidden_state[:, 0, :]
+
+# =============================================================================
+# RÉVISION DES POIDS
+# =============================================================================
+
+def files_digest(model_dir: Path) -> Optional[str]:
+    """Empreinte de config.json et du fichier de poids d'un dossier de modèle."""
+    config_path = model_dir / "config.json"
+    if not config_path.exists():
+        return None
+    
+    digest = hashlib.sha256(config_path.read_bytes())
+    for name in WEIGHT_FILES:
+        weights_path = model_dir / name
+        if weights_path.exists():
+            with open(weights_path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(block)
+            break
+    return f"sha256:{digest.hexdigest()[:16]}"
+
+def model_revision(model_name: str) -> str:
+    """
+    Révision des poids chargés (clé du cache des centroïdes).
+    
+    Commit du snapshot en cache du hub (ref main) pour un modèle du hub,
+    sinon empreinte de config.json et des poids (dossier local, cache sans
+    snapshot). 'local' si rien n'est trouvé.
+    """
+    local_dir = Path(model_name)
+    if local_dir.is_dir():
+        return files_digest(local_dir) or "local"
+    
+    from huggingface_hub import try_to_load_from_cache
+    cached = try_to_load_from_cache(model_name, "config.json")
+    if not isinstance(cached, str):
+        return "local"
+    
+    snapshot_dir = Path(cached).parent  # .../snapshots/<commit>/config.json
+    if snapshot_dir.parent.name == "snapshots":
+        return snapshot_dir.name
+    return files_digest(snapshot_dir) or "local"
+
+class TorchEncoder:
+    """Encodeur PyTorch (fp32 ou quantifié int8 dynamique)."""
+    
+    def __init__(self, model, backend: str, revision: str):
+        self.backend = backend
+        self.hidden_size = model.config.hidden_size
+        self.revision = revision
+        self.model = model
+
+    def __call__(self, inputs: Dict[str, torch.Tensor]) -> np.ndarray:
+        with torch.inference_mode():
+            outputs = self.model(**inputs)
+        return outputs.last_hidden_state[:, 0, :].float().numpy()
+
+class OnnxEncoder:
+    """Encodeur ONNX Runtime (session CPU)."""
+
+    def __init__(self, path: Path, config, backend: str, num_threads: int, revision: str):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise ImportError(f"Backend {backend} : installez onnxruntime (pip install onnxruntime)")
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = num_threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(str(path), options, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+        self.backend = backend
+        self.hidden_size = config.hidden_size
+        self.revision = revision
+
+    def __call__(self, inputs: Dict[str, torch.Tensor]) -> np.ndarray:
+        feed = {}
+        for name in self.input_names:
+            value = inputs.get(name)
+            if value is None:  # Tokenizer sans token_type_ids
+                value = torch.zeros_like(inputs["input_ids"])
+            feed[name] = value.numpy().astype(np.int64)
+        return self.session.run(None, feed)[0]
+
+# =============================================================================
+# EXPORT ONNX
+# =============================================================================
+
+def export_path(model_name: str, backend: str, revision: str,
+                export_dir: Path = DEFAULT_EXPORT_DIR) -> Path:
+    """Fichier ONNX d'un modèle pour un backend (onnx ou onnx-int8) et une révision des poids."""
+    suffix = "-int8" if backend == "onnx-int8" else ""
+    return Path(export_dir) / f"{model_name.replace('/', '__')}@{revision.replace(':', '-')}{suffix}.onnx"
+
+def prune_exports(model_name: str, backend: str, keep: Path,
+                  export_dir: Path = DEFAULT_EXPORT_DIR):
+    """Supprime les exports du backend construits pour d'autres révisions."""
+    suffix = "-int8" if backend == "onnx-int8" else ""
+    pattern = f"{model_name.replace('/', '__')}@*{suffix}.onnx"
+    for path in Path(export_dir).glob(pattern):
+        if path != keep and path.stem.endswith("-int8") == bool(suffix) and ".tmp" not in path.suffixes:
+            try:
+                path.unlink()
+            except OSError:
+                continue
+
+def export_onnx(model, path: Path):
+    """Exporte l'encodeur (sortie CLS, axes batch/séquence dynamiques)."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    dummy = torch.ones((2, 8), dtype=torch.long)
+    tmp_path = path.with_name(f"{path.stem}.{os.getpid()}.tmp.onnx")
+
+    with torch.inference_mode():
+        torch.onnx.export(
+            CLSHead(model).eval(),
+            (dummy, dummy, torch.zeros_like(dummy)),
+            str(tmp_path),
+            input_names=ONNX_INPUTS,
+            output_names=["cls"],
+            dynamic_axes={**{name: {0: "batch", 1: "sequence"} for name in ONNX_INPUTS},
+                          "cls": {0: "batch"}},
+            opset_version=ONNX_OPSET,
+            dynamo=False
+        )
+    os.replace(tmp_path, path)
+
+def quantize_onnx(source: Path, path: Path):
+    """Quantification dynamique int8 (poids) d'un export ONNX."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    tmp_path = path.with_name(f"{path.stem}.{os.getpid()}.tmp.onnx")
+    quantize_dynamic(str(source), str(tmp_path), weight_type=QuantType.QInt8)
+    os.replace(tmp_path, path)
+
+def ensure_export(model_name: str, backend: str, revision: Optional[str] = None,
+                  export_dir: Path = DEFAULT_EXPORT_DIR) -> Path:
+    """
+    Fichier ONNX du backend pour la révision actuelle des poids, exporté (et
+    quantifié) s'il n'existe pas encore ; les exports d'autres révisions sont
+    supprimés.
+    """
+    revision = revision or model_revision(model_name)
+    path = export_path(model_name, backend, revision, export_dir)
+    if path.exists():
+        return path
+    
+    fp32_path = export_path(model_name, "onnx", revision, export_dir)
+    if not fp32_path.exists():
+        print(f"   📦 Export ONNX de {model_name} (révision {revision}) → {fp32_path}")
+        model = AutoModel.from_pretrained(model_name)
+        export_onnx(model.eval(), fp32_path)
+        del model
+        prune_exports(model_name, "onnx", fp32_path, export_dir)
+    if backend == "onnx-int8":
+        print(f"   📦 Quantification int8 → {path}")
+        quantize_onnx(fp32_path, path)
+        prune_exports(model_name, backend, path, export_dir)
+    return path
+
+# =============================================================================
+# CHARGEMENT
+# =============================================================================
+
+def load_encoder(model_name: str, backend: str = DEFAULT_BACKEND, num_threads: int = 1,
+                 export_dir: Path = DEFAULT_EXPORT_DIR):
+    """
+    Charge l'encodeur CLS pour le backend demandé (export ONNX au premier appel).
+
+    Raises:
+        ValueError si le backend est inconnu
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend BioBERT inconnu : {backend} (attendu : {', '.join(BACKENDS)})")
+
+    if backend in ("torch", "int8"):
+        model = AutoModel.from_pretrained(model_name)
+        model.eval()  # Mode évaluation
+        if backend == "int8":
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return TorchEncoder(model, backend, model_revision(model_name))
+    
+    revision = model_revision(model_name)
+    path = ensure_export(model_name, backend, revision, export_dir)
+    config = AutoConfig.from_pretrained(model_name)
+    return OnnxEncoder(path, config, backend, num_threads, revision)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Cache disque des centroïdes biomédicaux BioBERT
+Utilisé par biobert_client.BioBERTScorer (et tout outil qui score par module)
+
+Objectif:
+- Ne plus réencoder les BIOMEDICAL_SEEDS à chaque démarrage
+- Clé = sha1(seeds, modèle, révision du modèle, backend) : les centroïdes ne
+  sont recalculés que si l'un d'eux change
+- Un fichier .npz par clé dans cache/biobert/ (écriture atomique)
+- Contournement : BIOBERT_CENTROIDS_CACHE=off
+
+Usage:
+    key = centroids_key(BIOMEDICAL_SEEDS, MODEL_NAME, revision, backend)
+    centroids = load_centroids(key)      # None si absent
+    if centroids is None:
+        centroids = ...calcul...
+        save_centroids(key, centroids)
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+DEFAULT_CENTROIDS_DIR = Path(os.getenv("BIOBERT_CACHE_DIR", "cache/biobert"))
+
+def centroids_cache_disabled_by_env() -> bool:
+    """True si BIOBERT_CENTROIDS_CACHE=off (ou 0/false/no) dans l'environnement."""
+    return os.getenv("BIOBERT_CENTROIDS_CACHE", "on").strip().lower() in ("0", "off", "false", "no")
+
+def centroids_key(seeds: Dict[str, List[str]], model_name: str,
+                  revision: Optional[str], backend: str) -> str:
+    """Empreinte des seeds et du modèle qui a produit les centroïdes."""
+    payload = json.dumps({
+        'seeds': seeds,
+        'model': model_name,
+        'revision': revision,
+        'backend': backend
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+def centroids_path(key: str, cache_dir: Path = DEFAULT_CENTROIDS_DIR) -> Path:
+    return Path(cache_dir) / f"centroids-{key[:16]}.npz"
+
+# =============================================================================
+# LECTURE / ÉCRITURE
+# =============================================================================
+
+def load_centroids(key: str, cache_dir: Path = DEFAULT_CENTROIDS_DIR) -> Optional[Dict[str, np.ndarray]]:
+    """Centroïdes en cache pour cette clé, None si absents ou illisibles."""
+    if centroids_cache_disabled_by_env():
+        return None
+
+    path = centroids_path(key, cache_dir)
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            if str(data['key']) != key:
+                return None
+            return dict(zip(data['module_ids'].tolist(), data['centroids']))
+    except (OSError, KeyError, ValueError):
+        return None
+
+def save_centroids(key: str, centroids: Dict[str, np.ndarray],
+                   cache_dir: Path = DEFAULT_CENTROIDS_DIR) -> Optional[Path]:
+    """Enregistre les centroïdes (écriture atomique) ; chemin du fichier."""
+    if centroids_cache_disabled_by_env() or not centroids:
+        return None
+
+    path = centroids_path(key, cache_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.stem}.{os.getpid()}.tmp.npz")
+
+    module_ids = list(centroids)
+    np.savez(tmp_path, key=np.array(key), module_ids=np.array(module_ids),
+             centroids=np.stack([centroids[m] for m in module_ids]).astype(np.float32))
+    os.replace(tmp_path, path)
+    return path
@@ -8,29 +8,56 @@ Objectif:
 - Comparer avec centroïdes biomédicaux par module
 - Appliquer seuils adaptatifs (0.05-0.10 selon module)
 - Filtrer questions non biomédicalement cohérentes
+- Modèle servi par le démon d'embeddings s'il tourne (embedding_daemon.py)
 
 Usage:
     python scripts/ai_generation/biobert_client.py \
            --in generated_raw.json \
            --out generated_biobert.json \
-           --metadata src/data/metadata.json
+           --metadata src/data/metadata.json \
+           [--batch-size 32] [--threads N] \
+           [--backend torch|int8|onnx|onnx-int8] [--calibrate 64] [--workers N]
 """
 
 import argparse
 import json
+import math
+import multiprocessing
+import os
+import random
+import sys
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple
 from datetime import datetime
 
 try:
-    from transformers import AutoTokenizer, AutoModel
+    from transformers import AutoTokenizer
     import torch
     from tqdm import tqdm
 except ImportError:
     print("❌ Dépendances manquantes. Installez: pip install transformers torch tqdm")
     exit(1)
 
+# Ajoute le chemin pour importer les modules partagés
+sys.path.append(str(Path(__file__).parent.parent))
+
+from ai_generation.biobert_backends import BACKENDS, DEFAULT_BACKEND, ensure_export, load_encoder, model_revision
+from ai_generation.biobert_centroids import centroids_key, load_centroids, save_centroids
+from ai_generation.embedding_daemon import DaemonUnavailable, connect_encoder
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+MODEL_NAME = "dmis-lab/biobert-base-cased-v1.1"
+MAX_LENGTH = 512  # Tokens maximum par texte (limite BERT)
+BATCH_SIZE = 32  # Textes par passe du modèle
+NUM_THREADS = int(os.getenv("BIOBERT_THREADS", "0"))  # 0 = tous les cœurs
+CALIBRATION_SAMPLE = 64  # Questions rescorées en fp32 par --calibrate
+SHARDS_PER_WORKER = 4  # Shards par processus (équilibrage de charge)
+
 # =============================================================================
 # SEED SENTENCES BIOMÉDICALES (centroïdes par module)
 # =============================================================================
@@ -135,44 +162,110 @@ BIOMEDICAL_SEEDS = {
 class BioBERTScorer:
     """Client BioBERT pour calcul de scores biomédicaux."""
     
-    def __init__(self):
-        """Initialise le modèle BioBERT."""
-        print("🔧 Chargement BioBERT...")
-        self.tokenizer = AutoTokenizer.from_pretrained("dmis-lab/biobert-base-cased-v1.1")
-        self.model = AutoModel.from_pretrained("dmis-lab/biobert-base-cased-v1.1")
-        self.model.eval()  # Mode évaluation
-        print("   ✓ BioBERT chargé")
+    def __init__(self, batch_size: int = BATCH_SIZE, num_threads: int = NUM_THREADS,
+                 backend: str = DEFAULT_BACKEND, use_daemon: bool = True):
+        """
+        Initialise le modèle BioBERT.
         
-        # Pré-calcul des centroïdes par module
-        print("🔧 Calcul des centroïdes biomédicaux par module...")
-        self.centroids = self._compute_centroids()
-        print(f"   ✓ {len(self.centroids)} centroïdes calculés")
+        Args:
+            batch_size: Textes par passe du modèle
+            num_threads: Threads intra-op de torch (0 = tous les cœurs)
+            backend: Backend d'inférence (torch, int8, onnx, onnx-int8)
+            use_daemon: Passe par le démon d'embeddings s'il tourne
+        """
+        self.batch_size = batch_size
+        self.backend = backend
+        self.tokenizer = None
+        self.encoder = None
+        torch.set_num_threads(num_threads or os.cpu_count() or 1)
+        
+        # Modèle déjà chargé dans le démon d'embeddings, sinon chargement local
+        self.remote = connect_encoder("biobert", MODEL_NAME, backend=backend) if use_daemon else None
+        if self.remote is not None:
+            print(f"🔌 BioBERT servi par le démon d'embeddings (backend {backend})")
+            self.hidden_size = self.remote.info["dim"]
+            self.revision = self.remote.info["revision"]
+        else:
+            self._load_local()
+        
+        # Centroïdes par module (cache disque, recalculés si seeds ou modèle changent)
+        key = centroids_key(BIOMEDICAL_SEEDS, MODEL_NAME, self.revision, backend)
+        self.centroids = load_centroids(key)
+        if self.centroids is not None:
+            print(f"   ✓ {len(self.centroids)} centroïdes chargés depuis le cache")
+        else:
+            print("🔧 Calcul des centroïdes biomédicaux par module...")
+            self.centroids = self._compute_centroids()
+            save_centroids(key, self.centroids)
+            print(f"   ✓ {len(self.centroids)} centroïdes calculés")
     
-    def _get_embedding(self, text: str) -> np.ndarray:
-        """Calcule l'embedding BioBERT d'un texte."""
-        inputs = self.tokenizer(
-            text, 
-            return_tensors="pt", 
-            padding=True, 
-            truncation=True, 
-            max_length=512
-        )
+    def _load_local(self):
+        """Charge tokenizer et encodeur dans le processus."""
+        print(f"🔧 Chargement BioBERT (backend {self.backend})...")
+        self.tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+        self.encoder = load_encoder(MODEL_NAME, self.backend, num_threads=torch.get_num_threads())
+        self.hidden_size = self.encoder.hidden_size
+        self.revision = self.encoder.revision
+        print(f"   ✓ BioBERT chargé ({torch.get_num_threads()} threads, batchs de {self.batch_size})")
+    
+    def _get_embeddings(self, texts: List[str], show_progress: bool = False) -> np.ndarray:
+        """
+        Calcule les embeddings BioBERT (token CLS) d'une liste de textes.
+        
+        Textes triés par longueur en tokens puis découpés en batchs : chaque
+        batch n'est paddé qu'à la longueur de son plus long texte.
         
-        with torch.no_grad():
-            outputs = self.model(**inputs)
+        Returns:
+            np.ndarray (len(texts), hidden_size), dans l'ordre des textes
+        """
+        if not texts:
+            return np.zeros((0, self.hidden_size), dtype=np.float32)
         
-        # CLS token embedding
-        embedding = outputs.last_hidden_state[:, 0, :].numpy().flatten()
-        return embedding
+        if self.remote is not None:
+            try:
+                return self.remote.encode(texts, show_progress=show_progress)
+            except DaemonUnavailable as e:
+                print(f"   ⚠️  {e} — chargement local")
+                self.remote = None
+                self._load_local()
+        
+        # Tokenisation unique, sans padding
+        encodings = self.tokenizer(list(texts), truncation=True, max_length=MAX_LENGTH)
+        keys = list(encodings.keys())
+        order = np.argsort([len(ids) for ids in encodings['input_ids']], kind='stable')
+        
+        embeddings = np.zeros((len(texts), self.hidden_size), dtype=np.float32)
+        batches = range(0, len(order), self.batch_size)
+        if show_progress:
+            batches = tqdm(batches, desc="Scoring BioBERT", unit="batch")
+        
+        for start in batches:
+            indices = order[start:start + self.batch_size]
+            inputs = self.tokenizer.pad(
+                [{k: encodings[k][i] for k in keys} for i in indices],
+                return_tensors="pt"
+            )
+            
+            # CLS token embedding (inference_mode dans l'encodeur)
+            embeddings[indices] = self.encoder(inputs)
+        
+        return embeddings
+    
+    def _get_embedding(self, text: str) -> np.ndarray:
+        """Calcule l'embedding BioBERT d'un texte."""
+        return self._get_embeddings([text])[0]
     
     def _compute_centroids(self) -> Dict[str, np.ndarray]:
         """Calcule les centroïdes (embeddings moyens) pour chaque module."""
-        centroids = {}
+        # Toutes les seeds en une seule série de batchs
+        seeds = [(module_id, seed) for module_id, module_seeds in BIOMEDICAL_SEEDS.items()
+                 for seed in module_seeds]
+        embeddings = self._get_embeddings([seed for _, seed in seeds])
         
-        for module_id, seeds in BIOMEDICAL_SEEDS.items():
-            embeddings = [self._get_embedding(seed) for seed in seeds]
-            centroid = np.mean(embeddings, axis=0)
-            centroids[module_id] = centroid
+        centroids = {}
+        module_ids = np.array([module_id for module_id, _ in seeds])
+        for module_id in BIOMEDICAL_SEEDS:
+            centroids[module_id] = embeddings[module_ids == module_id].mean(axis=0)
         
         return centroids
     
@@ -199,6 +292,107 @@ class BioBERTScorer:
         )
         
         return float(similarity)
+    
+    def compute_biomedical_scores(self, texts: List[str], module_ids: List[str],
+                                  show_progress: bool = True) -> np.ndarray:
+        """
+        Version batchée de compute_biomedical_score.
+        
+        Returns:
+            np.ndarray (len(texts),) de similarités cosinus
+        """
+        if not texts:
+            return np.zeros(0, dtype=np.float32)
+        
+        text_embeddings = self._get_embeddings(texts, show_progress=show_progress)
+        
+        # Centroïde de chaque texte (fallback sur 'unknown')
+        fallback = self.centroids.get('unknown')
+        centroids = np.stack([self.centroids.get(m, fallback) for m in module_ids])
+        
+        # Cosine similarity ligne à ligne
+        dots = np.einsum('ij,ij->i', text_embeddings, centroids)
+        norms = np.linalg.norm(text_embeddings, axis=1) * np.linalg.norm(centroids, axis=1)
+        return dots / np.maximum(norms, 1e-12)
+
+# =============================================================================
+# SCORING MULTI-PROCESSUS
+# =============================================================================
+
+_worker_scorer: Optional[BioBERTScorer] = None
+
+def _init_worker(batch_size: int, num_threads: int, backend: str):
+    """Charge le modèle une fois par processus worker."""
+    global _worker_scorer
+    _worker_scorer = BioBERTScorer(batch_size=batch_size, num_threads=num_threads, backend=backend,
+                                   use_daemon=False)
+
+def _score_shard(texts: List[str], module_ids: List[str]) -> np.ndarray:
+    return _worker_scorer.compute_biomedical_scores(texts, module_ids, show_progress=False)
+
+class ShardedBioBERTScorer:
+    """
+    Même interface que BioBERTScorer, scoring réparti sur plusieurs processus.
+    
+    Chaque worker charge son modèle une fois ; les threads torch sont répartis
+    entre workers pour ne pas surcharger les cœurs.
+    """
+    
+    def __init__(self, workers: int, batch_size: int = BATCH_SIZE,
+                 num_threads: int = NUM_THREADS, backend: str = DEFAULT_BACKEND):
+        """
+        Args:
+            workers: Nombre de processus
+            num_threads: Threads torch au total (0 = tous les cœurs), divisés entre workers
+        """
+        self.workers = workers
+        self.batch_size = batch_size
+        self.backend = backend
+        self.revision = model_revision(MODEL_NAME)
+        threads_per_worker = max(1, (num_threads or os.cpu_count() or 1) // workers)
+        
+        # Export ONNX fait ici, une fois, plutôt que par chaque worker
+        if backend.startswith("onnx"):
+            ensure_export(MODEL_NAME, backend, self.revision)
+
+        print(f"🔧 Démarrage de {workers} workers BioBERT ({threads_per_worker} threads chacun)...")
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),  # Pas de fork d'un runtime torch
+            initializer=_init_worker,
+            initargs=(batch_size, threads_per_worker, backend)
+        )
+    
+    def compute_biomedical_scores(self, texts: List[str], module_ids: List[str],
+                                  show_progress: bool = True) -> np.ndarray:
+        """Scores répartis en shards sur les workers, dans l'ordre des textes."""
+        scores = np.zeros(len(texts), dtype=np.float32)
+        if not texts:
+            return scores
+        
+        shard_size = math.ceil(len(texts) / (self.workers * SHARDS_PER_WORKER))
+        futures = {
+            self.executor.submit(_score_shard, texts[start:start + shard_size],
+                                 module_ids[start:start + shard_size]): start
+            for start in range(0, len(texts), shard_size)
+        }
+        
+        completed = as_completed(futures)
+        if show_progress:
+            completed = tqdm(completed, total=len(futures), desc="Scoring BioBERT", unit="shard")
+        
+        for future in completed:
+            start = futures[future]
+            shard_scores = future.result()
+            scores[start:start + len(shard_scores)] = shard_scores
+        
+        return scores
+    
+    def compute_biomedical_score(self, text: str, module_id: str) -> float:
+        return float(self.compute_biomedical_scores([text], [module_id], show_progress=False)[0])
+    
+    def close(self):
+        self.executor.shutdown()
 
 # =============================================================================
 # VALIDATION BIOMÉDICALE
@@ -226,14 +420,18 @@ def score_questions(
         'by_module': {}
     }
     
-    for question in tqdm(questions, desc="Scoring BioBERT"):
-        module_id = question.get('module_id', 'unknown')
-        
-        # Texte à scorer : question + explication
-        text_to_score = f"{question.get('text', '')} {question.get('explanation', '')}"
-        
-        # Calcul score
-        score = scorer.compute_biomedical_score(text_to_score, module_id)
+    # Texte à scorer : question + explication
+    texts_to_score = [
+        f"{question.get('text', '')} {question.get('explanation', '')}"
+        for question in questions
+    ]
+    module_ids = [question.get('module_id', 'unknown') for question in questions]
+    
+    # Calcul scores (inférence batchée)
+    scores = scorer.compute_biomedical_scores(texts_to_score, module_ids)
+    
+    for question, module_id, score in zip(questions, module_ids, scores):
+        score = float(score)
         
         # Récupère seuil pour ce module
         threshold = thresholds.get(module_id, 0.05)
@@ -273,6 +471,61 @@ def score_questions(
     
     return scored_questions, stats
 
+def calibrate_backend(
+    questions: List[Dict],
+    scorer: BioBERTScorer,
+    thresholds: Dict[str, float],
+    sample_size: int = CALIBRATION_SAMPLE
+) -> Dict:
+    """
+    Mesure l'écart des biomedical_score du backend par rapport au fp32.
+    
+    Un échantillon de questions (déjà scorées par `scorer`) est rescoré avec
+    le backend torch fp32 de référence, chargé dans le processus (pas via le
+    démon). Les exports ONNX étant construits par révision des poids, la
+    référence porte sur les mêmes poids que le graphe utilisé ; si les
+    révisions diffèrent malgré tout, l'écart mesuré n'est pas significatif
+    et le rapport le signale.
+    
+    Returns:
+        Rapport : écarts moyen / max et décisions (passe / rejet) inversées
+    """
+    sample = random.Random(0).sample(questions, min(sample_size, len(questions)))
+    if not sample:
+        return {}
+    
+    print(f"\n📏 Calibration {scorer.backend} vs fp32 sur {len(sample)} questions...")
+    baseline = BioBERTScorer(batch_size=scorer.batch_size, num_threads=torch.get_num_threads(),
+                             backend="torch", use_daemon=False)
+    if baseline.revision != scorer.revision:
+        print(f"   ⚠️  Révisions différentes : {scorer.backend} = {scorer.revision}, "
+              f"fp32 = {baseline.revision} (calibration non significative)")
+    reference = baseline.compute_biomedical_scores(
+        [f"{q.get('text', '')} {q.get('explanation', '')}" for q in sample],
+        [q.get('module_id', 'unknown') for q in sample]
+    )
+    scores = np.array([q['biomedical_score'] for q in sample])
+    drift = np.abs(scores - reference)
+    
+    flipped = sum(
+        1 for q, ref in zip(sample, reference)
+        if (q['biomedical_score'] >= thresholds.get(q.get('module_id', 'unknown'), 0.05))
+        != (ref >= thresholds.get(q.get('module_id', 'unknown'), 0.05))
+    )
+    
+    report = {
+        'backend': scorer.backend,
+        'revision': scorer.revision,
+        'reference_revision': baseline.revision,
+        'sample_size': len(sample),
+        'mean_drift': round(float(drift.mean()), 5),
+        'max_drift': round(float(drift.max()), 5),
+        'flipped_decisions': flipped
+    }
+    print(f"   Écart moyen : {report['mean_drift']:.5f} | max : {report['max_drift']:.5f} | "
+          f"décisions inversées : {flipped}/{len(sample)}")
+    return report
+
 # =============================================================================
 # MAIN
 # =============================================================================
@@ -282,6 +535,14 @@ def main():
     parser.add_argument('--in', dest='input_file', required=True, help='Fichier questions générées')
     parser.add_argument('--out', required=True, help='Fichier questions scorées de sortie')
     parser.add_argument('--metadata', required=True, help='Fichier metadata.json (seuils adaptatifs)')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Textes par passe BioBERT')
+    parser.add_argument('--threads', type=int, default=NUM_THREADS, help='Threads torch (0 = tous les cœurs)')
+    parser.add_argument('--backend', choices=BACKENDS, default=DEFAULT_BACKEND,
+                        help='Backend d\'inférence (int8 / onnx : CPU plus rapide, moins de mémoire)')
+    parser.add_argument('--calibrate', type=int, nargs='?', const=CALIBRATION_SAMPLE, default=0,
+                        help='Compare N scores au fp32 (écart du backend)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Processus de scoring (threads répartis entre eux)')
     
     args = parser.parse_args()
     
@@ -305,11 +566,22 @@ def main():
     questions = data.get('questions', []) if isinstance(data, dict) else data
     print(f"   ✓ {len(questions)} questions chargées")
     
-    # Initialise scorer BioBERT
-    scorer = BioBERTScorer()
+    # Initialise scorer BioBERT (un modèle par worker si --workers > 1)
+    if args.workers > 1:
+        scorer = ShardedBioBERTScorer(args.workers, batch_size=args.batch_size,
+                                      num_threads=args.threads, backend=args.backend)
+    else:
+        scorer = BioBERTScorer(batch_size=args.batch_size, num_threads=args.threads,
+                               backend=args.backend)
     
-    # Scoring
+    # Scoring (stats par module calculées sur les scores fusionnés)
     scored_questions, stats = score_questions(questions, scorer, thresholds)
+    if args.workers > 1:
+        scorer.close()
+    
+    # Écart du backend par rapport au fp32
+    if args.calibrate and args.backend != 'torch':
+        stats['calibration'] = calibrate_backend(scored_questions, scorer, thresholds, args.calibrate)
     
     # Affichage résultats
     print(f"\n{'='*60}")
@@ -3,20 +3,42 @@
 """
 CLASSIFICATION IA DES MODULES
 Utilise Ollama/Mistral pour classifier les questions "unknown" restantes
+
+Plusieurs questions par prompt (réponse JSON {"1": "module", ...}),
+prompts envoyés en parallèle, résultats réécrits via un index par id.
+
+Options:
+    --batch-size N       Questions par prompt (défaut: BATCH_SIZE, 1 = une par prompt)
+    --no-cache           Ignore le cache des réponses LLM
+    --fixed-concurrency  Toujours MAX_WORKERS requêtes en vol (pas d'AIMD)
+    --max-concurrency N  Plafond de requêtes en vol (défaut: OLLAMA_MAX_CONCURRENCY ou 4)
+    --ollama-hosts H1,H2 Instances Ollama (défaut: OLLAMA_HOSTS / OLLAMA_HOST)
 """
 
 import json
 import requests
+import sys
 from pathlib import Path
 from collections import Counter
-import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Ajoute le chemin pour importer les modules partagés
+sys.path.append(str(Path(__file__).parent.parent))
+
+from ai_generation.llm_cache import configure_cache, get_cache
+from ai_generation.adaptive_concurrency import configure_limiter, get_limiter, max_concurrency_from_argv
+from ai_generation.ollama_pool import configure_pool, get_pool, hosts_from_argv
+from ai_generation.retry_policy import InvalidResponse, configure_retry, get_retry
 
 # Configuration
 INPUT = Path("src/data/questions/compiled_reclassified.json")
 OUTPUT = Path("src/data/questions/compiled_fully_classified.json")
-OLLAMA_URL = "http://localhost:11434/api/generate"
+OLLAMA_URL = "/api/generate"  # Chemin résolu sur une instance du pool (--ollama-hosts)
 MODEL = "mistral:latest"
 TIMEOUT = 30
+MAX_WORKERS = max_concurrency_from_argv(sys.argv, default=4)  # Plafond de requêtes simultanées (limite adaptative en dessous)
+BATCH_SIZE = 8  # Questions classifiées par prompt
+BATCH_TIMEOUT = 90  # Une réponse groupée est plus longue à générer
 
 # Modules valides
 MODULES = [
@@ -54,6 +76,39 @@ Si vraiment impossible à classifier, réponds "unknown".
 
 MODULE:"""
 
+BATCH_CLASSIFICATION_PROMPT = """Tu es un expert en médecine d'anesthésie-réanimation IADE.
+
+Analyse ces questions de QCM numérotées et détermine pour chacune à quel module thématique elle appartient.
+
+{questions}
+
+MODULES POSSIBLES:
+- cardio: Cardiologie, hémodynamique, ECG, choc cardiogénique
+- respiratoire: Physiologie respiratoire, PaO2, SpO2, poumons
+- neuro: Neurologie, Glasgow, PIC, sédation, conscience
+- bases_physio: Homéostasie, équilibre acide-base, ions, pH
+- pharma_opioides: Morphine, fentanyl, sufentanil, analgésie opioïde
+- douleur: Analgésie générale, EVA, paliers OMS, blocs
+- reanimation: Choc, catécholamines, remplissage, SDRA
+- infectio: Infections, antibiotiques, sepsis, asepsie
+- transfusion: Sang, plaquettes, hémoglobine, coagulation
+- ventilation: Intubation, ventilation mécanique, PEEP, modes
+- monitorage: Capnographie, SpO2, monitoring, cathéters
+- pediatrie: Enfants, nouveau-nés, dosages pédiatriques
+- legislation: Lois, consentement, déontologie, éthique
+
+Réponds UNIQUEMENT par un objet JSON associant chaque numéro de question à un nom de module de la liste,
+par exemple {{"1": "cardio", "2": "neuro"}}.
+Si une question est vraiment impossible à classifier, associe-lui "unknown"."""
+
+def normalize_module(raw: str) -> str:
+    """Nettoie une réponse du modèle ; module de la liste ou "unknown"."""
+    module = str(raw).strip().lower()
+    module = module.replace("module:", "").strip()
+    module = module.replace("**", "").strip()
+    module = module.split()[0] if module.split() else "unknown"
+    return module if module in MODULES else "unknown"
+
 def classify_with_mistral(question_text: str, explanation: str) -> str:
     """Classifie une question avec Mistral."""
     try:
@@ -62,25 +117,32 @@ def classify_with_mistral(question_text: str, explanation: str) -> str:
             explanation=explanation
         )
         
-        response = requests.post(
-            OLLAMA_URL,
-            json={"model": MODEL, "prompt": prompt, "stream": False},
-            timeout=TIMEOUT
-        )
-        
-        if response.status_code != 200:
-            return "unknown"
-        
-        result = response.json()
-        module = result.get("response", "").strip().lower()
+        cache = get_cache()
+        cache_key = cache.make_key(MODEL, None, prompt)
+        raw = cache.get(cache_key)
+        cache_hit = raw is not None
         
-        # Nettoie la réponse
-        module = module.replace("module:", "").strip()
-        module = module.replace("**", "").strip()
-        module = module.split()[0] if module.split() else "unknown"
+        if not cache_hit:
+            def attempt() -> str:
+                with get_limiter().slot() as slot, get_pool().lease() as lease:
+                    response = requests.post(
+                        lease.url(OLLAMA_URL),
+                        json={"model": MODEL, "prompt": prompt, "stream": False},
+                        timeout=TIMEOUT
+                    )
+                    slot.status(response.status_code)
+                    lease.status(response.status_code)
+                response.raise_for_status()
+                return response.json().get("response", "")
+            
+            # Retries budgétés (timeouts / HTTP) ; une réponse hors liste n'est pas retentée
+            raw = get_retry().call(attempt)
         
-        # Valide le module
-        if module in MODULES:
+        # Nettoie et valide la réponse
+        module = normalize_module(raw)
+        if module != "unknown":
+            if not cache_hit:
+                cache.put(cache_key, raw, model=MODEL)
             return module
         
         return "unknown"
@@ -89,6 +151,78 @@ def classify_with_mistral(question_text: str, explanation: str) -> str:
         print(f"      ⚠️  Erreur classification: {e}")
         return "unknown"
 
+def classify_batch(batch: list) -> list:
+    """
+    Classifie plusieurs questions en un seul prompt.
+    
+    Les questions absentes de la réponse (ou avec un module hors liste) sont
+    reclassifiées une par une ; un "unknown" explicite du modèle est conservé.
+    
+    Returns:
+        Modules dans l'ordre du lot
+    """
+    if len(batch) == 1:
+        q = batch[0]
+        return [classify_with_mistral(q.get("text", ""), q.get("explanation", ""))]
+    
+    numbered = "\n\n".join(
+        f"QUESTION {i}: {q.get('text', '')}\nEXPLICATION {i}: {q.get('explanation', '')}"
+        for i, q in enumerate(batch, 1)
+    )
+    prompt = BATCH_CLASSIFICATION_PROMPT.format(questions=numbered)
+    
+    cache = get_cache()
+    cache_key = cache.make_key(MODEL, None, prompt, format="json")
+    
+    def parse(raw: str) -> dict:
+        answers = json.loads(raw)
+        if not isinstance(answers, dict):
+            raise InvalidResponse("objet JSON attendu")
+        labels = {str(k).strip(): str(v) for k, v in answers.items()}
+        if not any(str(i) in labels for i in range(1, len(batch) + 1)):
+            raise InvalidResponse("aucun numéro de question dans la réponse")
+        return labels
+    
+    def attempt() -> dict:
+        with get_limiter().slot() as slot, get_pool().lease() as lease:
+            response = requests.post(
+                lease.url(OLLAMA_URL),
+                json={"model": MODEL, "prompt": prompt, "stream": False, "format": "json"},
+                timeout=BATCH_TIMEOUT
+            )
+            slot.status(response.status_code)
+            lease.status(response.status_code)
+        response.raise_for_status()
+        raw = response.json().get("response", "")
+        labels = parse(raw)  # Réponse inexploitable → retry (budget parse)
+        cache.put(cache_key, raw, model=MODEL)
+        return labels
+    
+    labels = None
+    cached = cache.get(cache_key)
+    if cached is not None:
+        try:
+            labels = parse(cached)
+        except ValueError:
+            labels = None
+    
+    if labels is None:
+        try:
+            labels = get_retry().call(attempt)
+        except Exception as e:
+            print(f"      ⚠️  Erreur classification groupée: {e}")
+            labels = {}
+    
+    modules = []
+    for i, q in enumerate(batch, 1):
+        raw = labels.get(str(i))
+        module = normalize_module(raw) if raw is not None else "unknown"
+        if module == "unknown" and (raw is None or raw.strip().lower() != "unknown"):
+            # Oubliée ou réponse hors liste : repli sur le prompt individuel
+            module = classify_with_mistral(q.get("text", ""), q.get("explanation", ""))
+        modules.append(module)
+    return modules
+
 def main():
     print("="*60)
     print("🤖 CLASSIFICATION IA DES MODULES (Mistral)")
@@ -115,35 +249,46 @@ def main():
         print("✅ Aucune question 'unknown', rien à faire !")
         return
     
-    print("🤖 Classification IA en cours (Mistral)...")
+    cache = configure_cache(enabled="--no-cache" not in sys.argv)
+    # La limite adaptative remplace l'ancienne pause fixe de 0.5s entre requêtes
+    limiter = configure_limiter(adaptive="--fixed-concurrency" not in sys.argv,
+                                max_limit=MAX_WORKERS, latency_ceiling=TIMEOUT / 2)
+    pool = configure_pool(hosts_from_argv(sys.argv))
+    pool.check_health()
+    retry = configure_retry()
+    
+    batch_size = BATCH_SIZE
+    if "--batch-size" in sys.argv:
+        batch_size = max(1, int(sys.argv[sys.argv.index("--batch-size") + 1]))
+    batches = [unknown_questions[i:i + batch_size]
+               for i in range(0, len(unknown_questions), batch_size)]
+    
+    print(f"🤖 Classification IA en cours (Mistral, {len(batches)} prompts de {batch_size} questions)...")
     print()
     
+    # Index par id : réécriture en O(1) (première occurrence en cas de doublon)
+    by_id = {}
+    for q in questions:
+        if q.get("id") is not None:
+            by_id.setdefault(q["id"], q)
+    
     classified = 0
     failed = 0
+    done = 0
     
-    for i, q in enumerate(unknown_questions, 1):
-        question_text = q.get("text", "")
-        explanation = q.get("explanation", "")
-        
-        # Affiche progression
-        if i % 10 == 0 or i == 1:
-            print(f"   ... {i}/{len(unknown_questions)} ({i/len(unknown_questions)*100:.0f}%)")
-        
-        # Classification
-        new_module = classify_with_mistral(question_text, explanation)
-        
-        if new_module != "unknown":
-            # Trouve la question dans le corpus principal
-            for original_q in questions:
-                if original_q.get("id") == q.get("id"):
-                    original_q["module_id"] = new_module
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        # map() conserve l'ordre : résultats consommés au fil de l'eau
+        for batch, modules in zip(batches, executor.map(classify_batch, batches)):
+            for q, new_module in zip(batch, modules):
+                if new_module != "unknown":
+                    by_id.get(q.get("id"), q)["module_id"] = new_module
                     classified += 1
-                    break
-        else:
-            failed += 1
-        
-        # Petite pause pour ne pas surcharger Ollama
-        time.sleep(0.5)
+                else:
+                    failed += 1
+            
+            # Affiche progression
+            done += len(batch)
+            print(f"   ... {done}/{len(unknown_questions)} ({done/len(unknown_questions)*100:.0f}%)")
     
     # Statistiques finales
     modules_final = Counter(q.get("module_id", "unknown") for q in questions)
@@ -169,6 +314,10 @@ def main():
     print(f"   Questions traitées : {len(unknown_questions)}")
     print(f"   Classifiées avec succès : {classified} ({classified/len(unknown_questions)*100:.1f}%)")
     print(f"   Échecs : {failed} ({failed/len(unknown_questions)*100:.1f}%)")
+    print(f"   Cache LLM : {cache.summary()}")
+    print(f"   Concurrence : {limiter.controller.summary()}")
+    print(f"   Instances Ollama : {pool.summary()}")
+    print(f"   Retries : {retry.summary()}")
     print(f"   ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
     print(f"   Unknown final : {unknown_final} ({unknown_final/len(questions)*100:.1f}%)")
     print()
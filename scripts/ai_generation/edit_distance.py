@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Distances d'édition (Levenshtein) en masse
+Utilisé par reports/stylistic_validator.py
+
+Objectif:
+- Matrice de distances plusieurs-contre-plusieurs : chaque QCM du corpus
+  contre toutes les questions d'annales, sur tous les cœurs
+- Surcouche de rapidfuzz.process.cdist (C++, déjà utilisé par
+  merge_with_existing.py)
+- Distance normalisée = distance / longueur de la chaîne la plus longue
+  (0 = identique, 1 = complètement différent)
+
+Usage:
+    distances = levenshtein_cdist(generated_texts, annales_texts)   # (n, m) normalisées
+    nearest = nearest_distances(generated_texts, annales_texts)    # (n,) plus proche annale
+"""
+
+from typing import Sequence
+
+import numpy as np
+from rapidfuzz.distance import Levenshtein
+from rapidfuzz.process import cdist
+
+# =============================================================================
+# DISTANCES
+# =============================================================================
+
+def levenshtein_distance(s1: str, s2: str) -> int:
+    """Calcule la distance de Levenshtein entre deux chaînes."""
+    return Levenshtein.distance(s1, s2)
+
+def normalized_levenshtein(s1: str, s2: str) -> float:
+    """
+    Distance de Levenshtein normalisée (0-1).
+    0 = identique, 1 = complètement différent
+    """
+    return Levenshtein.normalized_distance(s1, s2)
+
+def levenshtein_cdist(queries: Sequence[str], choices: Sequence[str],
+                      normalized: bool = True, workers: int = -1) -> np.ndarray:
+    """
+    Distances de Levenshtein de chaque requête à chaque choix.
+
+    Args:
+        normalized: Distances normalisées (0-1) plutôt qu'en nombre d'éditions
+        workers: Cœurs utilisés (-1 = tous)
+
+    Returns:
+        np.ndarray (len(queries), len(choices)), float32 si normalisé, int32 sinon
+    """
+    scorer = Levenshtein.normalized_distance if normalized else Levenshtein.distance
+    dtype = np.float32 if normalized else np.int32
+    return cdist(list(queries), list(choices), scorer=scorer, dtype=dtype, workers=workers)
+
+def nearest_distances(queries: Sequence[str], choices: Sequence[str],
+                      workers: int = -1) -> np.ndarray:
+    """
+    Distance normalisée de chaque requête au choix le plus proche.
+
+    Returns:
+        np.ndarray (len(queries),), 1.0 si aucun choix
+    """
+    if not choices:
+        return np.ones(len(queries), dtype=np.float32)
+    return levenshtein_cdist(queries, choices, normalized=True, workers=workers).min(axis=1)
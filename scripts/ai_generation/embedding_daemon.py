@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+"""
+Démon local d'embeddings (MiniLM, BioBERT) sur socket Unix
+Partagé par EmbeddingStore (semantic_validator, align_cta_semantic,
+stylistic_validator) et BioBERTScorer (biobert_client, validate_massive)
+
+Objectif:
+- Garder les modèles chargés entre deux scripts du pipeline
+- Regrouper en un seul batch les requêtes simultanées de plusieurs clients
+  (fenêtre de BATCH_WINDOW secondes) pour mieux occuper le CPU
+- Côté client : le modèle est servi par le démon s'il tourne, sinon chargé
+  dans le processus (aucun changement pour les scripts)
+- Protocole : en-tête JSON + charge binaire (float32), préfixés de leurs tailles
+- Un appelant envoie ses textes par requêtes d'au plus MAX_BATCH_TEXTS ; il
+  ne repasse en local que si le démon est injoignable (pas sur un délai)
+- Contournement : EMBEDDING_DAEMON=off
+
+Usage:
+    python scripts/ai_generation/embedding_daemon.py [--socket cache/embedding_daemon.sock]
+           [--preload all-MiniLM-L6-v2] [--preload-biobert onnx-int8] [--batch-window 10]
+    python scripts/ai_generation/embedding_daemon.py --status
+    python scripts/ai_generation/embedding_daemon.py --stop
+
+    model = load_sentence_model('all-MiniLM-L6-v2')    # proxy démon ou SentenceTransformer
+    encoder = connect_encoder('biobert', MODEL_NAME, backend='torch')  # None sans démon
+"""
+
+import argparse
+import json
+import os
+import queue
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from tqdm import tqdm
+
+# Ajoute le chemin pour importer les modules partagés
+sys.path.append(str(Path(__file__).parent.parent))
+
+from ai_generation.embedding_store import canonical_model_name
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+DEFAULT_SOCKET = Path(os.getenv("EMBEDDING_DAEMON_SOCKET", "cache/embedding_daemon.sock"))
+BATCH_WINDOW = 0.01  # Secondes d'attente pour regrouper les requêtes concurrentes
+MAX_BATCH_TEXTS = 1024  # Textes maximum par batch regroupé
+ENCODE_BATCH_SIZE = 64  # Batch interne de sentence-transformers
+CONNECT_TIMEOUT = 1.0  # Secondes (ping / détection du démon)
+REQUEST_TIMEOUT = 600.0  # Secondes (premier encode = chargement du modèle)
+KINDS = ("sentence-transformers", "biobert")
+HEADER = struct.Struct(">II")  # Taille de l'en-tête JSON, taille de la charge binaire
+
+def daemon_disabled_by_env() -> bool:
+    """True si EMBEDDING_DAEMON=off (ou 0/false/no) dans l'environnement."""
+    return os.getenv("EMBEDDING_DAEMON", "on").strip().lower() in ("0", "off", "false", "no")
+
+class DaemonUnavailable(ConnectionError):
+    """Démon injoignable (non lancé, arrêté ou socket périmé)."""
+
+class DaemonTimeout(RuntimeError):
+    """Démon joignable mais sans réponse dans le délai (requête trop lente)."""
+
+# =============================================================================
+# PROTOCOLE
+# =============================================================================
+
+def send_message(sock: socket.socket, header: Dict, payload: bytes = b""):
+    data = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    sock.sendall(HEADER.pack(len(data), len(payload)) + data + payload)
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError("connexion fermée")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+def recv_message(sock: socket.socket) -> Tuple[Dict, bytes]:
+    header_size, payload_size = HEADER.unpack(_recv_exact(sock, HEADER.size))
+    header = json.loads(_recv_exact(sock, header_size).decode("utf-8"))
+    return header, _recv_exact(sock, payload_size)
+
+# =============================================================================
+# CLIENT
+# =============================================================================
+
+class DaemonClient:
+    """Client du démon (une connexion par requête, utilisable depuis plusieurs threads)."""
+
+    def __init__(self, socket_path: Path = DEFAULT_SOCKET):
+        self.socket_path = Path(socket_path)
+
+    def request(self, header: Dict, timeout: float = REQUEST_TIMEOUT) -> Tuple[Dict, bytes]:
+        """
+        Envoie une requête et attend la réponse.
+
+        Raises:
+            DaemonUnavailable si le démon est injoignable ou s'arrête en cours de requête
+            DaemonTimeout si le démon ne répond pas dans le délai
+            RuntimeError si le démon renvoie une erreur
+        """
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            try:
+                sock.connect(str(self.socket_path))
+            except OSError as e:
+                raise DaemonUnavailable(f"démon d'embeddings injoignable ({self.socket_path}) : {e}")
+            try:
+                send_message(sock, header)
+                response, payload = recv_message(sock)
+            except socket.timeout:
+                raise DaemonTimeout(f"démon d'embeddings : pas de réponse en {timeout:.0f}s")
+            except (OSError, ValueError, struct.error) as e:
+                raise DaemonUnavailable(f"démon d'embeddings interrompu ({self.socket_path}) : {e}")
+
+        if not response.get("ok"):
+            raise RuntimeError(f"démon d'embeddings : {response.get('error', 'erreur inconnue')}")
+        return response, payload
+
+    def ping(self) -> Optional[Dict]:
+        """État du démon (pid, modèles chargés), None s'il ne répond pas."""
+        try:
+            return self.request({"op": "ping"}, timeout=CONNECT_TIMEOUT)[0]
+        except (DaemonUnavailable, RuntimeError):
+            return None
+
+    def info(self, kind: str, model: str, **options) -> Dict:
+        """Charge le modèle dans le démon si besoin ; dimension et révision."""
+        return self.request({"op": "info", "kind": kind, "model": model, "options": options})[0]
+
+    def encode(self, kind: str, model: str, texts: Sequence[str], **options) -> np.ndarray:
+        """Embeddings des textes (même ordre), np.ndarray float32 (len(texts), dim)."""
+        response, payload = self.request({"op": "encode", "kind": kind, "model": model,
+                                          "texts": list(texts), "options": options})
+        return np.frombuffer(payload, dtype=np.float32).reshape(response["shape"])
+
+    def shutdown(self):
+        self.request({"op": "shutdown"}, timeout=CONNECT_TIMEOUT)
+
+def connect_daemon(socket_path: Optional[Path] = None) -> Optional[DaemonClient]:
+    """Client du démon s'il tourne, None sinon (ou si EMBEDDING_DAEMON=off)."""
+    if daemon_disabled_by_env() or not hasattr(socket, "AF_UNIX"):
+        return None
+    client = DaemonClient(socket_path or DEFAULT_SOCKET)
+    if not client.socket_path.exists() or client.ping() is None:
+        return None
+    return client
+
+class RemoteEncoder:
+    """Modèle servi par le démon pour un (type, modèle, options)."""
+
+    def __init__(self, client: DaemonClient, kind: str, model: str, **options):
+        self.client = client
+        self.kind = kind
+        self.model = model
+        self.options = options
+        self._info: Optional[Dict] = None
+
+    @property
+    def info(self) -> Dict:
+        """{'dim', 'revision'} (charge le modèle dans le démon au premier accès)."""
+        if self._info is None:
+            self._info = self.client.info(self.kind, self.model, **self.options)
+        return self._info
+
+    def encode(self, texts: Sequence[str], show_progress: bool = False, **options) -> np.ndarray:
+        """
+        Embeddings des textes, envoyés par requêtes d'au plus MAX_BATCH_TEXTS
+        (chaque requête a son propre délai REQUEST_TIMEOUT).
+        """
+        texts = list(texts)
+        options = {**self.options, **options}
+        if not texts:
+            return np.zeros((0, self.info["dim"]), dtype=np.float32)
+        
+        parts = []
+        with tqdm(total=len(texts), desc=f"Encodage {self.model} (démon)", unit="texte",
+                  disable=not show_progress) as pbar:
+            for start in range(0, len(texts), MAX_BATCH_TEXTS):
+                batch = texts[start:start + MAX_BATCH_TEXTS]
+                parts.append(self.client.encode(self.kind, self.model, batch, **options))
+                pbar.update(len(batch))
+        return np.vstack(parts)
+
+def connect_encoder(kind: str, model: str, socket_path: Optional[Path] = None,
+                    **options) -> Optional[RemoteEncoder]:
+    """
+    Modèle servi par le démon, None si le démon ne tourne pas.
+
+    Le modèle est chargé dans le démon dès cet appel ; en cas d'échec
+    (modèle introuvable côté démon), None : l'appelant charge en local.
+    """
+    client = connect_daemon(socket_path)
+    if client is None:
+        return None
+    encoder = RemoteEncoder(client, kind, model, **options)
+    try:
+        encoder.info
+    except (DaemonUnavailable, RuntimeError) as e:
+        print(f"   ⚠️  {e} — chargement local")
+        return None
+    return encoder
+
+class RemoteSentenceTransformer:
+    """
+    Remplaçant de SentenceTransformer (méthode encode) servi par le démon.
+
+    Si le démon s'arrête en cours de run, le modèle est chargé dans le processus.
+    """
+
+    def __init__(self, encoder: RemoteEncoder):
+        self.encoder = encoder
+        self.model_name = encoder.model
+        self._local = None
+
+    def encode(self, sentences, batch_size: int = 32, show_progress_bar: bool = False,
+               convert_to_numpy: bool = True, normalize_embeddings: bool = False, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+
+        if self._local is None:
+            try:
+                vectors = self.encoder.encode(texts, show_progress=show_progress_bar,
+                                              normalize=normalize_embeddings)
+                return vectors[0] if single else vectors
+            except DaemonUnavailable as e:
+                print(f"   ⚠️  {e} — chargement local de {self.model_name}")
+                from sentence_transformers import SentenceTransformer
+                self._local = SentenceTransformer(self.model_name)
+
+        return self._local.encode(sentences, batch_size=batch_size, show_progress_bar=show_progress_bar,
+                                  convert_to_numpy=convert_to_numpy,
+                                  normalize_embeddings=normalize_embeddings, **kwargs)
+
+def load_sentence_model(model_name: str):
+    """SentenceTransformer servi par le démon s'il tourne, sinon chargé dans le processus."""
+    encoder = connect_encoder("sentence-transformers", model_name)
+    if encoder is not None:
+        print(f"   🔌 {model_name} servi par le démon d'embeddings")
+        return RemoteSentenceTransformer(encoder)
+
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name)
+
+# =============================================================================
+# SERVEUR
+# =============================================================================
+
+class ModelWorker:
+    """
+    Un modèle chargé et son thread d'inférence.
+
+    Les requêtes arrivées pendant BATCH_WINDOW sont concaténées en un seul
+    appel au modèle, puis les résultats redécoupés par requête.
+    """
+
+    def __init__(self, kind: str, model: str, options: Dict, batch_window: float):
+        self.kind = kind
+        self.model = model
+        self.batch_window = batch_window
+        self.requests: "queue.Queue[Tuple[List[str], Dict, Future]]" = queue.Queue()
+        self.served = 0
+        self.batches = 0
+
+        print(f"🔧 Chargement {kind} {model} {options or ''}...")
+        if kind == "sentence-transformers":
+            from sentence_transformers import SentenceTransformer
+            st_model = SentenceTransformer(model)
+            self._encode = lambda texts: st_model.encode(texts, batch_size=ENCODE_BATCH_SIZE,
+                                                         convert_to_numpy=True,
+                                                         show_progress_bar=False)
+            self.dim = int(st_model.get_sentence_embedding_dimension())
+            self.revision = None
+        elif kind == "biobert":
+            from ai_generation.biobert_client import BioBERTScorer
+            scorer = BioBERTScorer(backend=options.get("backend", "torch"), use_daemon=False)
+            self._encode = scorer._get_embeddings
+            self.dim = scorer.hidden_size
+            self.revision = scorer.revision
+        else:
+            raise ValueError(f"type de modèle inconnu : {kind} (attendu : {', '.join(KINDS)})")
+        print(f"   ✓ {model} prêt")
+
+        threading.Thread(target=self._run, name=f"encode-{model}", daemon=True).start()
+
+    def submit(self, texts: List[str], options: Dict) -> Future:
+        future = Future()
+        self.requests.put((texts, options, future))
+        return future
+
+    def _collect(self) -> List[Tuple[List[str], Dict, Future]]:
+        """Première requête en attente + celles arrivées pendant la fenêtre."""
+        batch = [self.requests.get()]
+        total = len(batch[0][0])
+        deadline = time.monotonic() + self.batch_window
+        while total < MAX_BATCH_TEXTS:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+            total += len(batch[-1][0])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            texts = [t for request_texts, _, _ in batch for t in request_texts]
+            try:
+                vectors = np.asarray(self._encode(texts), dtype=np.float32).reshape(len(texts), -1) \
+                    if texts else np.zeros((0, self.dim), dtype=np.float32)
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            self.batches += 1
+            start = 0
+            for request_texts, options, future in batch:
+                part = vectors[start:start + len(request_texts)]
+                start += len(request_texts)
+                if options.get("normalize"):
+                    part = part / np.maximum(np.linalg.norm(part, axis=1, keepdims=True), 1e-12)
+                self.served += len(request_texts)
+                future.set_result(np.ascontiguousarray(part, dtype=np.float32))
+
+class EmbeddingDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Serveur socket Unix : un thread par connexion, un ModelWorker par modèle."""
+
+    daemon_threads = True
+    request_queue_size = 256  # Connexions en attente (rafales de clients multi-threads)
+
+    def __init__(self, socket_path: Path, batch_window: float = BATCH_WINDOW):
+        self.socket_path = Path(socket_path)
+        self.batch_window = batch_window
+        self.workers: Dict[str, ModelWorker] = {}
+        self._workers_lock = threading.Lock()
+        self.socket_path.parent.mkdir(parents=True, exist_ok=True)
+        super().__init__(str(self.socket_path), DaemonHandler)
+
+    def worker(self, kind: str, model: str, options: Dict) -> ModelWorker:
+        """Worker du modèle, chargé à la première requête."""
+        if kind == "sentence-transformers":
+            model = canonical_model_name(model)
+        options = {k: v for k, v in options.items() if k != "normalize"}
+        key = json.dumps([kind, model, options], sort_keys=True)
+        with self._workers_lock:
+            if key not in self.workers:
+                self.workers[key] = ModelWorker(kind, model, options, self.batch_window)
+            return self.workers[key]
+
+    def status(self) -> Dict:
+        return {
+            "pid": os.getpid(),
+            "models": [{"kind": w.kind, "model": w.model, "texts": w.served, "batches": w.batches}
+                       for w in self.workers.values()]
+        }
+
+class DaemonHandler(socketserver.BaseRequestHandler):
+    """Une requête par connexion."""
+
+    def handle(self):
+        try:
+            header, _ = recv_message(self.request)
+        except (ConnectionError, ValueError, struct.error):
+            return
+
+        op = header.get("op")
+        try:
+            if op == "ping":
+                send_message(self.request, {"ok": True, **self.server.status()})
+            elif op == "shutdown":
+                send_message(self.request, {"ok": True})
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+            elif op in ("info", "encode"):
+                worker = self.server.worker(header["kind"], header["model"], header.get("options", {}))
+                if op == "info":
+                    send_message(self.request, {"ok": True, "dim": worker.dim, "revision": worker.revision})
+                else:
+                    vectors = worker.submit(header["texts"], header.get("options", {})).result()
+                    send_message(self.request, {"ok": True, "shape": list(vectors.shape)}, vectors.tobytes())
+            else:
+                send_message(self.request, {"ok": False, "error": f"opération inconnue : {op}"})
+        except Exception as e:
+            try:
+                send_message(self.request, {"ok": False, "error": f"{type(e).__name__}: {e}"})
+            except OSError:
+                pass
+
+# =============================================================================
+# MAIN
+# =============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Démon local d'embeddings (socket Unix)")
+    parser.add_argument('--socket', type=Path, default=DEFAULT_SOCKET, help='Chemin du socket Unix')
+    parser.add_argument('--preload', action='append', default=[],
+                        help='Modèle sentence-transformers chargé au démarrage (répétable)')
+    parser.add_argument('--preload-biobert', metavar='BACKEND',
+                        help='Charge BioBERT au démarrage (torch, int8, onnx, onnx-int8)')
+    parser.add_argument('--batch-window', type=float, default=BATCH_WINDOW * 1000,
+                        help='Fenêtre de regroupement des requêtes (ms)')
+    parser.add_argument('--status', action='store_true', help='Affiche l\'état du démon')
+    parser.add_argument('--stop', action='store_true', help='Arrête le démon')
+
+    args = parser.parse_args()
+    client = DaemonClient(args.socket)
+    status = client.ping() if args.socket.exists() else None
+
+    if args.status or args.stop:
+        if status is None:
+            print(f"⚪ Aucun démon sur {args.socket}")
+            return 1
+        if args.stop:
+            client.shutdown()
+            print(f"🛑 Démon arrêté (pid {status['pid']})")
+            return 0
+        print(f"🟢 Démon actif (pid {status['pid']}) sur {args.socket}")
+        for m in status["models"]:
+            print(f"   {m['kind']:22s} {m['model']:40s} {m['texts']} textes / {m['batches']} batchs")
+        return 0
+
+    if status is not None:
+        print(f"⚠️  Démon déjà actif (pid {status['pid']}) sur {args.socket}")
+        return 1
+    if args.socket.exists():
+        args.socket.unlink()  # Socket d'un démon arrêté brutalement
+
+    server = EmbeddingDaemon(args.socket, batch_window=args.batch_window / 1000)
+    for model in args.preload:
+        server.worker("sentence-transformers", model, {})
+    if args.preload_biobert:
+        from ai_generation.biobert_client import MODEL_NAME
+        server.worker("biobert", MODEL_NAME, {"backend": args.preload_biobert})
+
+    print(f"🟢 Démon d'embeddings à l'écoute sur {args.socket} (pid {os.getpid()})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.socket.exists():
+            args.socket.unlink()
+        print("🛑 Démon arrêté")
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Cache disque des embeddings sentence-transformers (adressé par contenu)
+Partagé par semantic_validator, align_cta_semantic et stylistic_validator
+
+Objectif:
+- Clé = (modèle, sha1 du texte) : un texte déjà encodé ne l'est plus jamais
+- Stockage par modèle : matrice float32 brute en mémoire mappée
+  (vectors.f32) + manifeste des ids, une ligne par vecteur (ids.txt)
+- Embeddings normalisés (L2) : similarité cosinus = produit scalaire
+- Ajout en fin de fichier uniquement, verrou fichier entre processus ;
+  une écriture interrompue (crash) est tronquée au chargement suivant
+- Le modèle n'est chargé que si des textes restent à encoder ; servi par le
+  démon d'embeddings (embedding_daemon.py) s'il tourne
+- Contournement : EMBEDDING_STORE=off
+
+Usage:
+    store = get_embedding_store('all-MiniLM-L6-v2')
+    vectors = store.encode(texts)           # np.ndarray (len(texts), dim)
+    scores = vectors @ store.encode([query])[0]
+"""
+
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows : verrou entre threads uniquement
+    fcntl = None
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+DEFAULT_STORE_DIR = Path(os.getenv("EMBEDDING_STORE_DIR", "cache/embeddings"))
+DEFAULT_BATCH_SIZE = 64
+DTYPE = np.float32
+
+def store_disabled_by_env() -> bool:
+    """True si EMBEDDING_STORE=off (ou 0/false/no) dans l'environnement."""
+    return os.getenv("EMBEDDING_STORE", "on").strip().lower() in ("0", "off", "false", "no")
+
+def canonical_model_name(model_name: str) -> str:
+    """'sentence-transformers/all-MiniLM-L6-v2' et 'all-MiniLM-L6-v2' partagent un stockage."""
+    prefix = "sentence-transformers/"
+    return model_name[len(prefix):] if model_name.startswith(prefix) else model_name
+
+def text_key(text: str) -> str:
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+# =============================================================================
+# STOCKAGE
+# =============================================================================
+
+class EmbeddingStore:
+    """Embeddings d'un modèle, persistés sur disque (thread-safe, multi-processus)."""
+
+    def __init__(self, model_name: str, store_dir: Path = DEFAULT_STORE_DIR,
+                 model=None, enabled: bool = True):
+        """
+        Args:
+            model_name: Nom sentence-transformers (clé du stockage)
+            store_dir: Racine du stockage (un sous-dossier par modèle)
+            model: SentenceTransformer déjà chargé (sinon chargé à la demande)
+            enabled: False = encode toujours, rien n'est lu ni écrit
+        """
+        self.model_name = model_name
+        self.enabled = enabled and not store_disabled_by_env()
+        self.dir = Path(store_dir) / canonical_model_name(model_name).replace('/', '__')
+        self._model = model
+        self._lock = threading.Lock()
+        self._model_lock = threading.Lock()
+
+        self._index: Dict[str, int] = {}  # sha1 → ligne de la matrice
+        self._count = 0  # Lignes de la matrice (= lignes complètes de ids.txt)
+        self._ids_offset = 0  # Octets de ids.txt déjà lus
+        self._dim: Optional[int] = None
+        self._vectors = None  # np.memmap (count, dim)
+        self.hits = 0
+        self.encoded = 0
+
+        if self.enabled:
+            self._load_manifest()
+            self._refresh()
+
+    @property
+    def model(self):
+        """SentenceTransformer (ou démon d'embeddings), chargé au premier texte inconnu."""
+        with self._model_lock:
+            if self._model is None:
+                from ai_generation.embedding_daemon import load_sentence_model
+                self._model = load_sentence_model(self.model_name)
+        return self._model
+
+    @property
+    def _vectors_path(self) -> Path:
+        return self.dir / "vectors.f32"
+
+    @property
+    def _ids_path(self) -> Path:
+        return self.dir / "ids.txt"
+
+    @property
+    def _manifest_path(self) -> Path:
+        return self.dir / "manifest.json"
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    # -------------------------------------------------------------------------
+    # Lecture
+    # -------------------------------------------------------------------------
+
+    def _load_manifest(self):
+        try:
+            with open(self._manifest_path, 'r', encoding='utf-8') as f:
+                self._dim = json.load(f)['dim']
+        except (OSError, json.JSONDecodeError, KeyError):
+            self._dim = None
+
+    def _refresh(self):
+        """Intègre les vecteurs ajoutés depuis la dernière lecture (autre processus)."""
+        if self._dim is None or not self._ids_path.exists():
+            return
+
+        row_bytes = self._dim * np.dtype(DTYPE).itemsize
+        complete_rows = self._vectors_path.stat().st_size // row_bytes if self._vectors_path.exists() else 0
+
+        with open(self._ids_path, 'rb') as f:
+            f.seek(self._ids_offset)
+            for line in f:
+                if not line.endswith(b"\n") or self._count >= complete_rows:
+                    break  # Ligne ou vecteur incomplet (écriture en cours / crash)
+                self._index.setdefault(line.decode('ascii').strip(), self._count)
+                self._count += 1
+                self._ids_offset += len(line)
+
+        if self._count and (self._vectors is None or self._vectors.shape[0] != self._count):
+            self._vectors = np.memmap(self._vectors_path, dtype=DTYPE, mode='r',
+                                      shape=(self._count, self._dim))
+
+    # -------------------------------------------------------------------------
+    # Écriture
+    # -------------------------------------------------------------------------
+
+    def _append(self, keys: List[str], vectors: np.ndarray):
+        """Ajoute des vecteurs en fin de stockage (appelé sous verrou)."""
+        self.dir.mkdir(parents=True, exist_ok=True)
+        with open(self.dir / ".lock", 'w') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+            if self._dim is None:
+                self._load_manifest()
+            if self._dim is None:
+                self._dim = int(vectors.shape[1])
+                with open(self._manifest_path, 'w', encoding='utf-8') as f:
+                    json.dump({'model': self.model_name, 'dim': self._dim,
+                               'dtype': 'float32', 'normalized': True}, f)
+            self._refresh()
+
+            # Repart d'un état cohérent (reliquat d'une écriture interrompue)
+            row_bytes = self._dim * np.dtype(DTYPE).itemsize
+            with open(self._vectors_path, 'ab') as f:
+                f.truncate(self._count * row_bytes)
+            with open(self._ids_path, 'ab') as f:
+                f.truncate(self._ids_offset)
+
+            new = [(k, v) for k, v in zip(keys, vectors) if k not in self._index]
+            if new:
+                with open(self._vectors_path, 'ab') as f:
+                    f.write(np.ascontiguousarray([v for _, v in new], dtype=DTYPE).tobytes())
+                with open(self._ids_path, 'ab') as f:
+                    f.write("".join(f"{k}\n" for k, _ in new).encode('ascii'))
+            self._refresh()
+
+    def encode(self, texts: Sequence[str], batch_size: int = DEFAULT_BATCH_SIZE,
+               show_progress_bar: bool = False) -> np.ndarray:
+        """
+        Embeddings normalisés des textes (même ordre), n'encode que les inconnus.
+
+        Returns:
+            np.ndarray float32 (len(texts), dim)
+        """
+        texts = [t if isinstance(t, str) else str(t) for t in texts]
+        if not self.enabled:
+            return self._encode_model(texts, batch_size, show_progress_bar)
+
+        keys = [text_key(t) for t in texts]
+        with self._lock:
+            missing = {}
+            for key, text in zip(keys, texts):
+                if key not in self._index:
+                    missing.setdefault(key, text)
+            self.hits += len(texts) - len(missing)
+
+        if missing:
+            vectors = self._encode_model(list(missing.values()), batch_size, show_progress_bar)
+            with self._lock:
+                self._append(list(missing.keys()), vectors)
+                self.encoded += len(missing)
+
+        with self._lock:
+            if not texts:
+                return np.zeros((0, self._dim or 0), dtype=DTYPE)
+            rows = np.fromiter((self._index[k] for k in keys), dtype=np.int64, count=len(keys))
+            return np.asarray(self._vectors[rows])
+
+    def _encode_model(self, texts: List[str], batch_size: int,
+                      show_progress_bar: bool) -> np.ndarray:
+        vectors = self.model.encode(texts, batch_size=batch_size, convert_to_numpy=True,
+                                    normalize_embeddings=True,
+                                    show_progress_bar=show_progress_bar)
+        return np.asarray(vectors, dtype=DTYPE).reshape(len(texts), -1)
+
+    def summary(self) -> str:
+        """Résumé lisible pour les rapports de fin de script."""
+        if not self.enabled:
+            return "stockage désactivé"
+        return f"{self.hits} embeddings réutilisés, {self.encoded} encodés ({len(self)} en stock)"
+
+# =============================================================================
+# INSTANCES PARTAGÉES
+# =============================================================================
+
+_stores: Dict[str, EmbeddingStore] = {}
+_stores_lock = threading.Lock()
+
+def get_embedding_store(model_name: str, model=None) -> EmbeddingStore:
+    """Stockage partagé du processus pour ce modèle (créé au premier appel)."""
+    key = canonical_model_name(model_name)
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = EmbeddingStore(model_name, model=model)
+        elif model is not None and _stores[key]._model is None:
+            _stores[key]._model = model
+        return _stores[key]
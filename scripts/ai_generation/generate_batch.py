@@ -16,11 +16,36 @@ Usage:
            --profile src/data/annales_profile.json \
            --out src/data/questions/generated_raw.json \
            --model mistral:latest \
-           --per-chunk 3
+           --per-chunk 3 \
+           --engine async --max-in-flight 8 --request-timeout 180
+
+    # La concurrence est adaptative (AIMD) jusqu'à --max-in-flight ;
+    # --fixed-concurrency rétablit une limite constante
+
+    # Optionnel : petits chunks (≤ PACK_CHUNK_MAX_TOKENS) d'une même section
+    # regroupés dans un seul prompt (budget de contexte en tokens, QCM
+    # rattachés par position via "chunk_index") ; désactivé par défaut
+    python scripts/ai_generation/generate_batch.py ... --pack-tokens 1200
+
+    # Réponses en streaming : QCM validés au fil des tokens, requête
+    # interrompue dès que la sortie déraille (QCM déjà reçus conservés)
+    python scripts/ai_generation/generate_batch.py ... --stream-responses
+
+    # Plusieurs instances Ollama (routage vers la moins chargée)
+    python scripts/ai_generation/generate_batch.py ... --ollama-hosts http://gpu1:11434,http://gpu2:11434
+
+    # Reprise après interruption (chunks terminés lus depuis le checkpoint)
+    python scripts/ai_generation/generate_batch.py ... --resume
+
+    # Sortie en flux : un QCM par ligne dans generated_raw.jsonl pendant le run,
+    # converti en generated_raw.json ({"questions": [...]}) à la fin
+    python scripts/ai_generation/generate_batch.py ... --stream
 """
 
 import argparse
+import asyncio
 import json
+import sys
 import time
 from pathlib import Path
 from typing import List, Dict, Optional
@@ -35,14 +60,28 @@ except ImportError:
     print("❌ Dépendances manquantes. Installez: pip install ollama tqdm")
     exit(1)
 
+# Ajoute le chemin pour importer les modules partagés
+sys.path.append(str(Path(__file__).parent.parent))
+
+from ai_generation.ollama_engine import AsyncOllamaEngine, DEFAULT_REQUEST_TIMEOUT
+from ai_generation.llm_cache import configure_cache, get_cache
+from ai_generation.generation_checkpoint import ChunkCheckpoint, default_checkpoint_path
+from ai_generation.jsonl_stream import JsonlWriter, jsonl_to_json, stream_path
+from ai_generation.adaptive_concurrency import configure_limiter, get_limiter
+from ai_generation.ollama_pool import configure_pool, get_pool
+from ai_generation.retry_policy import InvalidResponse, configure_retry, get_retry
+from ai_generation.stream_parser import QCMStreamParser
+
 # =============================================================================
 # CONFIGURATION
 # =============================================================================
 
-MAX_RETRIES = 3
-RETRY_DELAY = 2  # secondes
-MAX_WORKERS = 4  # Parallélisation : 4 chunks simultanés
+MAX_WORKERS = 4  # Parallélisation : 4 chunks simultanés max (défaut --max-in-flight)
 PROGRESS_FILE = "logs/generation_progress.json"  # Fichier de progression
+MIN_CHUNK_CHARS = 100  # Chunks plus courts ignorés (contexte insuffisant)
+MAX_CHUNK_TOKENS = 1200  # Même limite que extract_pdfs.py (contexte Mistral 7B)
+MAX_PACK_CHUNKS = 4  # Chunks maximum par prompt packé
+PACK_CHUNK_MAX_TOKENS = 300  # Seuls les chunks plus courts sont packés
 
 # Lock pour accès thread-safe au fichier de progression
 progress_lock = threading.Lock()
@@ -100,124 +139,351 @@ Génère 2-3 QCM basés sur ce contexte."""
     
     return prompt
 
+def build_packed_prompt(module_id: str, section_title: str, chunks: List[Dict],
+                        keywords: List[str], annales_profile: Dict) -> str:
+    """
+    Construit un prompt unique pour plusieurs chunks d'une même section.
+    
+    Les contextes sont numérotés : chaque QCM indique dans "chunk_index" le
+    contexte dont il est tiré, ce qui permet de le rattacher à son chunk.
+    """
+    starters = annales_profile.get('common_starters', ['Quelle est', 'Parmi les propositions'])
+    starters_str = ', '.join(f'"{s}"' for s in starters[:3])
+    
+    avg_length = annales_profile.get('avg_question_length', 95)
+    
+    contexts = "\n\n".join(
+        f"[CONTEXTE SOURCE {i}] :\n{chunk['text']}" for i, chunk in enumerate(chunks, 1)
+    )
+    
+    prompt = f"""[MODULE] : {module_id.replace('_', ' ').title()}
+[SECTION] : {section_title}
+
+{contexts}
+
+[MOTS-CLÉS ATTENDUS] : {', '.join(keywords[:10]) if keywords else 'N/A'}
+
+[CONSIGNES STYLE] :
+- Longueur énoncé : environ {avg_length} caractères
+- Débute par : {starters_str}
+- Style : précis, factuel, examens IADE
+
+Génère 2-3 QCM basés sur chaque contexte (un QCM = un seul contexte).
+En plus des champs du format de retour, ajoute à chaque QCM le champ "chunk_index" : numéro (1 à {len(chunks)}) du contexte source utilisé."""
+    
+    return prompt
+
+def build_prompt_for(module_id: str, section_title: str, chunks: List[Dict],
+                     keywords: List[str], annales_profile: Dict) -> str:
+    """Prompt d'un chunk seul (inchangé, cache conservé) ou d'un paquet de chunks."""
+    if len(chunks) == 1:
+        return build_user_prompt(module_id, section_title, chunks[0]['text'],
+                                 keywords, annales_profile)
+    return build_packed_prompt(module_id, section_title, chunks, keywords, annales_profile)
+
+# =============================================================================
+# PACKING
+# =============================================================================
+
+def chunk_tokens(chunk: Dict) -> int:
+    """Taille estimée d'un chunk (token_count de extract_pdfs, sinon ≈ 4 caractères/token)."""
+    return chunk.get('token_count') or len(chunk.get('text', '')) // 4
+
+def pack_chunks(chunks: List[Dict], max_tokens: int,
+                max_chunks: int = MAX_PACK_CHUNKS) -> List[List[Dict]]:
+    """
+    Regroupe des chunks consécutifs d'une même section en paquets d'au plus
+    max_tokens tokens de contexte et max_chunks chunks (une requête par paquet).
+    
+    Seuls les chunks de moins de PACK_CHUNK_MAX_TOKENS tokens sont packés,
+    les autres gardent leur propre requête.
+    max_tokens <= 0 : un chunk par paquet (pas de packing).
+    """
+    packs = []
+    current: List[Dict] = []
+    current_tokens = 0
+    
+    for chunk in chunks:
+        tokens = chunk_tokens(chunk)
+        if max_tokens <= 0 or tokens > PACK_CHUNK_MAX_TOKENS:
+            if current:
+                packs.append(current)
+                current, current_tokens = [], 0
+            packs.append([chunk])
+            continue
+        if current and (current_tokens + tokens > max_tokens or len(current) >= max_chunks):
+            packs.append(current)
+            current, current_tokens = [], 0
+        current.append(chunk)
+        current_tokens += tokens
+    
+    if current:
+        packs.append(current)
+    return packs
+
 # =============================================================================
 # GÉNÉRATION ET PARSING
 # =============================================================================
 
-def generate_qcm_for_chunk(
-    client: Client,
+def generate_qcm_for_chunks(
+    client: Optional[Client],
     model: str,
     module_id: str,
     section_title: str,
-    chunk: Dict,
+    chunks: List[Dict],
     keywords: List[str],
-    annales_profile: Dict
+    annales_profile: Dict,
+    stream: bool = False
 ) -> List[Dict]:
     """
-    Génère des QCM pour un chunk donné.
+    Génère des QCM pour un chunk ou un paquet de chunks (une seule requête).
+    
+    Args:
+        client: Client Ollama imposé, None = instance choisie dans le pool partagé
+        chunks: Chunks d'une même section ; à plusieurs, prompt packé
+        stream: Réponse en streaming, parsée et validée au fil de l'eau
     
     Returns:
-        Liste de QCM générés (peut être vide si échec)
+        Liste de QCM générés, rattachés à leur chunk (peut être vide si échec)
     """
-    chunk_text = chunk['text']
-    chunk_id = chunk['chunk_id']
-    
     # Construction du prompt
-    user_prompt = build_user_prompt(
-        module_id, section_title, chunk_text,
-        keywords, annales_profile
-    )
+    user_prompt = build_prompt_for(module_id, section_title, chunks, keywords, annales_profile)
+    
+    options = {'temperature': 0.7, 'top_p': 0.9}
+    
+    # Réponse déjà obtenue lors d'un run précédent ?
+    cache = get_cache()
+    cache_key = cache.make_key(model, SYSTEM_PROMPT, user_prompt, options, format='json')
+    cached = cache.get(cache_key)
+    if cached is not None:
+        valid_qcms = parse_qcm_response(cached, module_id, chunks)
+        if valid_qcms:
+            return valid_qcms
+    
+    messages = [
+        {'role': 'system', 'content': SYSTEM_PROMPT},
+        {'role': 'user', 'content': user_prompt}
+    ]
+    
+    def attempt_stream() -> List[Dict]:
+        """Un appel en streaming, interrompu dès que la sortie déraille."""
+        parser = QCMStreamParser(validate=validate_qcm_format)
+        with get_limiter().slot(), get_pool().lease() as lease:
+            chat_client = client or get_pool().client(lease.endpoint)
+            parts = chat_client.chat(model=model, messages=messages, format='json',
+                                     options=options, stream=True)
+            try:
+                for part in parts:
+                    parser.feed(part['message']['content'])
+                    if parser.should_stop:
+                        break
+            finally:
+                parts.close()  # Ferme la connexion : Ollama arrête de générer
+        
+        return finish_stream(parser, module_id, chunks, cache, cache_key, model)
     
-    # Tentatives avec retry
-    for attempt in range(1, MAX_RETRIES + 1):
-        try:
-            response = client.chat(
+    def attempt() -> List[Dict]:
+        """Un appel Ollama ; réponse inexploitable → InvalidResponse (budget parse)."""
+        if stream:
+            return attempt_stream()
+        
+        with get_limiter().slot(), get_pool().lease() as lease:
+            chat_client = client or get_pool().client(lease.endpoint)
+            response = chat_client.chat(
                 model=model,
-                messages=[
-                    {'role': 'system', 'content': SYSTEM_PROMPT},
-                    {'role': 'user', 'content': user_prompt}
-                ],
+                messages=messages,
                 format='json',
-                options={
-                    'temperature': 0.7,
-                    'top_p': 0.9
-                }
+                options=options
             )
+        
+        content = response['message']['content']
+        valid_qcms = parse_qcm_response(content, module_id, chunks)
+        if not valid_qcms:
+            raise InvalidResponse("aucun QCM valide")
+        
+        cache.put(cache_key, content, model=model)
+        return valid_qcms
+    
+    # Tentatives avec retry (backoff + budgets par type d'erreur)
+    try:
+        return get_retry().call(attempt)
+    except Exception:
+        return []
+
+async def agenerate_qcm_for_chunks(
+    engine: AsyncOllamaEngine,
+    model: str,
+    module_id: str,
+    section_title: str,
+    chunks: List[Dict],
+    keywords: List[str],
+    annales_profile: Dict,
+    stream: bool = False
+) -> List[Dict]:
+    """
+    Version asynchrone de generate_qcm_for_chunks (moteur asyncio).
+    
+    Les timeouts (asyncio.TimeoutError) consomment le budget « timeout » de la
+    politique de retry ; l'attente se fait sans bloquer les autres requêtes.
+    
+    Returns:
+        Liste de QCM générés (peut être vide si échec)
+    """
+    user_prompt = build_prompt_for(module_id, section_title, chunks, keywords, annales_profile)
+    options = {'temperature': 0.7, 'top_p': 0.9}
+    
+    cache = get_cache()
+    cache_key = cache.make_key(model, SYSTEM_PROMPT, user_prompt, options, format='json')
+    cached = cache.get(cache_key)
+    if cached is not None:
+        valid_qcms = parse_qcm_response(cached, module_id, chunks)
+        if valid_qcms:
+            return valid_qcms
+    
+    messages = [
+        {'role': 'system', 'content': SYSTEM_PROMPT},
+        {'role': 'user', 'content': user_prompt}
+    ]
+    
+    async def attempt() -> List[Dict]:
+        if stream:
+            parser = QCMStreamParser(validate=validate_qcm_format)
             
-            # Parse la réponse
-            content = response['message']['content']
-            
-            # Nettoyage éventuel (si Mistral ajoute du texte avant/après)
-            content = content.strip()
-            if content.startswith('```json'):
-                content = content[7:]
-            if content.startswith('```'):
-                content = content[3:]
-            if content.endswith('```'):
-                content = content[:-3]
-            content = content.strip()
-            
-            # Parse JSON
-            parsed = json.loads(content)
-            
-            # Gestion des différents formats de réponse Mistral
-            if isinstance(parsed, dict):
-                # Cas 1: {"QCM": [...]} ou {"questions": [...]}
-                if 'QCM' in parsed:
-                    qcm_list = parsed['QCM']
-                elif 'questions' in parsed:
-                    qcm_list = parsed['questions']
-                else:
-                    # Cas 2: un seul QCM en dict
-                    qcm_list = [parsed]
-            else:
-                # Cas 3: array direct
-                qcm_list = parsed
-            
-            # Assure que c'est une liste
-            if not isinstance(qcm_list, list):
-                qcm_list = [qcm_list]
-            
-            # Validation et enrichissement
-            valid_qcms = []
-            for qcm in qcm_list:
-                # Validation format
-                if not validate_qcm_format(qcm):
-                    continue
-                
-                # Enrichissement avec métadonnées
-                qcm['module_id'] = module_id
-                qcm['chunk_id'] = chunk_id
-                qcm['source_pdf'] = chunk['source_pdf']
-                qcm['page'] = chunk.get('page_start', 0)
-                
-                valid_qcms.append(qcm)
-            
-            if valid_qcms:
-                return valid_qcms
-            else:
-                # Retry si aucun QCM valide
-                if attempt < MAX_RETRIES:
-                    time.sleep(RETRY_DELAY)
-                    continue
-                else:
-                    return []
+            def on_text(text: str) -> bool:
+                parser.feed(text)
+                return parser.should_stop
             
-        except json.JSONDecodeError as e:
-            if attempt < MAX_RETRIES:
-                time.sleep(RETRY_DELAY)
-                continue
-            else:
-                return []
+            await engine.chat_stream(on_text, model=model, messages=messages,
+                                     format='json', options=options)
+            return finish_stream(parser, module_id, chunks, cache, cache_key, model)
+        
+        response = await engine.chat(
+            model=model,
+            messages=messages,
+            format='json',
+            options=options
+        )
         
-        except Exception as e:
-            if attempt < MAX_RETRIES:
-                time.sleep(RETRY_DELAY)
+        content = response['message']['content']
+        valid_qcms = parse_qcm_response(content, module_id, chunks)
+        if not valid_qcms:
+            raise InvalidResponse("aucun QCM valide")
+        
+        cache.put(cache_key, content, model=model)
+        return valid_qcms
+    
+    try:
+        return await get_retry().acall(attempt)
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        return []
+
+def finish_stream(parser: QCMStreamParser, module_id: str, chunks: List[Dict],
+                  cache, cache_key: str, model: str) -> List[Dict]:
+    """
+    QCM retenus d'une réponse en streaming (éventuellement partielle).
+    
+    Seule une réponse complète et saine est mise en cache.
+    
+    Raises:
+        InvalidResponse si aucun QCM valide n'a été reçu
+    """
+    valid_qcms = attribute_qcms(parser.items, module_id, chunks)
+    if not valid_qcms:
+        raise InvalidResponse(parser.derailed or "aucun QCM valide")
+    
+    if parser.complete and not parser.derailed:
+        cache.put(cache_key, parser.text, model=model)
+    
+    return valid_qcms
+
+def enrich_qcm(qcm: Dict, module_id: str, chunk: Dict) -> Dict:
+    """Ajoute les métadonnées de provenance (module, chunk, PDF, page)."""
+    qcm['module_id'] = module_id
+    qcm['chunk_id'] = chunk['chunk_id']
+    qcm['source_pdf'] = chunk['source_pdf']
+    qcm['page'] = chunk.get('page_start', 0)
+    return qcm
+
+def attribute_qcms(qcm_list: List, module_id: str, chunks: List[Dict]) -> List[Dict]:
+    """
+    Valide les QCM et les rattache à leur chunk source.
+    
+    Prompt packé (plusieurs chunks) : le chunk est désigné par "chunk_index"
+    (1 à N) ; un QCM sans index exploitable est écarté (provenance inconnue).
+    
+    Chaque QCM garde dans "chunk_index" la position (0 à N-1) de son chunk
+    dans la tâche, retirée à l'enregistrement (les chunk_id peuvent se répéter).
+    """
+    valid_qcms = []
+    for qcm in qcm_list:
+        # Validation format
+        if not isinstance(qcm, dict) or not validate_qcm_format(qcm):
+            continue
+        
+        index = qcm.pop('chunk_index', None)
+        if len(chunks) == 1:
+            position = 0
+        else:
+            try:
+                index = int(index)
+            except (TypeError, ValueError):
                 continue
-            else:
-                return []
+            if not 1 <= index <= len(chunks):
+                continue
+            position = index - 1
+        
+        # Enrichissement avec métadonnées
+        qcm = enrich_qcm(qcm, module_id, chunks[position])
+        qcm['chunk_index'] = position
+        valid_qcms.append(qcm)
+    
+    return valid_qcms
+
+def parse_qcm_response(content: str, module_id: str, chunks: List[Dict]) -> List[Dict]:
+    """
+    Parse la réponse brute du modèle et enrichit les QCM valides.
+    
+    Raises:
+        json.JSONDecodeError si la réponse n'est pas du JSON
     
-    return []
+    Returns:
+        Liste des QCM au format valide (peut être vide)
+    """
+    # Nettoyage éventuel (si Mistral ajoute du texte avant/après)
+    content = content.strip()
+    if content.startswith('```json'):
+        content = content[7:]
+    if content.startswith('```'):
+        content = content[3:]
+    if content.endswith('```'):
+        content = content[:-3]
+    content = content.strip()
+    
+    # Parse JSON
+    parsed = json.loads(content)
+    
+    # Gestion des différents formats de réponse Mistral
+    if isinstance(parsed, dict):
+        # Cas 1: {"QCM": [...]} ou {"questions": [...]}
+        if 'QCM' in parsed:
+            qcm_list = parsed['QCM']
+        elif 'questions' in parsed:
+            qcm_list = parsed['questions']
+        else:
+            # Cas 2: un seul QCM en dict
+            qcm_list = [parsed]
+    else:
+        # Cas 3: array direct
+        qcm_list = parsed
+    
+    # Assure que c'est une liste
+    if not isinstance(qcm_list, list):
+        qcm_list = [qcm_list]
+    
+    # Validation et rattachement aux chunks
+    return attribute_qcms(qcm_list, module_id, chunks)
 
 def validate_qcm_format(qcm: Dict) -> bool:
     """
@@ -281,19 +547,57 @@ def update_progress(total: int, completed: int, successful: int, failed: int, qc
         except Exception:
             pass  # Ignore erreurs écriture
 
+def uncovered_positions(chunks: List[Dict], qcms: List[Dict]) -> List[int]:
+    """Positions des chunks d'un paquet pour lesquels la réponse packée n'a donné aucun QCM."""
+    if len(chunks) == 1:
+        return []
+    covered = {qcm['chunk_index'] for qcm in qcms}
+    return [position for position in range(len(chunks)) if position not in covered]
+
+def at_position(qcms: List[Dict], position: int) -> List[Dict]:
+    """QCM d'une requête individuelle, rattachés à la position du chunk dans le paquet."""
+    for qcm in qcms:
+        qcm['chunk_index'] = position
+    return qcms
+
 def generate_chunk_wrapper(args):
-    """Wrapper pour parallélisation."""
-    client, model, module_id, section_title, chunk, module_keywords, annales_profile = args
+    """Wrapper pour parallélisation (un chunk ou un paquet de chunks)."""
+    client, model, module_id, section_title, chunks, module_keywords, annales_profile, stream = args
     
-    # Skip chunks trop courts
-    if len(chunk.get('text', '')) < 100:
-        return None
-    
-    qcms = generate_qcm_for_chunk(
+    qcms = generate_qcm_for_chunks(
         client, model, module_id, section_title,
-        chunk, module_keywords, annales_profile
+        chunks, module_keywords, annales_profile, stream=stream
+    )
+    
+    # Chunks oubliés par la réponse packée : une requête individuelle chacun
+    for position in uncovered_positions(chunks, qcms):
+        qcms += at_position(generate_qcm_for_chunks(
+            client, model, module_id, section_title,
+            [chunks[position]], module_keywords, annales_profile, stream=stream
+        ), position)
+    
+    return qcms if qcms else None
+
+async def agenerate_chunk_wrapper(engine: AsyncOllamaEngine, args):
+    """Wrapper asynchrone (moteur asyncio), même logique que generate_chunk_wrapper."""
+    _, model, module_id, section_title, chunks, module_keywords, annales_profile, stream = args
+    
+    qcms = await agenerate_qcm_for_chunks(
+        engine, model, module_id, section_title,
+        chunks, module_keywords, annales_profile, stream=stream
     )
     
+    positions = uncovered_positions(chunks, qcms)
+    retries = await asyncio.gather(*(
+        agenerate_qcm_for_chunks(
+            engine, model, module_id, section_title,
+            [chunks[position]], module_keywords, annales_profile, stream=stream
+        )
+        for position in positions
+    ))
+    for position, chunk_qcms in zip(positions, retries):
+        qcms += at_position(chunk_qcms, position)
+    
     return qcms if qcms else None
 
 def generate_batch(
@@ -301,23 +605,62 @@ def generate_batch(
     keywords_data: Dict,
     annales_profile: Dict,
     model: str,
-    per_chunk: int
+    per_chunk: int,
+    engine: str = 'async',
+    max_in_flight: int = MAX_WORKERS,
+    request_timeout: float = DEFAULT_REQUEST_TIMEOUT,
+    checkpoint: Optional[ChunkCheckpoint] = None,
+    sink: Optional[JsonlWriter] = None,
+    stream_responses: bool = False,
+    pack_tokens: int = 0
 ) -> List[Dict]:
     """
     Génère des QCM pour tous les modules et chunks (PARALLÉLISÉ).
     
+    Args:
+        engine: 'async' (AsyncClient, requêtes en vol bornées) ou 'threads'
+        max_in_flight: Requêtes simultanées maximum ; la limite effective est
+            celle du limiteur partagé (configure_limiter, adaptatif par défaut)
+        request_timeout: Timeout par requête en mode async (secondes)
+        checkpoint: Journal des chunks terminés ; en reprise, les chunks
+            déjà présents sont sautés et leurs QCM repris tels quels
+        sink: Sortie JSONL en flux ; si fournie, chaque QCM y est écrit dès
+            la fin de son chunk et n'est pas conservé en mémoire
+        stream_responses: Réponses Ollama en streaming (parsing incrémental,
+            arrêt anticipé des sorties qui déraillent)
+        pack_tokens: Budget de contexte (tokens estimés) par requête ; les
+            petits chunks consécutifs d'une section partagent un prompt
+            (0 = un chunk par requête, défaut)
+    
     Returns:
-        Liste de tous les QCM générés
+        Liste de tous les QCM générés (repris + nouveaux), vide si sink
     """
     all_qcms = []
+    qcms_count = 0
+    
+    def collect(qcms: List[Dict]):
+        """Conserve les QCM d'un chunk (en mémoire ou dans le flux JSONL)."""
+        nonlocal qcms_count
+        qcms_count += len(qcms)
+        if sink:
+            sink.write_many(qcms)
+        else:
+            all_qcms.extend(qcms)
     
     # Stats
     total_chunks = 0
     successful_chunks = 0
     failed_chunks = 0
     
-    # Collecte tous les chunks à traiter
+    # Chunks terminés lors d'un run précédent
+    done_chunks = checkpoint.load() if checkpoint else {}
+    
+    # Position de chaque chunk dans son module (les chunk_id peuvent se répéter)
+    chunk_positions: Dict[int, int] = {}
+    
+    # Collecte tous les chunks à traiter (regroupés en paquets par section)
     tasks = []
+    pending_chunks = 0
     
     # Trouve tous les modules
     module_files = list(modules_dir.glob("*.json"))
@@ -325,7 +668,7 @@ def generate_batch(
     
     print(f"\n📁 {len(module_files)} modules à traiter")
     print(f"🎯 Objectif : {per_chunk} QCM par chunk")
-    print(f"⚡ Parallélisation : {MAX_WORKERS} workers")
+    print(f"⚡ Parallélisation : {max_in_flight} requêtes en vol (moteur {engine})")
     
     # Préparation tâches
     for module_file in sorted(module_files):
@@ -335,69 +678,112 @@ def generate_batch(
             module_data = json.load(f)
         
         module_keywords = keywords_data.get(module_id, {}).get('module_keywords', [])
+        chunk_position = -1
         
         for section in module_data.get('sections', []):
             section_title = section.get('title', 'Sans titre')
+            pending = []
             
             for chunk in section.get('chunks', []):
-                # Chaque client Ollama doit être créé dans son thread
+                total_chunks += 1
+                chunk_position += 1
+                chunk_positions[id(chunk)] = chunk_position
+                
+                resumed = done_chunks.get((module_id, chunk_position))
+                if resumed and resumed['chunk_id'] == chunk.get('chunk_id'):
+                    collect(resumed['qcms'])
+                    successful_chunks += 1
+                    continue
+                
+                # Skip chunks trop courts
+                if len(chunk.get('text', '')) < MIN_CHUNK_CHARS:
+                    failed_chunks += 1
+                    continue
+                
+                pending.append(chunk)
+            
+            for pack in pack_chunks(pending, pack_tokens):
+                pending_chunks += len(pack)
                 tasks.append((
-                    None,  # Client sera créé dans le thread
+                    None,  # Client choisi dans le pool à chaque requête
                     model,
                     module_id,
                     section_title,
-                    chunk,
+                    pack,
                     module_keywords,
-                    annales_profile
+                    annales_profile,
+                    stream_responses
                 ))
-                total_chunks += 1
     
     print(f"\n📊 {total_chunks} chunks à traiter")
+    if successful_chunks:
+        print(f"♻️  Reprise : {successful_chunks} chunks déjà terminés ({qcms_count} QCM), {pending_chunks} restants")
+    if pending_chunks > len(tasks):
+        print(f"📦 Packing : {pending_chunks} chunks regroupés en {len(tasks)} requêtes (≤ {pack_tokens} tokens)")
     
     # Initialise progression
-    update_progress(total_chunks, 0, 0, 0, 0)
+    completed = successful_chunks + failed_chunks
+    update_progress(total_chunks, completed, successful_chunks, failed_chunks, qcms_count)
     
     # Exécution parallèle
-    print(f"\n🚀 Démarrage génération parallèle ({MAX_WORKERS} workers)...")
-    
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        # Crée les clients dans chaque thread
-        def task_with_client(args):
-            task_args = list(args)
-            task_args[0] = Client()  # Client local au thread
-            return generate_chunk_wrapper(tuple(task_args))
-        
-        # Soumet toutes les tâches
-        futures = {executor.submit(task_with_client, task): task for task in tasks}
+    print(f"\n🚀 Démarrage génération parallèle ({max_in_flight} en vol, moteur {engine})...")
+    
+    with tqdm(total=total_chunks, initial=completed, desc="Génération globale", unit="chunk") as pbar:
         
-        # Progress bar
-        completed = 0
-        with tqdm(total=total_chunks, desc="Génération globale", unit="chunk") as pbar:
-            for future in as_completed(futures):
+        def record_result(task, result):
+            """Comptabilise les chunks d'une tâche terminée (appelé depuis un seul thread)."""
+            nonlocal completed, successful_chunks, failed_chunks
+            
+            for position, chunk in enumerate(task[4]):
                 completed += 1
+                chunk_qcms = [qcm for qcm in result or [] if qcm['chunk_index'] == position]
+                for qcm in chunk_qcms:
+                    del qcm['chunk_index']
                 
-                try:
-                    result = future.result()
-                    
-                    if result:
-                        all_qcms.extend(result)
-                        successful_chunks += 1
-                    else:
-                        failed_chunks += 1
-                    
-                    # Met à jour progression toutes les 5 chunks
-                    if completed % 5 == 0 or completed == total_chunks:
-                        update_progress(total_chunks, completed, successful_chunks, failed_chunks, len(all_qcms))
-                    
-                    pbar.update(1)
-                    pbar.set_postfix({
-                        'QCM': len(all_qcms),
-                        'Réussite': f"{(successful_chunks/completed*100):.1f}%"
-                    })
-                    
-                except Exception as e:
+                if checkpoint and chunk_qcms:
+                    checkpoint.record(task[2], chunk_positions[id(chunk)], chunk.get('chunk_id'), chunk_qcms)
+                
+                if chunk_qcms:
+                    collect(chunk_qcms)
+                    successful_chunks += 1
+                else:
                     failed_chunks += 1
-                    pbar.update(1)
+                
+                # Met à jour progression toutes les 5 chunks
+                if completed % 5 == 0 or completed == total_chunks:
+                    update_progress(total_chunks, completed, successful_chunks, failed_chunks, qcms_count)
+            
+            pbar.update(len(task[4]))
+            pbar.set_postfix({
+                'QCM': qcms_count,
+                'Réussite': f"{(successful_chunks/completed*100):.1f}%"
+            })
+        
+        if engine == 'async':
+            ollama_engine = AsyncOllamaEngine(
+                max_in_flight=max_in_flight,
+                request_timeout=request_timeout,
+                controller=get_limiter().controller
+            )
+            asyncio.run(ollama_engine.run_all(
+                tasks,
+                agenerate_chunk_wrapper,
+                lambda task, result, error: record_result(task, None if error else result)
+            ))
+        else:
+            with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+                # Soumet toutes les tâches
+                futures = {executor.submit(generate_chunk_wrapper, task): task for task in tasks}
+                
+                for future in as_completed(futures):
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = None
+                    record_result(futures[future], result)
+    
+    if checkpoint:
+        checkpoint.close()
     
     # Stats finales
     success_rate = (successful_chunks / total_chunks * 100) if total_chunks > 0 else 0
@@ -409,10 +795,10 @@ def generate_batch(
     print(f"Chunks réussis : {successful_chunks}")
     print(f"Chunks échoués : {failed_chunks}")
     print(f"Taux succès : {success_rate:.1f}%")
-    print(f"QCM générés : {len(all_qcms)}")
+    print(f"QCM générés : {qcms_count}")
     
     # Update finale
-    update_progress(total_chunks, total_chunks, successful_chunks, failed_chunks, len(all_qcms))
+    update_progress(total_chunks, total_chunks, successful_chunks, failed_chunks, qcms_count)
     
     return all_qcms
 
@@ -428,6 +814,28 @@ def main():
     parser.add_argument('--out', required=True, help='Fichier generated_raw.json de sortie')
     parser.add_argument('--model', default='mistral:latest', help='Modèle Ollama (défaut: mistral:latest)')
     parser.add_argument('--per-chunk', type=int, default=3, help='Nombre QCM par chunk (défaut: 3)')
+    parser.add_argument('--engine', choices=['async', 'threads'], default='async',
+                        help='Moteur de génération (défaut: async)')
+    parser.add_argument('--max-in-flight', type=int, default=MAX_WORKERS,
+                        help=f'Requêtes Ollama simultanées maximum (défaut: {MAX_WORKERS})')
+    parser.add_argument('--pack-tokens', type=int, default=0,
+                        help=f"Budget de contexte par requête : les chunks de moins de {PACK_CHUNK_MAX_TOKENS} tokens d'une section partagent un prompt (ex: {MAX_CHUNK_TOKENS} ; défaut: 0 = désactivé)")
+    parser.add_argument('--stream-responses', action='store_true',
+                        help='Réponses Ollama en streaming : QCM validés au fil des tokens, arrêt anticipé si la sortie déraille')
+    parser.add_argument('--ollama-hosts', default=None,
+                        help='Instances Ollama séparées par des virgules (défaut: OLLAMA_HOSTS, OLLAMA_HOST ou localhost)')
+    parser.add_argument('--fixed-concurrency', action='store_true',
+                        help='Désactive la concurrence adaptative (AIMD) : toujours --max-in-flight requêtes')
+    parser.add_argument('--request-timeout', type=float, default=DEFAULT_REQUEST_TIMEOUT,
+                        help=f'Timeout par requête en secondes, moteur async (défaut: {DEFAULT_REQUEST_TIMEOUT})')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Ignore le cache des réponses LLM (cache/llm)')
+    parser.add_argument('--checkpoint', default=None,
+                        help='Journal JSONL des chunks terminés (défaut: <out>.checkpoint.jsonl)')
+    parser.add_argument('--stream', action='store_true',
+                        help='Écrit chaque QCM dans <out>.jsonl dès sa génération, puis convertit en <out>')
+    parser.add_argument('--resume', action='store_true',
+                        help='Reprend un run interrompu : saute les chunks présents dans le checkpoint')
     
     args = parser.parse_args()
     
@@ -447,13 +855,14 @@ def main():
         annales_profile = json.load(f)
     print(f"   ✓ Profil chargé")
     
-    # Test connexion Ollama
+    # Test connexion Ollama (toutes les instances du pool)
     print(f"\n🔧 Test connexion Ollama...")
-    try:
-        client = Client()
-        print(f"   ✓ Connexion OK")
-    except Exception as e:
-        print(f"   ❌ Erreur connexion: {e}")
+    pool = configure_pool(args.ollama_hosts)
+    healthy = pool.check_health()
+    for endpoint in pool.endpoints:
+        print(f"   {'✓' if endpoint.host in healthy else '❌'} {endpoint.host}")
+    if not healthy:
+        print(f"   ❌ Aucune instance joignable")
         print(f"   Vérifiez que Ollama est démarré (ollama serve)")
         return 1
     
@@ -461,6 +870,29 @@ def main():
     print(f"\n🚀 Démarrage génération batch...")
     print(f"   Modèle : {args.model}")
     print(f"   QCM par chunk : {args.per_chunk}")
+    print(f"   Moteur : {args.engine} ({args.max_in_flight} requêtes en vol max)")
+    
+    limiter = configure_limiter(
+        adaptive=not args.fixed_concurrency,
+        max_limit=args.max_in_flight,
+        latency_ceiling=args.request_timeout / 2
+    )
+    print(f"   Concurrence : {'fixe' if args.fixed_concurrency else 'adaptative (AIMD)'}, "
+          f"départ à {limiter.controller.limit}")
+    
+    cache = configure_cache(enabled=not args.no_cache)
+    retry = configure_retry()
+    print(f"   Cache LLM : {'activé' if cache.enabled else 'désactivé'}")
+    if args.stream_responses:
+        print(f"   Réponses en streaming : arrêt anticipé si la sortie déraille")
+    
+    checkpoint_path = Path(args.checkpoint) if args.checkpoint else default_checkpoint_path(Path(args.out))
+    checkpoint = ChunkCheckpoint(checkpoint_path, resume=args.resume)
+    print(f"   Checkpoint : {checkpoint_path}{' (reprise)' if args.resume else ''}")
+    
+    sink = JsonlWriter(stream_path(Path(args.out))) if args.stream else None
+    if sink:
+        print(f"   Flux JSONL : {sink.path}")
     
     start_time = time.time()
     
@@ -469,19 +901,30 @@ def main():
         keywords_data,
         annales_profile,
         args.model,
-        args.per_chunk
+        args.per_chunk,
+        engine=args.engine,
+        max_in_flight=args.max_in_flight,
+        request_timeout=args.request_timeout,
+        checkpoint=checkpoint,
+        sink=sink,
+        stream_responses=args.stream_responses,
+        pack_tokens=args.pack_tokens
     )
+    qcms_count = len(qcms)
+    if sink:
+        sink.close()
+        qcms_count = sink.count
     
     elapsed_time = time.time() - start_time
     
     # Vérification objectif
     print(f"\n{'='*60}")
-    if len(qcms) >= 2500:
-        print(f"✅ OBJECTIF ATTEINT : {len(qcms)} QCM générés (≥ 2500)")
-    elif len(qcms) >= 2000:
-        print(f"⚠️  OBJECTIF PROCHE : {len(qcms)} QCM générés (objectif: ≥ 2500)")
+    if qcms_count >= 2500:
+        print(f"✅ OBJECTIF ATTEINT : {qcms_count} QCM générés (≥ 2500)")
+    elif qcms_count >= 2000:
+        print(f"⚠️  OBJECTIF PROCHE : {qcms_count} QCM générés (objectif: ≥ 2500)")
     else:
-        print(f"❌ OBJECTIF NON ATTEINT : {len(qcms)} QCM générés (objectif: ≥ 2500)")
+        print(f"❌ OBJECTIF NON ATTEINT : {qcms_count} QCM générés (objectif: ≥ 2500)")
         print(f"   Suggestion: augmenter --per-chunk ou améliorer taux succès")
     print(f"{'='*60}")
     
@@ -489,19 +932,27 @@ def main():
     output_path = Path(args.out)
     output_path.parent.mkdir(parents=True, exist_ok=True)
     
-    output_data = {
+    metadata = {
         'generated_at': datetime.now().isoformat(),
         'model': args.model,
-        'total_qcms': len(qcms),
-        'generation_time_seconds': round(elapsed_time, 2),
-        'questions': qcms
+        'total_qcms': qcms_count,
+        'generation_time_seconds': round(elapsed_time, 2)
     }
     
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(output_data, f, ensure_ascii=False, indent=2)
+    if sink:
+        # Conversion en flux : le corpus n'est jamais chargé en mémoire
+        jsonl_to_json(sink.path, output_path, metadata=metadata)
+    else:
+        output_data = {**metadata, 'questions': qcms}
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(output_data, f, ensure_ascii=False, indent=2)
     
     print(f"\n💾 QCM sauvegardés : {args.out}")
     print(f"⏱️  Temps total : {elapsed_time/60:.1f} minutes")
+    print(f"🗄️  Cache LLM : {cache.summary()}")
+    print(f"⚡ Concurrence : {limiter.controller.summary()}")
+    print(f"🖥️  Instances Ollama : {pool.summary()}")
+    print(f"🔁 Retries : {retry.summary()}")
     
     print("\n" + "="*60)
     print("✅ GÉNÉRATION BATCH TERMINÉE")
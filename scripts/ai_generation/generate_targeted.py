@@ -11,10 +11,15 @@ from pathlib import Path
 import time
 import sys
 
+# Ajoute le chemin pour importer les modules partagés
+sys.path.append(str(Path(__file__).parent.parent))
+
+from ai_generation.ollama_pool import configure_pool, get_pool, hosts_from_argv
+
 # Configuration
 SOURCE_PDF_DIR = Path("public/pdfs")
 OUTPUT_FILE = Path("src/data/questions/generated_targeted.json")
-OLLAMA_URL = "http://localhost:11434/api/generate"
+OLLAMA_URL = "/api/generate"  # Chemin résolu sur une instance du pool (--ollama-hosts)
 MODEL = "mistral:latest"
 TIMEOUT = 120
 
@@ -131,11 +136,13 @@ def generate_for_module(module_id: str, module_config: dict) -> list:
                 keywords=keywords
             )
             
-            response = requests.post(
-                OLLAMA_URL,
-                json={"model": MODEL, "prompt": prompt, "stream": False},
-                timeout=TIMEOUT
-            )
+            with get_pool().lease() as lease:
+                response = requests.post(
+                    lease.url(OLLAMA_URL),
+                    json={"model": MODEL, "prompt": prompt, "stream": False},
+                    timeout=TIMEOUT
+                )
+                lease.status(response.status_code)
             
             if response.status_code != 200:
                 print(f"      ⚠️  Erreur Ollama: {response.status_code}")
@@ -217,6 +224,9 @@ def main():
         # Par défaut, génère tous
         modules_to_generate = CRITICAL_MODULES
     
+    # Instances Ollama (--ollama-hosts, OLLAMA_HOSTS ou OLLAMA_HOST)
+    configure_pool(hosts_from_argv(sys.argv)).check_health()
+    
     total_target = sum(m["count"] for m in modules_to_generate.values())
     print(f"📊 Modules à renforcer : {len(modules_to_generate)}")
     print(f"🎯 Objectif total : +{total_target} QCM")
@@ -11,9 +11,14 @@ from pathlib import Path
 import time
 import sys
 
+# Ajoute le chemin pour importer les modules partagés
+sys.path.append(str(Path(__file__).parent.parent))
+
+from ai_generation.ollama_pool import configure_pool, get_pool, hosts_from_argv
+
 # Configuration
 OUTPUT_FILE = Path("src/data/questions/generated_targeted.json")
-OLLAMA_URL = "http://localhost:11434/api/generate"
+OLLAMA_URL = "/api/generate"  # Chemin résolu sur une instance du pool (--ollama-hosts)
 MODEL = "mistral:latest"
 TIMEOUT = 90
 
@@ -78,11 +83,13 @@ def generate_qcm(module_id, config):
                 context=config["context"]
             )
             
-            response = requests.post(
-                OLLAMA_URL,
-                json={"model": MODEL, "prompt": prompt, "stream": False},
-                timeout=TIMEOUT
-            )
+            with get_pool().lease() as lease:
+                response = requests.post(
+                    lease.url(OLLAMA_URL),
+                    json={"model": MODEL, "prompt": prompt, "stream": False},
+                    timeout=TIMEOUT
+                )
+                lease.status(response.status_code)
             
             if response.status_code != 200:
                 print(f"❌ Ollama error {response.status_code}")
@@ -132,6 +139,9 @@ def main():
     print("="*60)
     print()
     
+    # Instances Ollama (--ollama-hosts, OLLAMA_HOSTS ou OLLAMA_HOST)
+    configure_pool(hosts_from_argv(sys.argv)).check_health()
+    
     total = sum(m["count"] for m in MODULES.values())
     print(f"📊 {len(MODULES)} modules prioritaires")
     print(f"🎯 Objectif : +{total} QCM")
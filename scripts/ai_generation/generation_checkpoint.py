@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Checkpoint JSONL de la génération batch (reprise après interruption)
+Un run de plusieurs heures ne doit plus perdre les QCM déjà générés
+
+Objectif:
+- Journal append-only : une ligne JSON par chunk terminé avec ses QCM
+- Écriture flush + fsync à chaque ligne (survit à un crash / Ctrl+C)
+- Reprise (--resume) : les chunks terminés sont sautés, la sortie finale
+  est reconstruite à partir du journal
+- Dernière ligne tronquée (crash en pleine écriture) ignorée au chargement
+
+Seuls les chunks ayant produit des QCM sont considérés terminés : un chunk
+en échec est retenté à la reprise.
+
+Les chunk_id se répètent dans les modules : un chunk est identifié par sa
+position dans la liste aplatie des chunks de son module (chunk_position),
+le chunk_id n'est gardé que pour vérifier la correspondance à la reprise.
+
+Usage:
+    checkpoint = ChunkCheckpoint(path, resume=args.resume)
+    done = checkpoint.load()   # {(module_id, chunk_position): {'chunk_id', 'qcms'}}
+    ...
+    checkpoint.record(module_id, chunk_position, chunk_id, qcms)
+    checkpoint.close()
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+ChunkKey = Tuple[str, int]  # (module_id, position du chunk dans le module)
+
+def default_checkpoint_path(out_path: Path) -> Path:
+    """Checkpoint à côté du fichier de sortie : generated_raw.checkpoint.jsonl"""
+    out_path = Path(out_path)
+    return out_path.with_name(f"{out_path.stem}.checkpoint.jsonl")
+
+class ChunkCheckpoint:
+    """Journal append-only des chunks terminés (thread-safe)."""
+
+    def __init__(self, path: Path, resume: bool = False):
+        """
+        Args:
+            path: Fichier JSONL du checkpoint
+            resume: True = conserve le journal existant, False = nouveau run
+                (le journal précédent est écrasé)
+        """
+        self.path = Path(path)
+        self.resume = resume
+        self._lock = threading.Lock()
+        self._file = None
+
+    def load(self) -> Dict[ChunkKey, Dict]:
+        """
+        Chunks déjà terminés, {(module_id, chunk_position): {'chunk_id', 'qcms'}},
+        puis ouvre le journal en écriture (hors reprise, l'ancien journal est
+        écrasé ici).
+        
+        Une position journalisée deux fois garde sa première entrée ; les
+        lignes sans chunk_position (ancien format, ambiguës) sont ignorées et
+        leurs chunks regénérés.
+        
+        Retourne {} hors mode reprise ou si le journal n'existe pas.
+        """
+        done = {}
+        if not self.resume or not self.path.exists():
+            with self._lock:
+                self._open()
+            return done
+
+        duplicates = 0
+        legacy = 0
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Ligne tronquée par un crash
+                if not entry.get('qcms'):
+                    continue
+                if not isinstance(entry.get('chunk_position'), int):
+                    legacy += 1
+                    continue
+                key = (entry['module_id'], entry['chunk_position'])
+                if key in done:
+                    duplicates += 1
+                    continue
+                done[key] = {'chunk_id': entry.get('chunk_id'), 'qcms': entry['qcms']}
+        
+        if duplicates:
+            print(f"   ⚠️  Checkpoint : {duplicates} entrées en double ignorées (première conservée)")
+        if legacy:
+            print(f"   ⚠️  Checkpoint : {legacy} entrées sans position ignorées (chunks regénérés)")
+
+        with self._lock:
+            self._open()
+        return done
+
+    def _open(self):
+        """Ouvre le journal (append en reprise, écrasement sinon)."""
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.path, 'a' if self.resume else 'w', encoding='utf-8')
+            if self.resume and self._file.tell() > 0:
+                # Ligne tronquée en fin de journal : on repart sur une ligne neuve
+                with open(self.path, 'rb') as f:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        self._file.write("\n")
+
+    def record(self, module_id: str, chunk_position: int, chunk_id: Optional[str],
+               qcms: Optional[List[Dict]]):
+        """Ajoute un chunk terminé au journal (ignoré si aucun QCM)."""
+        if not qcms:
+            return
+        
+        entry = {
+            'module_id': module_id,
+            'chunk_position': chunk_position,
+            'chunk_id': chunk_id,
+            'completed_at': datetime.now().isoformat(),
+            'qcms': qcms
+        }
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+
+        with self._lock:
+            self._open()
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        """Ferme le journal (les données sont déjà sur disque)."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
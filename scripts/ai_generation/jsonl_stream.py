@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Sortie JSONL en flux pour les scripts de génération
+Un QCM validé = une ligne écrite (et flushée) dès qu'il est produit
+
+Objectif:
+- Mémoire constante quelle que soit la taille du corpus généré
+- Les étapes aval peuvent consommer le fichier pendant la génération
+- Conversion vers les formats existants : {"questions": [...]} ou liste brute
+- Lecture tolérante : une dernière ligne tronquée (crash) est ignorée
+
+Usage:
+    with JsonlWriter("src/data/questions/generated_raw.jsonl") as sink:
+        sink.write_many(qcms)
+
+    # Conversion (également en ligne de commande)
+    python scripts/ai_generation/jsonl_stream.py generated_raw.jsonl generated_raw.json
+    python scripts/ai_generation/jsonl_stream.py generated_massive.jsonl generated_massive.json --list
+"""
+
+import argparse
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional
+
+def stream_path(out_path: Path) -> Path:
+    """Fichier JSONL associé à une sortie JSON : generated_raw.json → generated_raw.jsonl"""
+    return Path(out_path).with_suffix('.jsonl')
+
+# =============================================================================
+# ÉCRITURE
+# =============================================================================
+
+class JsonlWriter:
+    """Écrivain JSONL thread-safe, une ligne flushée par enregistrement."""
+
+    def __init__(self, path: Path, append: bool = False):
+        """
+        Args:
+            path: Fichier JSONL de sortie
+            append: True = complète un fichier existant (reprise)
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.count = 0
+        self._lock = threading.Lock()
+        self._file = open(self.path, 'a' if append else 'w', encoding='utf-8')
+        if append and self._file.tell() > 0:
+            # Dernière ligne tronquée (crash) : on repart sur une ligne neuve
+            with open(self.path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    self._file.write("\n")
+
+    def write(self, record: Dict):
+        """Écrit un enregistrement et le rend visible immédiatement aux lecteurs."""
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            self.count += 1
+
+    def write_many(self, records: Iterable[Dict]):
+        """Écrit plusieurs enregistrements (un flush par lot)."""
+        lines = [json.dumps(r, ensure_ascii=False) + "\n" for r in records]
+        with self._lock:
+            self._file.writelines(lines)
+            self._file.flush()
+            self.count += len(lines)
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# =============================================================================
+# LECTURE / CONVERSION
+# =============================================================================
+
+def iter_jsonl(path: Path) -> Iterator[Dict]:
+    """Itère sur les enregistrements d'un fichier JSONL (lignes invalides ignorées)."""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Ligne en cours d'écriture ou tronquée
+
+def jsonl_to_json(
+    jsonl_path: Path,
+    out_path: Path,
+    metadata: Optional[Dict] = None,
+    as_list: bool = False
+) -> int:
+    """
+    Convertit un JSONL en JSON sans charger tout le corpus en mémoire.
+
+    Args:
+        jsonl_path: Fichier JSONL source
+        out_path: Fichier JSON de sortie
+        metadata: Champs ajoutés avant "questions" (ex. model, generated_at) ;
+            total_qcms est calculé automatiquement
+        as_list: True = liste brute [...] (format generate_massive*)
+
+    Returns:
+        Nombre de QCM écrits
+    """
+    out_path = Path(out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+
+    total = sum(1 for _ in iter_jsonl(jsonl_path))
+
+    with open(out_path, 'w', encoding='utf-8') as f:
+        if as_list:
+            f.write("[")
+            indent = "  "
+        else:
+            header = dict(metadata or {})
+            header['total_qcms'] = total
+            f.write("{\n")
+            for key, value in header.items():
+                f.write(f'  {json.dumps(key)}: {json.dumps(value, ensure_ascii=False)},\n')
+            f.write('  "questions": [')
+            indent = "    "
+
+        for i, record in enumerate(iter_jsonl(jsonl_path)):
+            body = json.dumps(record, ensure_ascii=False, indent=2).replace("\n", "\n" + indent)
+            f.write(("," if i else "") + "\n" + indent + body)
+
+        if as_list:
+            f.write("\n]" if total else "]")
+        else:
+            f.write(("\n  ]" if total else "]") + "\n}")
+
+    return total
+
+# =============================================================================
+# MAIN
+# =============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Conversion JSONL → JSON (format questions)")
+    parser.add_argument('input', help='Fichier JSONL (un QCM par ligne)')
+    parser.add_argument('output', help='Fichier JSON de sortie')
+    parser.add_argument('--list', action='store_true',
+                        help='Écrit une liste brute [...] au lieu de {"questions": [...]}')
+
+    args = parser.parse_args()
+
+    total = jsonl_to_json(Path(args.input), Path(args.output), as_list=args.list)
+    print(f"✅ {total} QCM convertis : {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Cache disque des réponses LLM (adressé par contenu)
+Partagé par les scripts de génération, raffinement et classification
+
+Objectif:
+- Clé = sha256(modèle + prompt système + prompt utilisateur + options)
+- Rejouer instantanément les appels déjà réussis après un crash ou un re-tuning
+- Éviction par taille (LRU approximatif via mtime, mis à jour à chaque hit)
+- put() uniquement sur un miss : une entrée relue n'est pas réécrite
+- Contournement : --no-cache dans les scripts ou LLM_CACHE=off
+
+Seules les réponses exploitables (JSON valide, module reconnu...) doivent être
+mises en cache : une réponse invalide rejouée au retry échouerait à nouveau.
+
+Usage:
+    cache = configure_cache(enabled=not args.no_cache)
+    key = cache.make_key(MODEL, SYSTEM_PROMPT, user_prompt, options)
+    content = cache.get(key)
+    if content is None:
+        content = ...appel Ollama...
+        if valide: cache.put(key, content)
+"""
+
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+DEFAULT_CACHE_DIR = Path(os.getenv("LLM_CACHE_DIR", "cache/llm"))
+DEFAULT_MAX_SIZE_MB = int(os.getenv("LLM_CACHE_MAX_MB", "1024"))
+EVICTION_TARGET = 0.9  # Après éviction, on redescend à 90% de la taille max
+
+def cache_disabled_by_env() -> bool:
+    """True si LLM_CACHE=off (ou 0/false/no) dans l'environnement."""
+    return os.getenv("LLM_CACHE", "on").strip().lower() in ("0", "off", "false", "no")
+
+# =============================================================================
+# CACHE
+# =============================================================================
+
+class LLMCache:
+    """Cache disque thread-safe : un fichier JSON par réponse."""
+
+    def __init__(
+        self,
+        cache_dir: Path = DEFAULT_CACHE_DIR,
+        max_size_mb: int = DEFAULT_MAX_SIZE_MB,
+        enabled: bool = True
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.max_size_bytes = max_size_mb * 1024 * 1024
+        self.enabled = enabled and not cache_disabled_by_env()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._size_bytes = None  # Calculé à la première écriture
+
+    @staticmethod
+    def make_key(model: str, system: Optional[str], prompt: str,
+                 options: Optional[Dict] = None, **extra) -> str:
+        """Hash stable de tout ce qui détermine la réponse du modèle."""
+        payload = {
+            'model': model,
+            'system': system or '',
+            'prompt': prompt,
+            'options': options or {},
+            **extra
+        }
+        serialized = json.dumps(payload, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        """Répartit les entrées en 256 sous-dossiers (ab/abcdef...json)."""
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[str]:
+        """Retourne la réponse en cache, ou None (absente / cache désactivé)."""
+        if not self.enabled:
+            return None
+
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            os.utime(path)  # Marque l'entrée comme récemment utilisée (LRU)
+        except (OSError, json.JSONDecodeError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return entry.get('response')
+
+    def put(self, key: str, response: str, model: str = None):
+        """
+        Enregistre une réponse (écriture atomique) puis évince si nécessaire.
+        
+        À appeler sur un miss uniquement ; une entrée existante est remplacée
+        et seule la différence de taille est comptée.
+        """
+        if not self.enabled:
+            return
+
+        path = self._path(key)
+        entry = {
+            'key': key,
+            'model': model,
+            'created_at': datetime.now().isoformat(),
+            'response': response
+        }
+
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            size = tmp_path.stat().st_size
+            try:
+                old_size = path.stat().st_size
+            except OSError:
+                old_size = 0
+            os.replace(tmp_path, path)
+        except OSError:
+            return  # Le cache ne doit jamais faire échouer la génération
+        
+        with self._lock:
+            if self._size_bytes is None:
+                self._size_bytes = self._scan_size()
+            else:
+                self._size_bytes += size - old_size
+            if self._size_bytes > self.max_size_bytes:
+                self._evict()
+
+    def _scan_size(self) -> int:
+        """Taille totale actuelle du cache sur disque (entrées évincées entre-temps ignorées)."""
+        total = 0
+        for p in self.cache_dir.glob("*/*.json"):
+            try:
+                total += p.stat().st_size
+            except OSError:
+                continue
+        return total
+
+    def _evict(self):
+        """Supprime les entrées les moins récemment utilisées (appelé sous verrou)."""
+        entries = []
+        for p in self.cache_dir.glob("*/*.json"):
+            try:
+                stat = p.stat()
+                entries.append((stat.st_mtime, stat.st_size, p))
+            except OSError:
+                continue
+
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        target = self.max_size_bytes * EVICTION_TARGET
+
+        for _, size, p in entries:
+            if total <= target:
+                break
+            try:
+                p.unlink()
+                total -= size
+            except OSError:
+                continue
+
+        self._size_bytes = total
+
+    def summary(self) -> str:
+        """Résumé lisible hits/misses pour les rapports de fin de script."""
+        if not self.enabled:
+            return "cache désactivé"
+        total = self.hits + self.misses
+        rate = self.hits / total * 100 if total else 0
+        return f"{self.hits} hits / {total} lookups ({rate:.1f}%)"
+
+# =============================================================================
+# INSTANCE PARTAGÉE
+# =============================================================================
+
+_cache: Optional[LLMCache] = None
+
+def configure_cache(enabled: bool = True, cache_dir: Path = DEFAULT_CACHE_DIR,
+                    max_size_mb: int = DEFAULT_MAX_SIZE_MB) -> LLMCache:
+    """(Re)configure le cache partagé du processus (appelé depuis main)."""
+    global _cache
+    _cache = LLMCache(cache_dir=cache_dir, max_size_mb=max_size_mb, enabled=enabled)
+    return _cache
+
+def get_cache() -> LLMCache:
+    """Cache partagé, configuré avec les valeurs par défaut si besoin."""
+    global _cache
+    if _cache is None:
+        _cache = LLMCache()
+    return _cache
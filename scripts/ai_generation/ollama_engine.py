@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Moteur asynchrone d'appels Ollama
+Génération massive : saturation du serveur local sans pool de threads
+
+Objectif:
+- Remplacer ThreadPoolExecutor + Client bloquant par ollama.AsyncClient
+- Borner le nombre de requêtes en vol (--max-in-flight)
+- Timeout par requête et annulation propre (Ctrl+C, erreur fatale)
+- Callbacks de résultat exécutés dans la boucle (pas de verrou nécessaire)
+- Limite optionnellement pilotée par un AIMDController (latence / erreurs)
+- Requêtes réparties sur les instances du pool Ollama (ollama_pool)
+- Streaming (chat_stream) avec interruption anticipée par l'appelant
+
+Usage:
+    engine = AsyncOllamaEngine(max_in_flight=8, request_timeout=180)
+    asyncio.run(engine.run_all(items, worker, on_result))
+
+    # Concurrence adaptative, bornée par max_in_flight
+    engine = AsyncOllamaEngine(controller=AIMDController(max_limit=8))
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from ai_generation.adaptive_concurrency import AIMDController, classify_error
+from ai_generation.ollama_pool import OllamaPool, get_pool
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+DEFAULT_MAX_IN_FLIGHT = 4  # Même charge que l'ancien MAX_WORKERS
+DEFAULT_REQUEST_TIMEOUT = 180  # secondes (cf. generate_massive_optimized)
+
+# =============================================================================
+# MOTEUR
+# =============================================================================
+
+class AsyncOllamaEngine:
+    """Client Ollama asynchrone avec requêtes en vol bornées."""
+
+    def __init__(
+        self,
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+        request_timeout: float = DEFAULT_REQUEST_TIMEOUT,
+        host: Optional[str] = None,
+        controller: Optional[AIMDController] = None,
+        pool: Optional[OllamaPool] = None
+    ):
+        """
+        Args:
+            max_in_flight: Nombre maximum de requêtes envoyées simultanément
+            request_timeout: Timeout (s) d'une requête, None = illimité
+            host: URL d'un serveur Ollama unique (prioritaire sur pool)
+            pool: Pool d'instances Ollama (défaut: pool partagé, cf. get_pool)
+            controller: Limite adaptative ; remplace max_in_flight (qui
+                devient controller.max_limit)
+        """
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight doit être ≥ 1")
+
+        self.controller = controller
+        self.max_in_flight = controller.max_limit if controller else max_in_flight
+        self.request_timeout = request_timeout
+        self.pool = OllamaPool([host]) if host else (pool or get_pool())
+        self._slots = None
+        self._in_flight = 0
+
+    def _ensure_started(self):
+        """Crée la condition d'admission dans la boucle courante (lazy)."""
+        if self._slots is None:
+            self._slots = asyncio.Condition()
+
+    def _limit(self) -> int:
+        """Requêtes autorisées en vol (fixe ou pilotée par le contrôleur)."""
+        return self.controller.limit if self.controller else self.max_in_flight
+
+    @asynccontextmanager
+    async def _request(self):
+        """
+        Admission sous la limite courante, instance du pool, mesure pour le
+        contrôleur adaptatif ; fournit le client de l'instance choisie.
+        """
+        self._ensure_started()
+        async with self._slots:
+            await self._slots.wait_for(lambda: self._in_flight < self._limit())
+            self._in_flight += 1
+
+        outcome = None
+        cancelled = False
+        start = time.monotonic()
+        try:
+            with self.pool.lease() as lease:
+                yield self.pool.client(lease.endpoint, asynchronous=True)
+        except asyncio.CancelledError:
+            cancelled = True  # Annulation locale : rien à apprendre sur le serveur
+            raise
+        except Exception as e:
+            outcome = classify_error(e)
+            raise
+        finally:
+            if self.controller and not cancelled:
+                self.controller.record(time.monotonic() - start, outcome)
+            async with self._slots:
+                self._in_flight -= 1
+                self._slots.notify_all()
+
+    async def chat(self, **kwargs) -> Dict:
+        """
+        Appel chat borné par la limite courante et le timeout.
+
+        Raises:
+            asyncio.TimeoutError si la requête dépasse request_timeout
+        """
+        async with self._request() as client:
+            return await asyncio.wait_for(
+                client.chat(**kwargs),
+                timeout=self.request_timeout
+            )
+
+    async def chat_stream(self, on_text: Callable[[str], bool], **kwargs):
+        """
+        Appel chat en streaming : on_text(morceau) est appelé à chaque token
+        reçu ; s'il retourne True, la requête est interrompue (connexion
+        fermée, le serveur cesse de générer).
+
+        Raises:
+            asyncio.TimeoutError si la réponse complète dépasse request_timeout
+        """
+        async with self._request() as client:
+            async def consume():
+                stream = await client.chat(stream=True, **kwargs)
+                try:
+                    async for part in stream:
+                        if on_text(part['message']['content']):
+                            break
+                finally:
+                    aclose = getattr(stream, 'aclose', None)
+                    if aclose:
+                        await aclose()
+
+            await asyncio.wait_for(consume(), timeout=self.request_timeout)
+
+    async def run_all(
+        self,
+        items: Iterable[Any],
+        worker: Callable[["AsyncOllamaEngine", Any], Awaitable[Any]],
+        on_result: Optional[Callable[[Any, Any, Optional[BaseException]], None]] = None
+    ) -> List[Any]:
+        """
+        Exécute worker(engine, item) pour chaque item, en parallèle.
+
+        La concurrence réelle est bornée par chat() : les coroutines en attente
+        ne coûtent rien tant qu'elles n'ont pas obtenu de slot.
+
+        Args:
+            items: Éléments à traiter
+            worker: Coroutine appelée pour chaque élément
+            on_result: Callback on_result(item, result, error) appelé dans la
+                boucle à chaque fin de tâche (ordre de complétion)
+
+        Returns:
+            Résultats dans l'ordre de complétion (None pour les échecs)
+        """
+        self._ensure_started()
+
+        async def run_one(item):
+            try:
+                return item, await worker(self, item), None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                return item, None, e
+
+        tasks = [asyncio.ensure_future(run_one(item)) for item in items]
+        results = []
+
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                item, result, error = await next_done
+                results.append(result)
+                if on_result:
+                    on_result(item, result, error)
+        finally:
+            # Annulation des tâches restantes (Ctrl+C, exception dans on_result)
+            pending = [t for t in tasks if not t.done()]
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        return results
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Pool d'instances Ollama (routage vers l'instance la moins chargée)
+Répartit un même run de génération sur plusieurs serveurs / processus Ollama
+
+Objectif:
+- Liste d'endpoints : --ollama-hosts, sinon OLLAMA_HOSTS (séparés par des
+  virgules), sinon OLLAMA_HOST, sinon http://localhost:11434
+- Chaque requête part vers l'endpoint sain ayant le moins de requêtes en vol
+- Un endpoint en échec (timeout, 5xx, connexion refusée) est éjecté après
+  EJECT_AFTER échecs consécutifs, puis réadmis à l'essai après un délai
+  croissant (une requête test : succès = réadmis, échec = délai doublé)
+- Vérification de santé (GET /api/tags) au démarrage
+
+Usage:
+    pool = configure_pool(args.ollama_hosts)
+    pool.check_health()
+
+    # requests (API HTTP brute)
+    with get_pool().lease() as lease:
+        response = requests.post(lease.url("/api/generate"), json=payload, timeout=TIMEOUT)
+        lease.status(response.status_code)
+
+    # ollama.Client (un client réutilisé par endpoint)
+    with get_pool().lease() as lease:
+        response = get_pool().client(lease.endpoint).chat(...)
+"""
+
+import os
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from ai_generation.adaptive_concurrency import OVERLOAD, SlotOutcome
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+DEFAULT_HOST = "http://localhost:11434"
+EJECT_AFTER = 3  # Échecs consécutifs avant éjection
+BASE_COOLDOWN = 15.0  # secondes avant la première tentative de réadmission
+MAX_COOLDOWN = 300.0
+HEALTH_TIMEOUT = 3  # secondes (GET /api/tags)
+
+def normalize_host(host: str) -> str:
+    """'gpu1:11434' → 'http://gpu1:11434' (sans slash final)."""
+    host = host.strip().rstrip('/')
+    if not host.startswith(('http://', 'https://')):
+        host = f"http://{host}"
+    return host
+
+def parse_hosts(hosts: Optional[Union[str, Sequence[str]]] = None) -> List[str]:
+    """Liste d'endpoints depuis l'argument, OLLAMA_HOSTS ou OLLAMA_HOST."""
+    if not hosts:
+        hosts = os.getenv("OLLAMA_HOSTS") or os.getenv("OLLAMA_HOST") or DEFAULT_HOST
+    if isinstance(hosts, str):
+        hosts = hosts.split(',')
+    parsed = [normalize_host(h) for h in hosts if h.strip()]
+    return list(dict.fromkeys(parsed))  # Dédoublonne en gardant l'ordre
+
+# =============================================================================
+# ENDPOINTS
+# =============================================================================
+
+class OllamaEndpoint:
+    """État d'une instance Ollama (modifié sous le verrou du pool)."""
+
+    def __init__(self, host: str):
+        self.host = host
+        self.in_flight = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0  # 0 = sain
+        self.cooldown = BASE_COOLDOWN
+        self.probing = False  # Requête test en cours après éjection
+        self.requests = 0
+        self.failures = 0
+
+    def url(self, path: str) -> str:
+        return f"{self.host}{path}"
+
+    @property
+    def ejected(self) -> bool:
+        return self.ejected_until > 0
+
+class EndpointLease(SlotOutcome):
+    """Endpoint attribué à une requête ; status()/error() comme SlotOutcome."""
+
+    def __init__(self, endpoint: OllamaEndpoint, probe: bool = False):
+        super().__init__()
+        self.endpoint = endpoint
+        self.probe = probe  # Requête test de réadmission
+
+    def url(self, path: str) -> str:
+        return self.endpoint.url(path)
+
+# =============================================================================
+# POOL
+# =============================================================================
+
+class OllamaPool:
+    """Routage least-loaded avec éjection / réadmission des endpoints (thread-safe)."""
+
+    def __init__(self, hosts: Optional[Union[str, Sequence[str]]] = None):
+        self.endpoints = [OllamaEndpoint(h) for h in parse_hosts(hosts)]
+        self._lock = threading.Lock()
+        self._next = 0  # Départage round-robin à charge égale
+        self._clients: Dict[tuple, object] = {}
+
+    def _pick(self) -> Tuple[OllamaEndpoint, bool]:
+        """Choisit l'endpoint, et indique si la requête est sa requête test (appelé sous verrou)."""
+        now = time.monotonic()
+        candidates = []
+        for ep in self.endpoints:
+            if not ep.ejected:
+                candidates.append(ep)
+            elif not ep.probing and now >= ep.ejected_until:
+                # Délai écoulé : une requête test décide de la réadmission
+                ep.probing = True
+                return ep, True
+
+        if not candidates:
+            # Tout est éjecté : on tente celui qui sera réadmis le plus tôt
+            return min(self.endpoints, key=lambda ep: ep.ejected_until), False
+
+        n = len(candidates)
+        start = self._next % n
+        self._next += 1
+        rotated = candidates[start:] + candidates[:start]
+        return min(rotated, key=lambda ep: ep.in_flight), False
+    
+    def acquire(self) -> Tuple[OllamaEndpoint, bool]:
+        """(endpoint, requête test) pour une nouvelle requête."""
+        with self._lock:
+            ep, probe = self._pick()
+            ep.in_flight += 1
+            ep.requests += 1
+            return ep, probe
+    
+    def release(self, ep: OllamaEndpoint, outcome: Optional[str] = None, probe: bool = False):
+        """
+        Libère l'endpoint et met à jour sa santé.
+        
+        Seules les erreurs de type OVERLOAD (timeout, 5xx, connexion) comptent
+        contre l'endpoint : une réponse mal formée n'est pas sa faute.
+        probing n'est levé qu'à la libération de la requête test elle-même.
+        """
+        with self._lock:
+            ep.in_flight -= 1
+            if outcome == OVERLOAD:
+                ep.failures += 1
+                ep.consecutive_failures += 1
+                if probe:
+                    ep.cooldown = min(MAX_COOLDOWN, ep.cooldown * 2)
+                    self._eject(ep)
+                elif not ep.ejected and ep.consecutive_failures >= EJECT_AFTER:
+                    self._eject(ep)
+            else:
+                ep.consecutive_failures = 0
+                if ep.ejected:
+                    ep.ejected_until = 0.0
+                    ep.cooldown = BASE_COOLDOWN
+            if probe:
+                ep.probing = False
+
+    def _eject(self, ep: OllamaEndpoint):
+        """Éjecte l'endpoint pour ep.cooldown secondes (appelé sous verrou)."""
+        if len(self.endpoints) > 1:
+            print(f"   ⚠️  Ollama {ep.host} éjecté pour {ep.cooldown:.0f}s")
+        ep.ejected_until = time.monotonic() + ep.cooldown
+
+    @contextmanager
+    def lease(self):
+        """
+        Attribue un endpoint le temps d'une requête.
+
+        Les exceptions levées dans le bloc sont classées puis propagées ;
+        un code HTTP se signale avec lease.status(code).
+        """
+        lease = EndpointLease(*self.acquire())
+        try:
+            yield lease
+        except Exception as e:
+            lease.error(e)
+            raise
+        finally:
+            self.release(lease.endpoint, lease.kind, lease.probe)
+
+    def client(self, ep: OllamaEndpoint, asynchronous: bool = False):
+        """ollama.Client / AsyncClient réutilisé pour cet endpoint."""
+        key = (ep.host, asynchronous)
+        with self._lock:
+            if key not in self._clients:
+                from ollama import AsyncClient, Client
+                self._clients[key] = (AsyncClient if asynchronous else Client)(host=ep.host)
+            return self._clients[key]
+
+    def check_health(self, timeout: float = HEALTH_TIMEOUT) -> List[str]:
+        """
+        Interroge chaque endpoint (GET /api/tags) ; les injoignables sont éjectés.
+
+        Returns:
+            Hôtes sains
+        """
+        healthy = []
+        for ep in self.endpoints:
+            try:
+                with urllib.request.urlopen(ep.url("/api/tags"), timeout=timeout) as response:
+                    ok = response.status == 200
+            except OSError:
+                ok = False
+
+            with self._lock:
+                if ok:
+                    ep.ejected_until = 0.0
+                    ep.consecutive_failures = 0
+                    healthy.append(ep.host)
+                else:
+                    self._eject(ep)
+        return healthy
+
+    def summary(self) -> str:
+        """Répartition des requêtes pour les rapports de fin de script."""
+        parts = []
+        for ep in self.endpoints:
+            state = " (éjecté)" if ep.ejected else ""
+            parts.append(f"{ep.host}: {ep.requests} req / {ep.failures} échecs{state}")
+        return ", ".join(parts)
+
+# =============================================================================
+# INSTANCE PARTAGÉE
+# =============================================================================
+
+_pool: Optional[OllamaPool] = None
+
+def configure_pool(hosts: Optional[Union[str, Sequence[str]]] = None) -> OllamaPool:
+    """(Re)configure le pool partagé du processus (appelé depuis main)."""
+    global _pool
+    _pool = OllamaPool(hosts)
+    return _pool
+
+def get_pool() -> OllamaPool:
+    """Pool partagé, configuré depuis l'environnement si besoin."""
+    global _pool
+    if _pool is None:
+        _pool = OllamaPool()
+    return _pool
+
+def hosts_from_argv(argv: Sequence[str]) -> Optional[str]:
+    """Valeur de --ollama-hosts pour les scripts sans argparse."""
+    if "--ollama-hosts" in argv:
+        idx = list(argv).index("--ollama-hosts")
+        if idx + 1 < len(argv):
+            return argv[idx + 1]
+    return None
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Index de recherche persistant des pages de cours (et des chunks)
+Partagé par align_cta_semantic, audit_full_corpus et les futurs outils de recherche
+
+Objectif:
+- Une ligne par page de PDF (ou par chunk de module) : id → (pdf, page)
+- Mise à jour incrémentale : seules les sources nouvelles ou modifiées
+  (taille / date du fichier) sont réextraites et réencodées, les sources
+  disparues sont retirées
+- Embeddings via embedding_store (normalisés : cosinus = produit scalaire)
+- Recherche exacte vectorisée (produit matriciel par blocs + argpartition),
+  suffisante à l'échelle du corpus (quelques milliers de pages)
+- Stockage dans cache/page_index/<collection>/ (entrées, vecteurs)
+
+Usage:
+    index = get_page_index()                        # Pages de tous les PDF de cours
+    hits = index.query(["Quelle est la PAM ?"], k=5)[0]
+    # [{'id': 'cours.pdf#12', 'pdf': 'cours.pdf', 'page': 12, 'score': 0.71}, ...]
+
+    chunks = EmbeddingIndex("chunks")
+    chunks.sync(chunk_sources(Path("src/data/modules")))
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ai_generation.embedding_store import get_embedding_store
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+DEFAULT_INDEX_DIR = Path(os.getenv("PAGE_INDEX_DIR", "cache/page_index"))
+DEFAULT_MODEL = "all-MiniLM-L6-v2"
+PDF_DIRS = [Path("src/data/sources"), Path("public/pdfs")]  # Premier trouvé prioritaire
+
+SCORE_BLOCK = 1024  # Requêtes par produit matriciel (borne la mémoire)
+
+# Source = (empreinte, chargeur) ; le chargeur renvoie [(entrée, texte), ...]
+Source = Tuple[str, Callable[[], List[Tuple[Dict, str]]]]
+
+def vectors_checksum(vectors: np.ndarray) -> str:
+    return hashlib.sha1(np.ascontiguousarray(vectors).tobytes()).hexdigest()
+
+def file_fingerprint(path: Path) -> str:
+    """Empreinte bon marché d'un fichier (taille + date de modification)."""
+    stat = Path(path).stat()
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+# =============================================================================
+# SOURCES
+# =============================================================================
+
+def find_course_pdfs(directories: Sequence[Path] = PDF_DIRS) -> Dict[str, Path]:
+    """PDF de cours par nom de fichier (premier dossier prioritaire)."""
+    pdfs = {}
+    for directory in directories:
+        if directory.exists():
+            for pdf_path in sorted(directory.glob("*.pdf")):
+                pdfs.setdefault(pdf_path.name, pdf_path)
+    return pdfs
+
+def extract_pdf_pages(pdf_path: Path) -> List[str]:
+    """Texte nettoyé de chaque page d'un PDF."""
+    import fitz  # PyMuPDF
+
+    with fitz.open(pdf_path) as doc:
+        return [" ".join(page.get_text("text").split()) for page in doc]
+
+def pdf_sources(pdfs: Dict[str, Path]) -> Dict[str, Source]:
+    """Sources « une entrée par page » pour une collection de PDF."""
+    def loader(pdf_name: str, pdf_path: Path):
+        def load():
+            return [
+                ({'id': f"{pdf_name}#{page}", 'pdf': pdf_name, 'page': page}, text)
+                for page, text in enumerate(extract_pdf_pages(pdf_path), 1)
+            ]
+        return load
+
+    return {name: (file_fingerprint(path), loader(name, path)) for name, path in pdfs.items()}
+
+def chunk_sources(modules_dir: Path) -> Dict[str, Source]:
+    """Sources « une entrée par chunk » pour les modules (src/data/modules/*.json)."""
+    def loader(module_file: Path):
+        def load():
+            with open(module_file, 'r', encoding='utf-8') as f:
+                module_data = json.load(f)
+            items = []
+            for section in module_data.get('sections', []):
+                for chunk in section.get('chunks', []):
+                    if chunk.get('text'):
+                        page = chunk.get('page_start')
+                        items.append(({
+                            'id': chunk['chunk_id'],
+                            'pdf': chunk.get('source_pdf'),
+                            'page': int(page) if str(page).isdigit() else None
+                        }, chunk['text']))
+            return items
+        return load
+
+    return {f.name: (file_fingerprint(f), loader(f)) for f in sorted(Path(modules_dir).glob("*.json"))}
+
+# =============================================================================
+# INDEX
+# =============================================================================
+
+class EmbeddingIndex:
+    """Collection d'embeddings persistée, mise à jour par source, interrogeable en top-k."""
+
+    def __init__(self, name: str, model_name: str = DEFAULT_MODEL,
+                 index_dir: Path = DEFAULT_INDEX_DIR, store=None):
+        """
+        Args:
+            name: Nom de la collection ("pages", "chunks"...)
+            model_name: Modèle sentence-transformers des embeddings
+            index_dir: Racine des index (un sous-dossier par collection)
+            store: EmbeddingStore à utiliser (défaut: stockage partagé du modèle)
+        """
+        self.name = name
+        self.model_name = model_name
+        self.dir = Path(index_dir) / name
+        self.store = store if store is not None else get_embedding_store(model_name)
+
+        self.entries: List[Dict] = []  # Ligne i de la matrice → entrée
+        self.sources: Dict[str, Dict] = {}  # source → {fingerprint, start, count}
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def fingerprint(self) -> str:
+        """Empreinte de l'ensemble des sources indexées (change si un PDF change)."""
+        payload = json.dumps({key: info['fingerprint'] for key, info in self.sources.items()},
+                             sort_keys=True)
+        return hashlib.sha1(f"{self.model_name}|{payload}".encode('utf-8')).hexdigest()
+
+    # -------------------------------------------------------------------------
+    # Persistance
+    # -------------------------------------------------------------------------
+
+    def _load(self):
+        try:
+            with open(self.dir / "entries.json", 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            vectors = np.load(self.dir / "vectors.npy")
+        except (OSError, ValueError):
+            return
+        if meta.get('model') != self.model_name or meta.get('checksum') != vectors_checksum(vectors):
+            return  # Autre modèle ou écriture interrompue : reconstruction complète
+
+        self.entries = meta['entries']
+        self.sources = meta['sources']
+        self.vectors = vectors
+
+    def _save(self):
+        self.dir.mkdir(parents=True, exist_ok=True)
+        np.save(self.dir / "vectors.tmp.npy", self.vectors)
+        os.replace(self.dir / "vectors.tmp.npy", self.dir / "vectors.npy")
+
+        # Écrit en dernier : fait foi pour la cohérence au rechargement
+        tmp_path = self.dir / "entries.tmp.json"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'model': self.model_name, 'checksum': vectors_checksum(self.vectors),
+                       'sources': self.sources, 'entries': self.entries}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.dir / "entries.json")
+
+    # -------------------------------------------------------------------------
+    # Mise à jour
+    # -------------------------------------------------------------------------
+
+    def sync(self, sources: Dict[str, Source], prune: bool = True) -> Dict[str, int]:
+        """
+        Aligne l'index sur les sources (réencode seulement ce qui a changé).
+
+        Args:
+            sources: {source: (empreinte, chargeur)}
+            prune: Retire les sources absentes de `sources`
+
+        Returns:
+            Compteurs {'unchanged', 'updated', 'removed'} (sources)
+        """
+        stale = {key for key, (fingerprint, _) in sources.items()
+                 if self.sources.get(key, {}).get('fingerprint') != fingerprint}
+        removed = set(self.sources) - set(sources) if prune else set()
+        counts = {'unchanged': len(sources) - len(stale), 'updated': len(stale), 'removed': len(removed)}
+        if not stale and not removed:
+            return counts
+
+        # Conserve les lignes des sources inchangées
+        keep_rows = []
+        kept_sources = {}
+        for key, info in self.sources.items():
+            if key in stale or key in removed:
+                continue
+            start = len(keep_rows)
+            keep_rows.extend(range(info['start'], info['start'] + info['count']))
+            kept_sources[key] = {**info, 'start': start}
+
+        entries = [self.entries[row] for row in keep_rows]
+        blocks = [self.vectors[keep_rows]] if keep_rows else []
+
+        # Extrait et encode les sources nouvelles ou modifiées
+        for key in sorted(stale):
+            fingerprint, load = sources[key]
+            try:
+                items = load()
+            except Exception as e:
+                print(f"   ⚠️  Index {self.name} : source {key} illisible ({e})")
+                continue
+            if items:
+                blocks.append(self.store.encode([text for _, text in items]))
+            kept_sources[key] = {'fingerprint': fingerprint, 'start': len(entries), 'count': len(items)}
+            entries.extend(entry for entry, _ in items)
+
+        self.entries = entries
+        self.sources = kept_sources
+        self.vectors = np.vstack(blocks).astype(np.float32) if blocks else np.zeros((0, 0), dtype=np.float32)
+        self._save()
+        return counts
+
+    # -------------------------------------------------------------------------
+    # Recherche
+    # -------------------------------------------------------------------------
+
+    def search(self, query_vectors: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k exact des lignes pour des embeddings normalisés.
+
+        Returns:
+            (rows, scores) : np.ndarray (n_queries, k') triés par score décroissant,
+            k' = min(k, len(index))
+        """
+        query_vectors = np.ascontiguousarray(query_vectors, dtype=np.float32)
+        k = min(k, len(self))
+        if k == 0 or len(query_vectors) == 0:
+            return (np.zeros((len(query_vectors), 0), dtype=np.int64),
+                    np.zeros((len(query_vectors), 0), dtype=np.float32))
+
+        rows = np.zeros((len(query_vectors), k), dtype=np.int64)
+        scores = np.zeros((len(query_vectors), k), dtype=np.float32)
+        for start in range(0, len(query_vectors), SCORE_BLOCK):
+            sims = query_vectors[start:start + SCORE_BLOCK] @ self.vectors.T
+            top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(sims, top, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind='stable')
+            rows[start:start + SCORE_BLOCK] = np.take_along_axis(top, order, axis=1)
+            scores[start:start + SCORE_BLOCK] = np.take_along_axis(top_scores, order, axis=1)
+        return rows, scores
+
+    def query(self, texts: Sequence[str], k: int = 5) -> List[List[Dict]]:
+        """Top-k entrées (avec score) pour chaque texte."""
+        rows, scores = self.search(self.store.encode(list(texts)), k)
+        return [
+            [{**self.entries[row], 'score': float(score)} for row, score in zip(row_list, score_list)]
+            for row_list, score_list in zip(rows, scores)
+        ]
+
+    def summary(self) -> str:
+        """Résumé lisible pour les rapports de fin de script."""
+        return f"{len(self)} entrées, {len(self.sources)} sources, recherche exacte"
+
+# =============================================================================
+# INSTANCE PARTAGÉE
+# =============================================================================
+
+def get_page_index(pdfs: Optional[Dict[str, Path]] = None, store=None) -> EmbeddingIndex:
+    """Index des pages de cours, synchronisé avec les PDF (défaut: find_course_pdfs())."""
+    index = EmbeddingIndex("pages", store=store)
+    counts = index.sync(pdf_sources(pdfs if pdfs is not None else find_course_pdfs()))
+    if counts['updated'] or counts['removed']:
+        print(f"   ✓ Index des pages : {counts['updated']} PDF (ré)indexés, "
+              f"{counts['removed']} retirés ({index.summary()})")
+    return index
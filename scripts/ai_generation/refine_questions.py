@@ -2,15 +2,32 @@
 """
 Phase 10 - Refinement QCM
 Réécrit les questions sous-optimales via Ollama
+
+Options:
+    --no-cache           Ignore le cache des réponses LLM
+    --fixed-concurrency  Toujours MAX_WORKERS requêtes en vol (pas d'AIMD)
+    --max-concurrency N  Plafond de requêtes en vol (défaut: OLLAMA_MAX_CONCURRENCY ou 4)
+    --ollama-hosts H1,H2 Instances Ollama (défaut: OLLAMA_HOSTS / OLLAMA_HOST)
 """
 
 import json
+import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from ollama import Client
 from tqdm import tqdm
 
-def refine_qcm(client, question):
+# Ajoute le chemin pour importer les modules partagés
+sys.path.append(str(Path(__file__).parent.parent))
+
+from ai_generation.llm_cache import configure_cache, get_cache
+from ai_generation.adaptive_concurrency import configure_limiter, get_limiter, max_concurrency_from_argv
+from ai_generation.ollama_pool import configure_pool, get_pool, hosts_from_argv
+from ai_generation.retry_policy import configure_retry, get_retry
+
+MAX_WORKERS = max_concurrency_from_argv(sys.argv, default=4)  # Plafond de requêtes simultanées (limite adaptative en dessous)
+
+def refine_qcm(question):
     """Réécrit un QCM pour améliorer clarté et plausibilité"""
     
     prompt_system = """Tu es un expert IADE et rédacteur pédagogique.
@@ -32,18 +49,30 @@ Raisons de révision : {', '.join(question.get('refinement_reasons', ['qualité'
 
 Améliore ce QCM."""
     
+    options = {'temperature': 0.7, 'num_predict': 600}
+    cache = get_cache()
+    cache_key = cache.make_key('mistral:latest', prompt_system, prompt_user, options, format='json')
+    
     try:
-        response = client.chat(
-            model='mistral:latest',
-            messages=[
-                {'role': 'system', 'content': prompt_system},
-                {'role': 'user', 'content': prompt_user}
-            ],
-            format='json',
-            options={'temperature': 0.7, 'num_predict': 600}
-        )
+        content = cache.get(cache_key)
+        cache_hit = content is not None
+        
+        if not cache_hit:
+            def attempt():
+                with get_limiter().slot(), get_pool().lease() as lease:
+                    return get_pool().client(lease.endpoint).chat(
+                        model='mistral:latest',
+                        messages=[
+                            {'role': 'system', 'content': prompt_system},
+                            {'role': 'user', 'content': prompt_user}
+                        ],
+                        format='json',
+                        options=options
+                    )
+            
+            response = get_retry().call(attempt)  # Timeouts / erreurs serveur
+            content = response['message']['content'].strip()
         
-        content = response['message']['content'].strip()
         refined = json.loads(content)
         
         # Validation format
@@ -58,6 +87,8 @@ Améliore ce QCM."""
             result['refined'] = True
             result['refinement_date'] = time.strftime('%Y-%m-%d')
             
+            if not cache_hit:
+                cache.put(cache_key, content, model='mistral:latest')
             return result
         
         return None
@@ -88,18 +119,27 @@ def main():
         print("\n✅ Aucune question à raffiner ! Qualité déjà optimale.")
         return
     
-    # Client Ollama
-    client = Client()
+    # Instances Ollama
+    pool = configure_pool(hosts_from_argv(sys.argv))
+    pool.check_health()
+    retry = configure_retry()
+    cache = configure_cache(enabled="--no-cache" not in sys.argv)
+    limiter = configure_limiter(adaptive="--fixed-concurrency" not in sys.argv, max_limit=MAX_WORKERS)
     
     # Refinement
     refined = []
     failed = 0
     
-    print(f"\n🚀 Démarrage refinement...\n")
+    print(f"\n🚀 Démarrage refinement (jusqu'à {MAX_WORKERS} requêtes en vol)...\n")
     
-    for q in tqdm(to_refine, desc="Refinement", unit="QCM"):
-        result = refine_qcm(client, q)
-        
+    # map() conserve l'ordre des questions ; le limiteur borne les appels réels
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        results = list(tqdm(
+            executor.map(refine_qcm, to_refine),
+            total=len(to_refine), desc="Refinement", unit="QCM"
+        ))
+    
+    for q, result in zip(to_refine, results):
         if result:
             refined.append(result)
         else:
@@ -115,6 +155,10 @@ def main():
     print(f"  Succès              : {len(refined) - failed}")
     print(f"  Échecs              : {failed}")
     print(f"  Taux succès         : {success_rate:.1f}%")
+    print(f"  Cache LLM           : {cache.summary()}")
+    print(f"  Concurrence         : {limiter.controller.summary()}")
+    print(f"  Instances Ollama    : {pool.summary()}")
+    print(f"  Retries             : {retry.summary()}")
     
     # Sauvegarde
     output_path = Path("src/data/questions/refined.json")
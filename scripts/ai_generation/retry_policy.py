@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Politique de retry partagée des appels Ollama
+Backoff exponentiel avec jitter, budgets par type d'erreur, disjoncteur global
+
+Objectif:
+- Remplacer les sleep fixes (RETRY_DELAY = 2, time.sleep(5) récursif...)
+- Budgets séparés : timeouts, erreurs HTTP / connexion, réponses
+  inexploitables (JSON invalide, aucun QCM valide)
+- Erreurs HTTP 4xx (hors 429) : pas de retry, la requête est fautive
+- Disjoncteur global : après FAILURE_THRESHOLD échecs serveur consécutifs
+  (tous appels confondus), plus aucune requête pendant open_seconds, puis
+  une seule requête test ; les autres attendent son verdict (une requête
+  test annulée ou interrompue rend la main au prochain appelant)
+
+Usage:
+    def attempt():
+        content = ...appel Ollama...
+        qcms = parse(content)
+        if not qcms:
+            raise InvalidResponse("aucun QCM valide")
+        return qcms
+
+    try:
+        qcms = get_retry().call(attempt)
+    except Exception:
+        qcms = []
+
+    # asyncio
+    qcms = await get_retry().acall(aattempt)
+"""
+
+import asyncio
+import json
+import random
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+from ai_generation.adaptive_concurrency import OVERLOAD, classify_error
+
+T = TypeVar('T')
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+TIMEOUT = 'timeout'
+HTTP = 'http'
+PARSE = 'parse'
+FATAL = 'fatal'  # Jamais retenté (4xx, bug)
+
+DEFAULT_BUDGETS = {TIMEOUT: 2, HTTP: 3, PARSE: 2}
+BASE_DELAY = 1.0  # secondes
+MAX_DELAY = 30.0
+FAILURE_THRESHOLD = 5  # Échecs serveur consécutifs avant ouverture du disjoncteur
+OPEN_SECONDS = 30.0
+MAX_OPEN_SECONDS = 300.0
+PROBE_POLL = 0.5  # Attente entre deux vérifications pendant une requête test
+
+class InvalidResponse(ValueError):
+    """Réponse reçue mais inexploitable (JSON invalide, format incorrect...)."""
+
+class CircuitOpenError(RuntimeError):
+    """Levée par call()/acall() quand wait_for_circuit=False et le disjoncteur est ouvert."""
+
+def classify_retry(exc: BaseException) -> str:
+    """Catégorie de budget d'une exception (TIMEOUT, HTTP, PARSE ou FATAL)."""
+    if isinstance(exc, (InvalidResponse, json.JSONDecodeError)):
+        return PARSE
+    if classify_error(exc) == OVERLOAD:
+        name = type(exc).__name__
+        if isinstance(exc, (asyncio.TimeoutError, TimeoutError)) or 'Timeout' in name:
+            return TIMEOUT
+        return HTTP
+
+    status = getattr(exc, 'status_code', None)
+    response = getattr(exc, 'response', None)
+    if status is None and response is not None:
+        status = getattr(response, 'status_code', None)
+    if isinstance(status, int):
+        return FATAL  # 4xx : inutile d'insister
+
+    # Erreur réseau non classée (OSError...) : traitée comme une erreur HTTP
+    if isinstance(exc, OSError):
+        return HTTP
+    return FATAL
+
+# =============================================================================
+# DISJONCTEUR
+# =============================================================================
+
+class CircuitBreaker:
+    """Disjoncteur global (fermé → ouvert → semi-ouvert), thread-safe."""
+
+    def __init__(self, failure_threshold: int = FAILURE_THRESHOLD,
+                 open_seconds: float = OPEN_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.base_open_seconds = open_seconds
+        self.open_seconds = open_seconds
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._open_until = 0.0  # 0 = fermé
+        self._probing = False
+        self.trips = 0
+
+    @property
+    def is_open(self) -> bool:
+        return self._open_until > 0
+
+    def wait_time(self) -> Tuple[float, bool]:
+        """
+        (attente, requête test) : attente 0 si l'appel peut partir, sinon
+        durée à attendre avant de redemander.
+        
+        À l'expiration du délai, le premier appelant devient la requête test
+        (requête test = True) ; il doit rendre un verdict (record_success /
+        record_failure) ou appeler abort_probe().
+        """
+        with self._lock:
+            if not self.is_open:
+                return 0.0, False
+            remaining = self._open_until - time.monotonic()
+            if remaining > 0:
+                return remaining, False
+            if self._probing:
+                return PROBE_POLL, False
+            self._probing = True
+            return 0.0, True
+    
+    def abort_probe(self):
+        """Requête test interrompue sans verdict (annulation, Ctrl+C) : le prochain appelant reprend le test."""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            if self.is_open:
+                print("   ✅ Disjoncteur refermé : serveur Ollama rétabli")
+            self._open_until = 0.0
+            self._probing = False
+            self.open_seconds = self.base_open_seconds
+
+    def record_failure(self):
+        """Échec côté serveur (timeout, 5xx, connexion)."""
+        with self._lock:
+            self._failures += 1
+            if self._probing:
+                # Requête test en échec : on rouvre plus longtemps
+                self.open_seconds = min(MAX_OPEN_SECONDS, self.open_seconds * 2)
+                self._open("requête test en échec")
+            elif not self.is_open and self._failures >= self.failure_threshold:
+                self._open(f"{self._failures} échecs consécutifs")
+
+    def _open(self, reason: str):
+        """Ouvre le disjoncteur (appelé sous verrou)."""
+        self._open_until = time.monotonic() + self.open_seconds
+        self._probing = False
+        self.trips += 1
+        print(f"   ⛔ Disjoncteur ouvert {self.open_seconds:.0f}s ({reason})")
+
+# =============================================================================
+# POLITIQUE DE RETRY
+# =============================================================================
+
+class RetryPolicy:
+    """Exécute un appel avec retries budgétés, backoff exponentiel et jitter."""
+
+    def __init__(
+        self,
+        budgets: Optional[Dict[str, int]] = None,
+        base_delay: float = BASE_DELAY,
+        max_delay: float = MAX_DELAY,
+        breaker: Optional[CircuitBreaker] = None,
+        wait_for_circuit: bool = True
+    ):
+        """
+        Args:
+            budgets: Retries autorisés par catégorie ({TIMEOUT: 2, HTTP: 3, PARSE: 2})
+            base_delay / max_delay: Bornes du backoff (s)
+            breaker: Disjoncteur partagé (défaut: nouveau disjoncteur)
+            wait_for_circuit: True = attendre la refermeture du disjoncteur,
+                False = lever CircuitOpenError immédiatement
+        """
+        self.budgets = {**DEFAULT_BUDGETS, **(budgets or {})}
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker or CircuitBreaker()
+        self.wait_for_circuit = wait_for_circuit
+        self._lock = threading.Lock()
+        self.retries = {TIMEOUT: 0, HTTP: 0, PARSE: 0}
+        self.gave_up = 0
+
+    def backoff(self, attempt: int) -> float:
+        """Délai avant la tentative attempt+1 (« full jitter »)."""
+        cap = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return random.uniform(0, cap)
+
+    def _on_error(self, exc: BaseException, used: Dict[str, int]) -> Optional[float]:
+        """
+        Comptabilise une erreur ; délai avant retry, ou None si on abandonne.
+        """
+        category = classify_retry(exc)
+        if category in (TIMEOUT, HTTP):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()  # Le serveur a répondu (réponse invalide, 4xx)
+
+        if category == FATAL or used.get(category, 0) >= self.budgets.get(category, 0):
+            with self._lock:
+                self.gave_up += 1
+            return None
+
+        used[category] = used.get(category, 0) + 1
+        with self._lock:
+            self.retries[category] += 1
+        return self.backoff(sum(used.values()))
+
+    def _check_circuit(self) -> Tuple[float, bool]:
+        wait, probe = self.breaker.wait_time()
+        if wait > 0 and not self.wait_for_circuit:
+            raise CircuitOpenError("Disjoncteur Ollama ouvert")
+        return wait, probe
+
+    def call(self, fn: Callable[[], T]) -> T:
+        """
+        Appelle fn() jusqu'au succès ou à l'épuisement du budget concerné.
+
+        Raises:
+            La dernière exception de fn() si le budget est épuisé
+        """
+        used: Dict[str, int] = {}
+        while True:
+            wait, probe = self._check_circuit()
+            while wait > 0:
+                time.sleep(wait)
+                wait, probe = self._check_circuit()
+            
+            try:
+                result = fn()
+            except Exception as e:
+                delay = self._on_error(e, used)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            except BaseException:
+                if probe:  # KeyboardInterrupt... : pas de verdict, le disjoncteur reste semi-ouvert
+                    self.breaker.abort_probe()
+                raise
+
+            self.breaker.record_success()
+            return result
+
+    async def acall(self, fn: Callable[[], Awaitable[T]]) -> T:
+        """Version asynchrone de call() (fn est une fabrique de coroutines)."""
+        used: Dict[str, int] = {}
+        while True:
+            wait, probe = self._check_circuit()
+            while wait > 0:
+                await asyncio.sleep(wait)
+                wait, probe = self._check_circuit()
+            
+            try:
+                result = await fn()
+            except Exception as e:
+                delay = self._on_error(e, used)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                if probe:  # Annulation (CancelledError) : pas de verdict, le disjoncteur reste semi-ouvert
+                    self.breaker.abort_probe()
+                raise
+
+            self.breaker.record_success()
+            return result
+
+    def summary(self) -> str:
+        """Résumé lisible pour les rapports de fin de script."""
+        return (f"retries timeout {self.retries[TIMEOUT]} / http {self.retries[HTTP]} / "
+                f"parse {self.retries[PARSE]}, {self.gave_up} abandons, "
+                f"disjoncteur ouvert {self.breaker.trips} fois")
+
+# =============================================================================
+# INSTANCE PARTAGÉE
+# =============================================================================
+
+_policy: Optional[RetryPolicy] = None
+
+def configure_retry(budgets: Optional[Dict[str, int]] = None,
+                    base_delay: float = BASE_DELAY,
+                    max_delay: float = MAX_DELAY) -> RetryPolicy:
+    """(Re)configure la politique partagée du processus (appelé depuis main)."""
+    global _policy
+    _policy = RetryPolicy(budgets=budgets, base_delay=base_delay, max_delay=max_delay)
+    return _policy
+
+def get_retry() -> RetryPolicy:
+    """Politique partagée, configurée avec les valeurs par défaut si besoin."""
+    global _policy
+    if _policy is None:
+        _policy = RetryPolicy()
+    return _policy
@@ -17,25 +17,35 @@ Usage:
 """
 
 import argparse
+import importlib.util
 import json
+import sys
 import numpy as np
 from pathlib import Path
 from typing import List, Dict, Tuple, Set
 from datetime import datetime
 
 try:
-    from sentence_transformers import SentenceTransformer
     from tqdm import tqdm
+    # Vérifié sans l'importer (torch) : chargé à la demande par le stockage d'embeddings
+    if importlib.util.find_spec("sentence_transformers") is None:
+        raise ImportError("sentence_transformers")
 except ImportError:
     print("❌ Dépendances manquantes. Installez: pip install sentence-transformers tqdm")
     exit(1)
 
+# Ajoute le chemin pour importer les modules partagés
+sys.path.append(str(Path(__file__).parent.parent))
+
+from ai_generation.embedding_store import get_embedding_store
+
 # =============================================================================
 # CONFIGURATION
 # =============================================================================
 
 CONTEXT_SCORE_THRESHOLD = 0.60  # Abaissé de 0.75 pour validation v1
 KEYWORDS_OVERLAP_THRESHOLD = 0.30  # Abaissé de 0.5 pour validation v1
+ENCODE_BATCH_SIZE = 256  # Textes par batch d'encodage (questions et chunks)
 
 # =============================================================================
 # CHARGEMENT CHUNKS SOURCES
@@ -72,51 +82,72 @@ class SemanticValidator:
     
     def __init__(self, chunks_index: Dict[str, Dict]):
         """Initialise le validateur."""
-        print("🔧 Chargement modèle sentence-transformers...")
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
-        print("   ✓ Modèle chargé")
+        # Embeddings persistés sur disque : le modèle n'est chargé
+        # que pour les textes jamais encodés
+        self.store = get_embedding_store('all-MiniLM-L6-v2')
         
         self.chunks_index = chunks_index
         
-        # Pré-calcul embeddings des chunks (cache)
+        # Pré-calcul embeddings des chunks (un seul appel batché)
+        # Matrice (n_chunks, dim) normalisée + index chunk_id → ligne
         print(f"🔧 Pré-calcul embeddings des {len(chunks_index)} chunks...")
-        self.chunk_embeddings = {}
-        
-        for chunk_id, chunk in tqdm(chunks_index.items(), desc="Embeddings chunks"):
-            chunk_text = chunk.get('text', '')
-            if chunk_text:
-                embedding = self.model.encode(chunk_text, convert_to_numpy=True)
-                self.chunk_embeddings[chunk_id] = embedding
+        chunk_ids = [cid for cid, chunk in chunks_index.items() if chunk.get('text', '')]
+        self.chunk_matrix = self.store.encode(
+            [chunks_index[cid]['text'] for cid in chunk_ids],
+            batch_size=ENCODE_BATCH_SIZE,
+            show_progress_bar=True
+        )
+        self.chunk_rows = {cid: row for row, cid in enumerate(chunk_ids)}
         
-        print(f"   ✓ {len(self.chunk_embeddings)} embeddings calculés")
+        print(f"   ✓ {len(self.chunk_rows)} embeddings ({self.store.summary()})")
     
-    def compute_context_score(self, question: Dict) -> float:
+    def compute_context_scores(self, questions: List[Dict]) -> np.ndarray:
         """
-        Calcule le context_score : similarité entre question et chunk source.
+        Calcule les context_score de toutes les questions en une passe.
+        
+        Questions encodées par batchs, lignes des chunks sources rassemblées,
+        puis un seul produit scalaire ligne à ligne (embeddings normalisés :
+        produit scalaire = similarité cosinus).
         
         Returns:
-            Score de similarité [0, 1]
+            np.ndarray (len(questions),) de scores [0, 1], 0 si chunk inconnu
         """
-        chunk_id = question.get('chunk_id')
+        scores = np.zeros(len(questions), dtype=np.float32)
         
-        if not chunk_id or chunk_id not in self.chunk_embeddings:
-            return 0.0
+        # Questions dont le chunk source est connu
+        positions = []
+        rows = []
+        for i, question in enumerate(questions):
+            row = self.chunk_rows.get(question.get('chunk_id'))
+            if row is not None:
+                positions.append(i)
+                rows.append(row)
         
-        # Texte question
-        question_text = f"{question.get('text', '')} {question.get('explanation', '')}"
+        if not positions:
+            return scores
         
-        # Embedding question
-        question_embedding = self.model.encode(question_text, convert_to_numpy=True)
+        # Texte question
+        texts = [
+            f"{questions[i].get('text', '')} {questions[i].get('explanation', '')}"
+            for i in positions
+        ]
+        question_matrix = self.store.encode(texts, batch_size=ENCODE_BATCH_SIZE,
+                                            show_progress_bar=len(texts) > ENCODE_BATCH_SIZE)
         
-        # Embedding chunk source
-        chunk_embedding = self.chunk_embeddings[chunk_id]
+        # Cosine similarity ligne à ligne
+        chunk_matrix = self.chunk_matrix[np.asarray(rows)]
+        scores[positions] = np.einsum('ij,ij->i', question_matrix, chunk_matrix)
         
-        # Cosine similarity
-        similarity = np.dot(question_embedding, chunk_embedding) / (
-            np.linalg.norm(question_embedding) * np.linalg.norm(chunk_embedding)
-        )
+        return scores
+    
+    def compute_context_score(self, question: Dict) -> float:
+        """
+        Calcule le context_score : similarité entre question et chunk source.
         
-        return float(similarity)
+        Returns:
+            Score de similarité [0, 1]
+        """
+        return float(self.compute_context_scores([question])[0])
 
 # =============================================================================
 # KEYWORDS OVERLAP (FIDÉLITÉ LEXICALE)
@@ -183,6 +214,10 @@ def validate_questions(
     """
     Valide toutes les questions avec triple validation.
     
+    Cascade du moins cher au plus cher : biomedical_score (déjà calculé),
+    keywords_overlap, puis context_score (encodage MiniLM) pour les seules
+    questions restantes. Une question sort au premier critère non atteint.
+    
     Returns:
         (questions_passed, questions_rejected, stats)
     """
@@ -191,6 +226,32 @@ def validate_questions(
     
     passed = []
     rejected = []
+    first_failure = {}  # index question → raison du rejet
+    
+    # Contrôles sans encodage
+    for i, question in enumerate(tqdm(questions, desc="Validation lexicale")):
+        if question.get('biomedical_score', 0) < question.get('biomedical_threshold', 0.05):
+            first_failure[i] = 'biomedical_score'
+            continue
+        
+        # Calcul keywords_overlap
+        module_keywords = keywords_data.get(question.get('module_id', 'unknown'), {}).get('module_keywords', [])
+        keywords_overlap = compute_keywords_overlap(question, module_keywords)
+        question['keywords_overlap'] = round(keywords_overlap, 4)
+        
+        if keywords_overlap < KEYWORDS_OVERLAP_THRESHOLD:
+            first_failure[i] = 'keywords_overlap'
+    
+    # Calcul context_score (questions restantes, en une passe)
+    remaining = [i for i in range(len(questions)) if i not in first_failure]
+    context_scores = validator.compute_context_scores([questions[i] for i in remaining])
+    
+    for i, context_score in zip(remaining, context_scores):
+        context_score = float(context_score)
+        questions[i]['context_score'] = round(context_score, 4)
+        
+        if context_score < CONTEXT_SCORE_THRESHOLD:
+            first_failure[i] = 'context_score'
     
     stats = {
         'total': len(questions),
@@ -204,37 +265,12 @@ def validate_questions(
         'by_module': {}
     }
     
-    for question in tqdm(questions, desc="Validation sémantique"):
+    for i, question in enumerate(questions):
         module_id = question.get('module_id', 'unknown')
         
-        # Récupère mots-clés module
-        module_keywords = keywords_data.get(module_id, {}).get('module_keywords', [])
-        
-        # Calcul context_score
-        context_score = validator.compute_context_score(question)
-        question['context_score'] = round(context_score, 4)
-        
-        # Calcul keywords_overlap
-        keywords_overlap = compute_keywords_overlap(question, module_keywords)
-        question['keywords_overlap'] = round(keywords_overlap, 4)
-        
-        # Validation combinée
-        biomedical_score = question.get('biomedical_score', 0)
-        biomedical_threshold = question.get('biomedical_threshold', 0.05)
-        
-        reject_reasons = []
-        
-        if biomedical_score < biomedical_threshold:
-            reject_reasons.append('biomedical_score')
-            stats['rejection_reasons']['biomedical_score'] += 1
-        
-        if context_score < CONTEXT_SCORE_THRESHOLD:
-            reject_reasons.append('context_score')
-            stats['rejection_reasons']['context_score'] += 1
-        
-        if keywords_overlap < KEYWORDS_OVERLAP_THRESHOLD:
-            reject_reasons.append('keywords_overlap')
-            stats['rejection_reasons']['keywords_overlap'] += 1
+        reject_reasons = [first_failure[i]] if i in first_failure else []
+        for reason in reject_reasons:
+            stats['rejection_reasons'][reason] += 1
         
         # Stats par module
         if module_id not in stats['by_module']:
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Parsing JSON incrémental des réponses Ollama en streaming
+Chaque QCM est extrait et validé dès que son objet JSON est refermé
+
+Objectif:
+- Consommer les réponses stream=True morceau par morceau
+- Accepter les formats rencontrés : [...], {"QCM": [...]}, {"questions": [...]},
+  un QCM seul, avec ou sans balises ```json
+- Détecter tôt une sortie qui déraille et interrompre la requête :
+  texte libre sans JSON, objets invalides à répétition, objet démesuré
+  (boucle de génération), objectif de QCM atteint
+- Conserver les QCM valides déjà reçus (résultat partiel)
+
+Usage:
+    parser = QCMStreamParser(validate=validate_qcm_format, max_items=3)
+    for part in client.chat(..., stream=True):
+        parser.feed(part['message']['content'])
+        if parser.should_stop:
+            break
+    qcms = parser.items
+"""
+
+import json
+from typing import Callable, Dict, List, Optional
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+MAX_PREAMBLE_CHARS = 200  # Texte libre toléré avant le premier { ou [
+MAX_OBJECT_CHARS = 4000  # Un QCM ne dépasse jamais cette taille
+MAX_INVALID_OBJECTS = 2  # QCM candidats invalides consécutifs avant abandon
+QCM_LEVELS = (['['], ['{', '['])  # Délimiteurs autour d'un QCM : [{...}] ou {"QCM": [{...}]}
+
+def is_qcm_candidate(obj) -> bool:
+    """Un objet ressemble à un QCM (et non à une enveloppe {"QCM": [...]})."""
+    return isinstance(obj, dict) and 'options' in obj and 'text' in obj
+
+def is_envelope(obj) -> bool:
+    """Enveloppe de premier niveau : contient une liste d'objets ({"QCM": [...]})."""
+    return isinstance(obj, dict) and any(
+        isinstance(v, list) and any(isinstance(x, dict) for x in v)
+        for v in obj.values()
+    )
+
+# =============================================================================
+# PARSER
+# =============================================================================
+
+class QCMStreamParser:
+    """Parser incrémental : extrait les objets QCM complets au fil du flux."""
+
+    def __init__(
+        self,
+        validate: Optional[Callable[[Dict], bool]] = None,
+        max_items: Optional[int] = None,
+        max_preamble_chars: int = MAX_PREAMBLE_CHARS,
+        max_object_chars: int = MAX_OBJECT_CHARS,
+        max_invalid_objects: int = MAX_INVALID_OBJECTS
+    ):
+        """
+        Args:
+            validate: Validation d'un QCM (peut le compléter), None = tout accepter
+            max_items: Arrêt anticipé dès que ce nombre de QCM valides est reçu
+            max_preamble_chars / max_object_chars / max_invalid_objects:
+                Seuils de détection d'une sortie qui déraille
+        """
+        self.validate = validate
+        self.max_items = max_items
+        self.max_preamble_chars = max_preamble_chars
+        self.max_object_chars = max_object_chars
+        self.max_invalid_objects = max_invalid_objects
+
+        self.items: List[Dict] = []
+        self.text = ""  # Réponse brute complète (pour le cache)
+        self.derailed: Optional[str] = None  # Raison de l'abandon
+        self.invalid_objects = 0
+
+        self._pos = 0  # Prochain caractère à analyser
+        self._started = False  # Premier { ou [ rencontré
+        self._in_string = False
+        self._escape = False
+        self._stack: List[str] = []  # Délimiteurs ouverts
+        self._object_starts: List[int] = []  # Positions des { ouverts
+        self._last_close = 0  # Fin du dernier objet refermé
+        self._consecutive_invalid = 0
+
+    @property
+    def complete(self) -> bool:
+        """La structure JSON de premier niveau est refermée."""
+        return self._started and not self._stack
+
+    @property
+    def should_stop(self) -> bool:
+        """Inutile de lire la suite (déraillement, objectif atteint, JSON terminé)."""
+        if self.derailed or self.complete:
+            return True
+        return self.max_items is not None and len(self.items) >= self.max_items
+
+    def feed(self, chunk: str) -> List[Dict]:
+        """
+        Ajoute un morceau de réponse.
+
+        Returns:
+            QCM valides nouvellement complétés
+        """
+        self.text += chunk
+        new_items = []
+
+        while self._pos < len(self.text) and not self.derailed and not self.complete:
+            ch = self.text[self._pos]
+            pos = self._pos
+            self._pos += 1
+
+            if not self._started:
+                if ch in '{[':
+                    self._started = True
+                    self._open(ch, pos)
+                elif pos >= self.max_preamble_chars:
+                    self.derailed = "texte libre sans JSON"
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in '{[':
+                self._open(ch, pos)
+            elif ch in '}]':
+                if not self._stack or self._stack[-1] != ('{' if ch == '}' else '['):
+                    self.derailed = "JSON mal formé"
+                    break
+                self._stack.pop()
+                if ch == '}':
+                    start = self._object_starts.pop()
+                    self._last_close = pos
+                    item = self._close_object(start, pos)
+                    if item is not None:
+                        new_items.append(item)
+
+        # Objet en cours (hors enveloppe déjà entamée) qui n'en finit pas
+        if self._object_starts and not self.derailed:
+            current = max(self._object_starts[-1], self._last_close)
+            if len(self.text) - current > self.max_object_chars:
+                self.derailed = "objet JSON démesuré"
+
+        return new_items
+
+    def _open(self, ch: str, pos: int):
+        self._stack.append(ch)
+        if ch == '{':
+            self._object_starts.append(pos)
+
+    def _close_object(self, start: int, end: int) -> Optional[Dict]:
+        """
+        Décode l'objet text[start:end+1] ; le retient si c'est un QCM valide.
+
+        Seuls les objets à une position de QCM comptent dans la série
+        d'invalides : ni les objets imbriqués (options, métadonnées), ni
+        l'objet de premier niveau (enveloppe, même vide, ou QCM seul).
+        """
+        top_level = not self._stack
+        if not top_level and self._stack not in QCM_LEVELS:
+            return None  # Objet imbriqué dans un QCM
+
+        try:
+            obj = json.loads(self.text[start:end + 1])
+        except json.JSONDecodeError:
+            obj = None
+
+        if is_envelope(obj):
+            return None  # {"QCM": [...]} : les QCM ont déjà été jugés
+
+        if is_qcm_candidate(obj) and (self.validate is None or self.validate(obj)):
+            self._consecutive_invalid = 0
+            self.items.append(obj)
+            return obj
+
+        if top_level:
+            return None  # Réponse terminée : rien à interrompre
+
+        self.invalid_objects += 1
+        self._consecutive_invalid += 1
+        if self._consecutive_invalid >= self.max_invalid_objects:
+            self.derailed = f"{self._consecutive_invalid} QCM invalides consécutifs"
+        return None
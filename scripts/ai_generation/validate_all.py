@@ -20,7 +20,7 @@ import argparse
 import json
 import hashlib
 from pathlib import Path
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple
 from collections import Counter
 from datetime import datetime
 
@@ -60,6 +60,15 @@ def auto_classify_difficulty(question: Dict) -> str:
 # DÉDUPLICATION
 # =============================================================================
 
+def question_hash(question: Dict) -> str:
+    """Hash: sha256(text + "|" + options_sorted + "|" + module_id)"""
+    text = question.get('text', '')
+    options = sorted(question.get('options', []))
+    module_id = question.get('module_id', '')
+    
+    hash_input = f"{text}|{options}|{module_id}"
+    return hashlib.sha256(hash_input.encode()).hexdigest()
+
 def deduplicate_questions(questions: List[Dict]) -> Tuple[List[Dict], int]:
     """
     Supprime les doublons basés sur hash unique.
@@ -76,13 +85,7 @@ def deduplicate_questions(questions: List[Dict]) -> Tuple[List[Dict], int]:
     duplicates_count = 0
     
     for question in questions:
-        # Construction hash
-        text = question.get('text', '')
-        options = sorted(question.get('options', []))
-        module_id = question.get('module_id', '')
-        
-        hash_input = f"{text}|{options}|{module_id}"
-        hash_value = hashlib.sha256(hash_input.encode()).hexdigest()
+        hash_value = question_hash(question)
         
         if hash_value in seen_hashes:
             duplicates_count += 1
@@ -99,6 +102,30 @@ def deduplicate_questions(questions: List[Dict]) -> Tuple[List[Dict], int]:
 # VALIDATION FORMAT
 # =============================================================================
 
+def format_error(question: Dict) -> Optional[str]:
+    """
+    Première contrainte de format non respectée, None si le format est valide.
+    """
+    # Check 4 options
+    options = question.get('options', [])
+    if not isinstance(options, list) or len(options) != 4:
+        return '4 options attendues'
+    
+    # Check options distinctes
+    if len(set(options)) != 4:
+        return 'options non distinctes'
+    
+    # Check correctAnswer
+    correct_answer = question.get('correctAnswer')
+    if not isinstance(correct_answer, int) or correct_answer not in [0, 1, 2, 3]:
+        return 'correctAnswer invalide'
+    
+    # Check texte et explication non vides
+    if not question.get('text') or not question.get('explanation'):
+        return 'texte ou explication vide'
+    
+    return None
+
 def validate_format(questions: List[Dict]) -> Tuple[List[Dict], int]:
     """
     Valide le format strict des questions.
@@ -118,25 +145,7 @@ def validate_format(questions: List[Dict]) -> Tuple[List[Dict], int]:
     invalid_count = 0
     
     for question in questions:
-        # Check 4 options
-        options = question.get('options', [])
-        if not isinstance(options, list) or len(options) != 4:
-            invalid_count += 1
-            continue
-        
-        # Check options distinctes
-        if len(set(options)) != 4:
-            invalid_count += 1
-            continue
-        
-        # Check correctAnswer
-        correct_answer = question.get('correctAnswer')
-        if not isinstance(correct_answer, int) or correct_answer not in [0, 1, 2, 3]:
-            invalid_count += 1
-            continue
-        
-        # Check texte et explication non vides
-        if not question.get('text') or not question.get('explanation'):
+        if format_error(question):
             invalid_count += 1
             continue
         
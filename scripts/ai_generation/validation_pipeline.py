@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Pipeline de validation complet, en mémoire
+Phases 4 et 5 en un seul processus : biobert_client → semantic_validator → validate_all
+
+Objectif:
+- Enchaîner scoring BioBERT, validation sémantique et lexicale,
+  déduplication, validation format et classification des difficultés
+  sans fichiers intermédiaires (generated_biobert.json, generated_scored.json)
+- Chaque modèle n'est chargé qu'une fois, les questions ne sont ni
+  resérialisées ni relues entre les étapes
+- Une seule sortie (questions validées + rejetées) et un rapport par étape
+  (questions en entrée / sortie, rejets, durée)
+- Cascade du moins cher au plus cher : format → doublons exacts →
+  keywords_overlap → BioBERT → MiniLM ; une question sort au premier échec,
+  les rejetées n'atteignent jamais les encodeurs
+
+Usage:
+    python scripts/ai_generation/validation_pipeline.py \
+           --in generated_raw.json \
+           --out validated.json \
+           --metadata src/data/metadata.json \
+           --modules src/data/modules/ \
+           --keywords src/data/keywords.json \
+           [--report reports/validation_pipeline_report.json] \
+           [--batch-size 32] [--threads N] [--backend torch|int8|onnx|onnx-int8] [--workers N]
+"""
+
+import argparse
+import json
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import List, Dict, Tuple
+from datetime import datetime
+
+# Ajoute le chemin pour importer les modules partagés
+sys.path.append(str(Path(__file__).parent.parent))
+
+from ai_generation.biobert_client import (
+    BACKENDS, BATCH_SIZE, DEFAULT_BACKEND, NUM_THREADS,
+    BioBERTScorer, ShardedBioBERTScorer, score_questions
+)
+from ai_generation.semantic_validator import (
+    CONTEXT_SCORE_THRESHOLD, KEYWORDS_OVERLAP_THRESHOLD,
+    SemanticValidator, compute_keywords_overlap, load_chunks_index
+)
+from ai_generation.validate_all import (
+    balance_difficulties_by_module, check_coverage, classify_difficulties,
+    format_error, question_hash
+)
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+DEFAULT_REPORT = Path("reports/validation_pipeline_report.json")
+
+# =============================================================================
+# PIPELINE
+# =============================================================================
+
+class StageTimer:
+    """Rapport par étape : questions en entrée / sortie et durée."""
+
+    def __init__(self):
+        self.stages: List[Dict] = []
+        self._started = time.perf_counter()
+
+    def start(self):
+        self._started = time.perf_counter()
+
+    def record(self, name: str, count_in: int, count_out: int, **details):
+        self.stages.append({
+            'stage': name,
+            'in': count_in,
+            'out': count_out,
+            'removed': count_in - count_out,
+            'seconds': round(time.perf_counter() - self._started, 2),
+            **details
+        })
+        self._started = time.perf_counter()
+
+def split_rejected(questions: List[Dict], failed: List[bool], reason: str,
+                   rejected: List[Dict]) -> List[Dict]:
+    """Questions qui passent l'étape ; les autres sortent de la cascade avec leur raison."""
+    kept = []
+    for question, fail in zip(questions, failed):
+        if fail:
+            question['rejected'] = True
+            question['rejection_reasons'] = [reason]
+            rejected.append(question)
+        else:
+            kept.append(question)
+    return kept
+
+def run_validation(
+    questions: List[Dict],
+    scorer: BioBERTScorer,
+    thresholds: Dict[str, float],
+    validator: SemanticValidator,
+    keywords_data: Dict
+) -> Tuple[List[Dict], List[Dict], Dict]:
+    """
+    Valide les questions en mémoire, en cascade du moins cher au plus cher.
+
+    Mêmes règles que la chaîne biobert_client.py → semantic_validator.py →
+    validate_all.py, mais chaque question sort au premier critère non
+    atteint : seules les questions restantes sont encodées.
+
+    Returns:
+        (questions_validées, questions_rejetées, rapport)
+    """
+    timer = StageTimer()
+    rejected = []
+
+    # Étape 1: Validation format
+    count = len(questions)
+    questions = split_rejected(questions, [bool(format_error(q)) for q in questions], 'format', rejected)
+    timer.record('format', count, len(questions))
+
+    # Étape 2: Doublons exacts (hash texte + options + module)
+    count = len(questions)
+    seen_hashes = set()
+    duplicates = []
+    for question in questions:
+        hash_value = question_hash(question)
+        duplicates.append(hash_value in seen_hashes)
+        seen_hashes.add(hash_value)
+    questions = split_rejected(questions, duplicates, 'duplicate', rejected)
+    timer.record('duplicate', count, len(questions))
+
+    # Étape 3: Fidélité lexicale (keywords_overlap)
+    count = len(questions)
+    for question in questions:
+        module_keywords = keywords_data.get(question.get('module_id', 'unknown'), {}).get('module_keywords', [])
+        question['keywords_overlap'] = round(compute_keywords_overlap(question, module_keywords), 4)
+    questions = split_rejected(questions, [q['keywords_overlap'] < KEYWORDS_OVERLAP_THRESHOLD for q in questions],
+                               'keywords_overlap', rejected)
+    timer.record('keywords_overlap', count, len(questions))
+
+    # Étape 4: Scoring BioBERT (biomedical_score, biomedical_threshold)
+    count = len(questions)
+    questions, biobert_stats = score_questions(questions, scorer, thresholds)
+    questions = split_rejected(questions, [q['biomedical_score'] < q['biomedical_threshold'] for q in questions],
+                               'biomedical_score', rejected)
+    timer.record('biomedical_score', count, len(questions), stats=biobert_stats)
+
+    # Étape 5: Fidélité sémantique (context_score, MiniLM)
+    count = len(questions)
+    for question, context_score in zip(questions, validator.compute_context_scores(questions)):
+        question['context_score'] = round(float(context_score), 4)
+    questions = split_rejected(questions, [q['context_score'] < CONTEXT_SCORE_THRESHOLD for q in questions],
+                               'context_score', rejected)
+    for question in questions:
+        question['rejected'] = False
+    timer.record('context_score', count, len(questions))
+
+    # Étape 6: Classification et rééquilibrage des difficultés
+    count = len(questions)
+    questions = balance_difficulties_by_module(classify_difficulties(questions))
+    coverage_stats = check_coverage(questions)
+    timer.record('difficulty', count, len(questions),
+                 distribution=dict(Counter(q.get('difficulty') for q in questions)))
+
+    report = {
+        'stages': timer.stages,
+        'total_seconds': round(sum(stage['seconds'] for stage in timer.stages), 2),
+        'rejection_reasons': {stage['stage']: stage['removed'] for stage in timer.stages if stage['removed']},
+        'duplicates_removed': timer.stages[1]['removed'],
+        'invalid_format_removed': timer.stages[0]['removed'],
+        'coverage': coverage_stats
+    }
+    return questions, rejected, report
+
+# =============================================================================
+# MAIN
+# =============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Pipeline de validation complet (en mémoire)")
+    parser.add_argument('--in', dest='input_file', required=True, help='Fichier questions générées')
+    parser.add_argument('--out', required=True, help='Fichier validated.json de sortie')
+    parser.add_argument('--metadata', required=True, help='Fichier metadata.json (seuils adaptatifs)')
+    parser.add_argument('--modules', required=True, help='Dossier modules (pour récupérer chunks)')
+    parser.add_argument('--keywords', required=True, help='Fichier keywords.json')
+    parser.add_argument('--report', default=str(DEFAULT_REPORT), help='Rapport par étape (JSON)')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Textes par passe BioBERT')
+    parser.add_argument('--threads', type=int, default=NUM_THREADS, help='Threads torch (0 = tous les cœurs)')
+    parser.add_argument('--backend', choices=BACKENDS, default=DEFAULT_BACKEND,
+                        help='Backend d\'inférence BioBERT')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Processus de scoring BioBERT (threads répartis entre eux)')
+
+    args = parser.parse_args()
+
+    print("="*60)
+    print("PIPELINE DE VALIDATION (EN MÉMOIRE)")
+    print("="*60)
+
+    # Charge entrées
+    print(f"\n📂 Chargement metadata : {args.metadata}")
+    with open(args.metadata, 'r', encoding='utf-8') as f:
+        thresholds = json.load(f).get('biomedical_thresholds', {})
+    print(f"   ✓ Seuils adaptatifs chargés pour {len(thresholds)} modules")
+
+    print(f"\n📂 Chargement questions : {args.input_file}")
+    with open(args.input_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    questions = data.get('questions', []) if isinstance(data, dict) else data
+    print(f"   ✓ {len(questions)} questions chargées")
+
+    print(f"\n📂 Chargement keywords : {args.keywords}")
+    with open(args.keywords, 'r', encoding='utf-8') as f:
+        keywords_data = json.load(f)
+
+    print(f"\n📂 Chargement chunks : {args.modules}")
+    chunks_index = load_chunks_index(Path(args.modules))
+    print(f"   ✓ {len(chunks_index)} chunks indexés")
+
+    # Modèles (chargés une fois pour tout le pipeline)
+    if args.workers > 1:
+        scorer = ShardedBioBERTScorer(args.workers, batch_size=args.batch_size,
+                                      num_threads=args.threads, backend=args.backend)
+    else:
+        scorer = BioBERTScorer(batch_size=args.batch_size, num_threads=args.threads,
+                               backend=args.backend)
+    validator = SemanticValidator(chunks_index)
+
+    # Validation
+    try:
+        validated, rejected, report = run_validation(questions, scorer, thresholds,
+                                                     validator, keywords_data)
+    finally:
+        if args.workers > 1:
+            scorer.close()
+
+    # Sauvegarde (une seule sortie)
+    output_path = Path(args.out)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    validated_at = datetime.now().isoformat()
+    output_data = {
+        'validated_at': validated_at,
+        'total_questions': len(validated),
+        'duplicates_removed': report['duplicates_removed'],
+        'invalid_format_removed': report['invalid_format_removed'],
+        'coverage': report['coverage'],
+        'thresholds': {
+            'context_score': CONTEXT_SCORE_THRESHOLD,
+            'keywords_overlap': KEYWORDS_OVERLAP_THRESHOLD
+        },
+        'questions': validated,
+        'rejected_questions': rejected
+    }
+
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(output_data, f, ensure_ascii=False, indent=2)
+
+    # Rapport par étape
+    report_path = Path(args.report)
+    report_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump({'validated_at': validated_at, 'input': args.input_file,
+                   'output': args.out, **report}, f, ensure_ascii=False, indent=2)
+
+    # Résumé final
+    print(f"\n{'='*60}")
+    print(f"📊 RÉSUMÉ PAR ÉTAPE")
+    print(f"{'='*60}")
+    for stage in report['stages']:
+        print(f"  {stage['stage']:16s} : {stage['in']:5d} → {stage['out']:5d} "
+              f"(-{stage['removed']}) en {stage['seconds']:.1f}s")
+    print(f"\nQuestions finales : {len(validated)} ({len(rejected)} rejetées)")
+    print(f"Durée totale : {report['total_seconds']:.1f}s")
+
+    print(f"\n💾 Questions validées sauvegardées : {args.out}")
+    print(f"📊 Rapport par étape : {args.report}")
+
+    if len(validated) >= 2000:
+        print(f"\n✅ OBJECTIF ATTEINT : {len(validated)} ≥ 2000 questions validées")
+    else:
+        print(f"\n⚠️  OBJECTIF NON ATTEINT : {len(validated)} < 2000 questions")
+
+    print(f"\n{'='*60}")
+    print(f"✅ PIPELINE DE VALIDATION TERMINÉ")
+    print(f"{'='*60}")
+
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
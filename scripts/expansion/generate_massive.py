@@ -3,6 +3,12 @@
 """
 GÉNÉRATION MASSIVE - Phase 12
 Génère 3 QCM par page avec Ollama Mistral
+
+Options:
+    --range START END  Ne traite que pages[START:END]
+    --ollama-hosts H1,H2  Instances Ollama (défaut: OLLAMA_HOSTS / OLLAMA_HOST)
+    --stream           Écrit chaque QCM dans generated_massive.jsonl dès sa
+                       génération, puis convertit en generated_massive.json
 """
 
 import json
@@ -14,11 +20,17 @@ from tqdm import tqdm
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 
+# Ajoute le chemin pour importer les modules partagés
+sys.path.append(str(Path(__file__).parent.parent))
+
+from ai_generation.jsonl_stream import JsonlWriter, jsonl_to_json, stream_path
+from ai_generation.ollama_pool import configure_pool, get_pool, hosts_from_argv
+
 # Configuration
 PAGES_DIR = Path("src/data/raw/pages")
 METADATA_FILE = Path("src/data/raw/pages_metadata.json")
 OUTPUT_FILE = Path("src/data/questions/generated_massive.json")
-OLLAMA_URL = "http://localhost:11434/api/generate"
+OLLAMA_URL = "/api/generate"  # Chemin résolu sur une instance du pool (--ollama-hosts)
 MODEL = "mistral:latest"
 QCM_PER_PAGE = 3
 MAX_WORKERS = 4  # Parallélisation
@@ -90,8 +102,9 @@ def generate_qcm_for_page(page_data):
     }
     
     try:
-        response = requests.post(OLLAMA_URL, json=payload, timeout=60)
-        response.raise_for_status()
+        with get_pool().lease() as lease:
+            response = requests.post(lease.url(OLLAMA_URL), json=payload, timeout=60)
+            response.raise_for_status()
         result = response.json()
         raw_text = result.get("response", "[]")
         
@@ -121,6 +134,9 @@ def main():
     print("⚡ GÉNÉRATION MASSIVE - Phase 12")
     print("="*60)
     
+    pool = configure_pool(hosts_from_argv(sys.argv))
+    pool.check_health()
+    
     # Charge métadonnées pages
     with open(METADATA_FILE, "r") as f:
         metadata = json.load(f)
@@ -146,8 +162,12 @@ def main():
         log.write(f"[{datetime.now()}] Phase 12 - Génération START: {len(pages)} pages\n")
     
     all_qcms = []
+    qcms_count = 0
     failed = 0
     
+    # Sortie en flux : les QCM ne sont pas conservés en mémoire
+    sink = JsonlWriter(stream_path(OUTPUT_FILE)) if "--stream" in sys.argv else None
+    
     print("🔄 Génération en cours (parallèle)...\n")
     
     with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
@@ -157,30 +177,41 @@ def main():
             try:
                 qcms = future.result()
                 if qcms:
-                    all_qcms.extend(qcms)
+                    qcms_count += len(qcms)
+                    if sink:
+                        sink.write_many(qcms)
+                    else:
+                        all_qcms.extend(qcms)
                 else:
                     failed += 1
             except Exception as e:
                 failed += 1
     
     # Sauvegarde
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        json.dump(all_qcms, f, ensure_ascii=False, indent=2)
+    if sink:
+        sink.close()
+        jsonl_to_json(sink.path, OUTPUT_FILE, as_list=True)
+    else:
+        with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
+            json.dump(all_qcms, f, ensure_ascii=False, indent=2)
     
     # Log (recommandation 2)
     with open(log_file, "a", encoding="utf-8") as log:
-        log.write(f"[{datetime.now()}] Phase 12 - Génération END: {len(all_qcms)} QCM, {failed} failed\n")
+        log.write(f"[{datetime.now()}] Phase 12 - Génération END: {qcms_count} QCM, {failed} failed\n")
     
     # Statistiques
     print(f"\n{'='*60}")
     print(f"✅ GÉNÉRATION TERMINÉE")
     print(f"{'='*60}")
     print(f"\n📊 RÉSULTATS\n")
-    print(f"   QCM générés : {len(all_qcms)}")
+    print(f"   QCM générés : {qcms_count}")
     print(f"   Pages traitées : {len(pages) - failed}/{len(pages)} ({(len(pages)-failed)/len(pages)*100:.1f}%)")
     print(f"   Pages échouées : {failed}")
-    print(f"   Moyenne QCM/page : {len(all_qcms)/len(pages):.2f}")
+    print(f"   Moyenne QCM/page : {qcms_count/len(pages):.2f}")
+    print(f"   Instances Ollama : {pool.summary()}")
     print(f"\n💾 Corpus brut : {OUTPUT_FILE}")
+    if sink:
+        print(f"📄 Flux JSONL : {sink.path}")
     print(f"📝 Log : {log_file}")
     print(f"\n🎯 PROCHAINE ÉTAPE : Validation BioBERT")
     print(f"   python scripts/expansion/validate_massive.py")
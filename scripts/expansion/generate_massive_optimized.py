@@ -4,9 +4,24 @@
 GÉNÉRATION MASSIVE OPTIMISÉE - Phase 12
 Version optimisée avec:
 - Timeout 180s (au lieu de 60s)
-- 2 workers (au lieu de 4) pour moins saturer Ollama
+- Concurrence adaptative (AIMD) entre 1 et MAX_WORKERS requêtes en vol
+  (2 par défaut, comme les anciens workers fixes), pilotée par la latence
+  p95 et les timeouts
 - 2 QCM par page (au lieu de 3) pour pages complexes
-- Retry logic améliorée
+- Retries partagés : backoff exponentiel + jitter, budgets par type
+  d'erreur, disjoncteur global (ai_generation/retry_policy)
+
+Options:
+    --range START END  Ne traite que pages[START:END]
+    --no-cache         Ignore le cache des réponses LLM
+    --fixed-concurrency  Limite constante de MAX_WORKERS requêtes en vol
+    --max-concurrency N  Plafond de requêtes en vol (défaut: OLLAMA_MAX_CONCURRENCY ou 2)
+    --ollama-hosts H1,H2   Instances Ollama (défaut: OLLAMA_HOSTS / OLLAMA_HOST)
+    --stream           Écrit chaque QCM dans generated_massive.jsonl dès sa
+                       génération (reprise depuis ce fichier), puis convertit
+                       en generated_massive.json
+    --stream-responses Réponses Ollama en streaming : QCM validés au fil des
+                       tokens, requête interrompue dès que la sortie déraille
 """
 
 import json
@@ -17,18 +32,28 @@ from pathlib import Path
 from tqdm import tqdm
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-import time
+
+# Ajoute le chemin pour importer les modules partagés
+sys.path.append(str(Path(__file__).parent.parent))
+
+from ai_generation.llm_cache import configure_cache, get_cache
+from ai_generation.jsonl_stream import JsonlWriter, iter_jsonl, jsonl_to_json, stream_path
+from ai_generation.adaptive_concurrency import configure_limiter, get_limiter, max_concurrency_from_argv
+from ai_generation.ollama_pool import configure_pool, get_pool, hosts_from_argv
+from ai_generation.retry_policy import InvalidResponse, configure_retry, get_retry
+from ai_generation.stream_parser import QCMStreamParser
 
 # Configuration OPTIMISÉE
 PAGES_DIR = Path("src/data/raw/pages")
 METADATA_FILE = Path("src/data/raw/pages_metadata.json")
 OUTPUT_FILE = Path("src/data/questions/generated_massive.json")
-OLLAMA_URL = "http://localhost:11434/api/generate"
+OLLAMA_URL = "/api/generate"  # Chemin résolu sur une instance du pool (--ollama-hosts)
 MODEL = "mistral:latest"
 QCM_PER_PAGE = 2  # ✅ Réduit de 3 à 2
-MAX_WORKERS = 2  # ✅ Réduit de 4 à 2
-TIMEOUT = 180  # ✅ Augmenté de 60 à 180 secondes
-MAX_RETRIES = 2  # ✅ Nombre de tentatives
+MAX_WORKERS = max_concurrency_from_argv(sys.argv, default=2)  # ✅ Plafond : la limite effective s'adapte (AIMD)
+TIMEOUT = 180  # ✅ Augmenté de 60 à 180 secondes (filet de sécurité)
+MAX_RETRIES = 2  # ✅ Retries par type d'erreur (timeout / HTTP / parse)
+STREAM_RESPONSES = "--stream-responses" in sys.argv
 
 PROMPT_TEMPLATE = """Tu es un expert IADE. À partir de ce texte de cours, génère EXACTEMENT 2 QCM.
 
@@ -58,86 +83,127 @@ Retourne UNIQUEMENT ce format JSON (rien d'autre):
   }}
 ]"""
 
-def generate_for_page(page_data: dict, retry=0) -> list:
-    """Génère QCM pour une page avec retry logic."""
+def parse_generated(generated_text: str) -> list:
+    """Extrait la liste de QCM d'une réponse brute (JSON direct ou entre ```)."""
+    # Gère {"QCM": [...]} ou directement [...]
+    try:
+        parsed = json.loads(generated_text)
+        if isinstance(parsed, dict):
+            qcms = parsed.get("QCM", parsed.get("questions", []))
+        else:
+            qcms = parsed
+    except json.JSONDecodeError:
+        # Essaye d'extraire JSON entre ```
+        if "```json" in generated_text:
+            json_str = generated_text.split("```json")[1].split("```")[0].strip()
+            parsed = json.loads(json_str)
+            qcms = parsed if isinstance(parsed, list) else parsed.get("QCM", [])
+        elif "```" in generated_text:
+            json_str = generated_text.split("```")[1].split("```")[0].strip()
+            qcms = json.loads(json_str)
+        else:
+            raise
+    
+    if not qcms:
+        raise InvalidResponse("aucun QCM dans la réponse")
+    return qcms
+
+def generate_for_page(page_data: dict) -> list:
+    """Génère QCM pour une page (retries gérés par la politique partagée)."""
     page_id = page_data["page_id"]
     page_file = PAGES_DIR / page_data["file"]
     
-    try:
-        # Lecture du contenu
-        with open(page_file, "r", encoding="utf-8") as f:
-            content = f.read().strip()
-        
-        if len(content) < 50:
-            return []
-        
-        # Prompt
-        prompt = PROMPT_TEMPLATE.format(context=content)
+    # Lecture du contenu
+    with open(page_file, "r", encoding="utf-8") as f:
+        content = f.read().strip()
+    
+    if len(content) < 50:
+        return []
+    
+    # Prompt
+    prompt = PROMPT_TEMPLATE.format(context=content)
+    
+    cache = get_cache()
+    cache_key = cache.make_key(MODEL, None, prompt)
+    
+    def attempt() -> list:
+        # Appel Ollama avec timeout augmenté, sous la limite adaptative
+        with get_limiter().slot() as slot, get_pool().lease() as lease:
+            response = requests.post(
+                lease.url(OLLAMA_URL),
+                json={"model": MODEL, "prompt": prompt, "stream": False},
+                timeout=TIMEOUT  # ✅ 180s au lieu de 60s
+            )
+            slot.status(response.status_code)
+            lease.status(response.status_code)
+        response.raise_for_status()
         
-        # Appel Ollama avec timeout augmenté
-        response = requests.post(
-            OLLAMA_URL,
-            json={"model": MODEL, "prompt": prompt, "stream": False},
-            timeout=TIMEOUT  # ✅ 180s au lieu de 60s
-        )
+        generated_text = response.json().get("response", "").strip()
+        qcms = parse_generated(generated_text)
         
-        if response.status_code != 200:
-            raise Exception(f"Ollama error: {response.status_code}")
+        # Réponse exploitable : on la garde pour les prochains runs
+        cache.put(cache_key, generated_text, model=MODEL)
+        return qcms
+    
+    def attempt_stream() -> list:
+        # Réponse lue au fil des tokens : arrêt dès 2 QCM valides ou déraillement
+        parser = QCMStreamParser(max_items=QCM_PER_PAGE)
+        with get_limiter().slot() as slot, get_pool().lease() as lease:
+            response = requests.post(
+                lease.url(OLLAMA_URL),
+                json={"model": MODEL, "prompt": prompt, "stream": True},
+                timeout=TIMEOUT,
+                stream=True
+            )
+            slot.status(response.status_code)
+            lease.status(response.status_code)
+            try:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    part = json.loads(line)
+                    parser.feed(part.get("response", ""))
+                    if part.get("done") or parser.should_stop:
+                        break
+            finally:
+                response.close()  # Libère Ollama si on s'arrête avant la fin
         
-        # Parse réponse
-        result = response.json()
-        generated_text = result.get("response", "").strip()
+        if not parser.items:
+            raise InvalidResponse(parser.derailed or "aucun QCM dans la réponse")
         
-        # Parse JSON
-        # Gère {"QCM": [...]} ou directement [...]
+        # Seule une réponse complète et saine est réutilisable telle quelle
+        if parser.complete and not parser.derailed:
+            cache.put(cache_key, parser.text.strip(), model=MODEL)
+        return parser.items
+    
+    qcms = None
+    cached = cache.get(cache_key)
+    if cached is not None:
         try:
-            parsed = json.loads(generated_text)
-            if isinstance(parsed, dict):
-                qcms = parsed.get("QCM", parsed.get("questions", []))
-            else:
-                qcms = parsed
-        except json.JSONDecodeError:
-            # Essaye d'extraire JSON entre ```
-            if "```json" in generated_text:
-                json_str = generated_text.split("```json")[1].split("```")[0].strip()
-                parsed = json.loads(json_str)
-                qcms = parsed if isinstance(parsed, list) else parsed.get("QCM", [])
-            elif "```" in generated_text:
-                json_str = generated_text.split("```")[1].split("```")[0].strip()
-                qcms = json.loads(json_str)
-            else:
-                raise
-        
-        # Enrichit les QCM
-        for i, qcm in enumerate(qcms):
-            qcm["id"] = f"{page_id}_q{i+1}"
-            qcm["source_pdf"] = page_data["pdf"]
-            qcm["page"] = page_data["page_number"]
-            qcm["page_id"] = page_id
-            qcm["module_id"] = "unknown"  # À classifier plus tard
-            qcm["difficulty"] = "medium"
-            qcm["mode"] = "revision"
-            qcm["generation_method"] = "massive_optimized"
-        
-        return qcms[:QCM_PER_PAGE]  # Limite à 2 QCM
+            qcms = parse_generated(cached)
+        except (ValueError, AttributeError):
+            qcms = None
     
-    except requests.exceptions.Timeout:
-        if retry < MAX_RETRIES:
-            print(f"   ⏱️  Timeout {page_id}, tentative {retry+1}/{MAX_RETRIES}")
-            time.sleep(5)  # Pause avant retry
-            return generate_for_page(page_data, retry + 1)
-        else:
-            print(f"   ⚠️  Timeout définitif {page_id}")
+    if qcms is None:
+        try:
+            qcms = get_retry().call(attempt_stream if STREAM_RESPONSES else attempt)
+        except Exception as e:
+            print(f"   ⚠️  Échec définitif {page_id}: {str(e)[:80]}")
             return []
     
-    except Exception as e:
-        if retry < MAX_RETRIES:
-            print(f"   ⚠️  Erreur {page_id}, retry {retry+1}/{MAX_RETRIES}")
-            time.sleep(5)
-            return generate_for_page(page_data, retry + 1)
-        else:
-            print(f"   ⚠️  Erreur définitive {page_id}: {e}")
-            return []
+    # Enrichit les QCM
+    for i, qcm in enumerate(qcms):
+        qcm["id"] = f"{page_id}_q{i+1}"
+        qcm["source_pdf"] = page_data["pdf"]
+        qcm["page"] = page_data["page_number"]
+        qcm["page_id"] = page_id
+        qcm["module_id"] = "unknown"  # À classifier plus tard
+        qcm["difficulty"] = "medium"
+        qcm["mode"] = "revision"
+        qcm["generation_method"] = "massive_optimized"
+    
+    return qcms[:QCM_PER_PAGE]  # Limite à 2 QCM
 
 def main():
     print("="*60)
@@ -145,9 +211,29 @@ def main():
     print("="*60)
     print("\n✅ OPTIMISATIONS:")
     print(f"   • Timeout: {TIMEOUT}s (au lieu de 60s)")
-    print(f"   • Workers: {MAX_WORKERS} (au lieu de 4)")
+    
+    limiter = configure_limiter(
+        adaptive="--fixed-concurrency" not in sys.argv,
+        max_limit=MAX_WORKERS,
+        latency_ceiling=TIMEOUT / 2
+    )
+    if "--fixed-concurrency" in sys.argv:
+        print(f"   • Workers: {MAX_WORKERS} (fixe)")
+    else:
+        print(f"   • Workers: adaptatif 1-{MAX_WORKERS} (départ à {limiter.controller.limit})")
     print(f"   • QCM/page: {QCM_PER_PAGE} (au lieu de 3)")
-    print(f"   • Retries: {MAX_RETRIES}\n")
+    retry = configure_retry(budgets={'timeout': MAX_RETRIES, 'http': MAX_RETRIES, 'parse': MAX_RETRIES})
+    print(f"   • Retries: {MAX_RETRIES} par type d'erreur (backoff exponentiel + jitter)")
+    
+    pool = configure_pool(hosts_from_argv(sys.argv))
+    healthy = pool.check_health()
+    print(f"   • Instances Ollama: {len(healthy)}/{len(pool.endpoints)} joignables")
+    
+    cache = configure_cache(enabled="--no-cache" not in sys.argv)
+    print(f"   • Cache LLM: {'activé' if cache.enabled else 'désactivé (--no-cache)'}")
+    if STREAM_RESPONSES:
+        print(f"   • Réponses en streaming (arrêt anticipé)")
+    print()
     
     # Charge métadonnées pages
     with open(METADATA_FILE, "r") as f:
@@ -157,12 +243,37 @@ def main():
     
     # Charge QCM existants si on relance
     existing_qcms = []
-    if OUTPUT_FILE.exists():
+    existing_count = 0
+    existing_page_ids = None
+    sink = None
+    
+    if "--stream" in sys.argv:
+        # Sortie en flux : la reprise se fait depuis le JSONL, sans tout charger
+        jsonl_file = stream_path(OUTPUT_FILE)
+        if jsonl_file.exists():
+            existing_page_ids = set()
+            for q in iter_jsonl(jsonl_file):
+                existing_page_ids.add(q["page_id"])
+                existing_count += 1
+            sink = JsonlWriter(jsonl_file, append=True)
+        else:
+            sink = JsonlWriter(jsonl_file)
+            if OUTPUT_FILE.exists():
+                with open(OUTPUT_FILE, "r") as f:
+                    existing = json.load(f)
+                sink.write_many(existing)
+                existing_page_ids = {q["page_id"] for q in existing}
+                existing_count = len(existing)
+                del existing
+    elif OUTPUT_FILE.exists():
         with open(OUTPUT_FILE, "r") as f:
             existing_qcms = json.load(f)
         existing_page_ids = {q["page_id"] for q in existing_qcms}
+        existing_count = len(existing_qcms)
+    
+    if existing_page_ids is not None:
         pages = [p for p in pages if p["page_id"] not in existing_page_ids]
-        print(f"📘 {len(existing_qcms)} QCM existants, {len(pages)} pages restantes\n")
+        print(f"📘 {existing_count} QCM existants, {len(pages)} pages restantes\n")
     
     # Support --range pour génération par batch
     if "--range" in sys.argv:
@@ -183,11 +294,12 @@ def main():
         log.write(f"[{datetime.now()}] Phase 12 - Génération OPTIMISÉE START: {len(pages)} pages\n")
     
     all_qcms = existing_qcms.copy()
+    qcms_count = existing_count
     failed = 0
     
     print("🔄 Génération en cours (optimisée)...\n")
     
-    # Parallélisation réduite (2 workers)
+    # Parallélisation bornée par le limiteur adaptatif
     with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
         futures = {executor.submit(generate_for_page, page): page for page in pages}
         
@@ -196,7 +308,11 @@ def main():
                 try:
                     qcms = future.result()
                     if qcms:
-                        all_qcms.extend(qcms)
+                        qcms_count += len(qcms)
+                        if sink:
+                            sink.write_many(qcms)
+                        else:
+                            all_qcms.extend(qcms)
                     else:
                         failed += 1
                 except Exception as e:
@@ -204,12 +320,16 @@ def main():
                 pbar.update(1)
     
     # Sauvegarde
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        json.dump(all_qcms, f, ensure_ascii=False, indent=2)
+    if sink:
+        sink.close()
+        jsonl_to_json(sink.path, OUTPUT_FILE, as_list=True)
+    else:
+        with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
+            json.dump(all_qcms, f, ensure_ascii=False, indent=2)
     
     # Log
     with open(log_file, "a", encoding="utf-8") as log:
-        log.write(f"[{datetime.now()}] Phase 12 - Génération OPTIMISÉE END: {len(all_qcms)} QCM, {failed} failed\n")
+        log.write(f"[{datetime.now()}] Phase 12 - Génération OPTIMISÉE END: {qcms_count} QCM, {failed} failed\n")
     
     # Statistiques
     success_rate = (len(pages) - failed) / len(pages) * 100 if pages else 0
@@ -217,12 +337,18 @@ def main():
     print(f"✅ GÉNÉRATION OPTIMISÉE TERMINÉE")
     print(f"{'='*60}")
     print(f"\n📊 RÉSULTATS\n")
-    print(f"   QCM générés : {len(all_qcms)}")
+    print(f"   QCM générés : {qcms_count}")
     print(f"   Pages traitées : {len(pages) - failed}/{len(pages)} ({success_rate:.1f}%)")
     print(f"   Pages échouées : {failed}")
+    print(f"   Cache LLM : {cache.summary()}")
+    print(f"   Concurrence : {limiter.controller.summary()}")
+    print(f"   Instances Ollama : {pool.summary()}")
+    print(f"   Retries : {retry.summary()}")
     if pages:
-        print(f"   Moyenne QCM/page : {len(all_qcms)/len(pages):.2f}")
+        print(f"   Moyenne QCM/page : {qcms_count/len(pages):.2f}")
     print(f"\n💾 Corpus brut : {OUTPUT_FILE}")
+    if sink:
+        print(f"📄 Flux JSONL : {sink.path}")
     print(f"📝 Log : {log_file}")
     print(f"\n🎯 PROCHAINE ÉTAPE : Validation BioBERT")
     print(f"   python scripts/expansion/validate_massive.py")
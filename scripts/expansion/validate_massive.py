@@ -49,15 +49,14 @@ def main():
     
     print("🔄 Validation en cours...\n")
     
-    for i, qcm in enumerate(qcms, 1):
-        text = qcm.get("text", "")
-        explanation = qcm.get("explanation", "")
-        module_id = qcm.get("module_id", "unknown")
-        
-        # Calcule score BioBERT
-        full_text = f"{text} {explanation}"
-        score = scorer.compute_biomedical_score(full_text, module_id)
-        
+    # Calcule scores BioBERT (inférence batchée)
+    scores = scorer.compute_biomedical_scores(
+        [f"{qcm.get('text', '')} {qcm.get('explanation', '')}" for qcm in qcms],
+        [qcm.get("module_id", "unknown") for qcm in qcms]
+    )
+    
+    for i, (qcm, score) in enumerate(zip(qcms, scores), 1):
+        score = float(score)
         qcm["biomedical_score"] = round(score, 3)
         
         if score >= THRESHOLD:
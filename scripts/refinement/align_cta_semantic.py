@@ -4,200 +4,287 @@
 ALIGNEMENT SÉMANTIQUE GLOBAL — Phase 11
 Recalcule automatiquement le meilleur PDF et la page la plus pertinente
 pour chaque question du corpus IADE NEW.
+
+Incrémental : l'alignement du run précédent (OUTPUT_FILE) est réutilisé pour
+les questions dont le texte + explication n'a pas changé (alignment_hash),
+tant que l'ensemble des PDF indexés est le même.
+
+Importable : Aligner charge MiniLM et l'index des pages à la demande
+(démarrage quasi instantané avec les caches chauds).
+    aligner = Aligner()
+    aligner.align(questions)   # champs source_pdf / page_number / alignment_* mis à jour
+
+Options:
+    --full    Réaligne tout le corpus
 """
 
+import hashlib
 import json
+import sys
+from collections import Counter
 from pathlib import Path
-import fitz  # PyMuPDF
-from sentence_transformers import SentenceTransformer, util
-from tqdm import tqdm
+from typing import Dict, List, Optional
+
+# Ajoute le chemin pour importer les modules partagés
+sys.path.append(str(Path(__file__).parent.parent))
+
+from ai_generation.embedding_store import get_embedding_store
+from ai_generation.page_index import EmbeddingIndex, find_course_pdfs, get_page_index
 
 # Chemins
 DATA_FILE = Path("src/data/questions/compiled_refined_enriched.json")
-PDF_DIR = Path("src/data/sources")
-PUBLIC_PDF_DIR = Path("public/pdfs")
 OUTPUT_FILE = Path("src/data/questions/compiled_refined_aligned.json")
 REPORT_FILE = Path("reports/cta_alignment_report.json")
 
-# Initialisation du modèle sémantique
-print("="*60)
-print("🧠 ALIGNEMENT SÉMANTIQUE GLOBAL — Phase 11")
-print("="*60)
-print("\n🧠 Chargement modèle sémantique (MiniLM)...")
-model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
-print("   ✓ Modèle chargé")
-
-# Trouve tous les PDFs
-def find_all_pdfs():
-    pdfs = {}
-    for directory in [PDF_DIR, PUBLIC_PDF_DIR]:
-        if directory.exists():
-            for pdf_path in directory.glob("*.pdf"):
-                if pdf_path.name not in pdfs:
-                    pdfs[pdf_path.name] = pdf_path
-    return pdfs
-
-# Chargement des PDFs
-print("\n📚 Extraction du texte de tous les PDF...")
-all_pdfs = find_all_pdfs()
-pdf_texts = {}
-
-for pdf_name, pdf_path in all_pdfs.items():
-    try:
-        with fitz.open(pdf_path) as doc:
-            pages = []
-            for page in doc:
-                text = page.get_text("text")
-                # Nettoie le texte
-                text = " ".join(text.split())
-                pages.append(text)
-        
-        pdf_texts[pdf_name] = pages
-        print(f"   ✓ {pdf_name} → {len(pages)} pages")
-    except Exception as e:
-        print(f"   ⚠️  Erreur {pdf_name}: {e}")
-
-if not pdf_texts:
-    print("❌ Aucun PDF trouvé !")
-    exit(1)
-
-# Encodage des pages
-print("\n⚙️  Encodage des pages PDF (peut prendre 2-3 min)...")
-pdf_embeddings = {}
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+TOP_K = 4  # Meilleure page + 3 alternatives conservées pour relecture
+QUESTION_BATCH_SIZE = 64  # Questions par batch d'encodage
+ALIGNMENT_METHOD = "semantic_v1.2"
 
-for pdf_name, pages in pdf_texts.items():
-    print(f"   Encodage {pdf_name}...")
-    embeddings = []
+def question_text(q):
+    text = q.get("text", "")
+    explanation = q.get("explanation", "")
     
-    # Encode par batch pour plus de rapidité
-    for i in range(0, len(pages), 32):
-        batch = pages[i:i+32]
-        batch_embeds = model.encode(batch, convert_to_tensor=True, show_progress_bar=False)
-        embeddings.extend(batch_embeds)
+    # Gère le cas où explanation est une liste
+    if isinstance(explanation, list):
+        explanation = " ".join(str(e) for e in explanation)
     
-    pdf_embeddings[pdf_name] = embeddings
-    print(f"   ✓ {len(embeddings)} pages encodées")
+    return text + " " + str(explanation)[:200]
 
-# Chargement du corpus
-print(f"\n📂 Chargement corpus...")
-with open(DATA_FILE, "r", encoding="utf-8") as f:
-    data = json.load(f)
+def alignment_hash(q):
+    """Empreinte du contenu aligné (texte + explication complète)."""
+    content = json.dumps([q.get("text", ""), q.get("explanation", "")], ensure_ascii=False)
+    return hashlib.sha1(content.encode("utf-8")).hexdigest()
 
-questions = data.get("questions", data)
-print(f"   ✓ {len(questions)} QCM à aligner\n")
-
-# Alignement sémantique
-aligned_results = []
-changes = 0
-improvements = 0
+def load_previous_alignments(path: Path, index_fingerprint: str) -> Dict[str, List[Dict]]:
+    """Alignements d'un run précédent par alignment_hash (vide si les PDF ont changé)."""
+    if not path.exists():
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            previous = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+    if not isinstance(previous, dict) or previous.get("alignment_index") != index_fingerprint:
+        return {}
+    
+    alignments = {}
+    for pq in previous.get("questions", []):
+        if pq.get("alignment_hash") and pq.get("alignment_method") == ALIGNMENT_METHOD:
+            best = [{"pdf": pq["source_pdf"], "page": pq["page_number"], "score": pq["alignment_score"]}] \
+                if pq.get("source_pdf") else []
+            alignments[pq["alignment_hash"]] = best + pq.get("alignment_alternatives", [])
+    return alignments
 
-print("🔄 Alignement en cours...\n")
+# =============================================================================
+# ALIGNEUR
+# =============================================================================
 
-for q in tqdm(questions, desc="   Progression"):
-    text = q.get("text", "")
-    explanation = q.get("explanation", "")
+class Aligner:
+    """
+    Aligne des questions sur les pages des PDF de cours.
     
-    # Gère le cas où explanation est une liste
-    if isinstance(explanation, list):
-        explanation = " ".join(str(e) for e in explanation)
+    Modèle et index des pages chargés au premier besoin : avec les caches
+    chauds (index à jour, embeddings déjà calculés), MiniLM n'est pas chargé.
+    """
     
-    q_text = text + " " + str(explanation)[:200]
+    def __init__(self, pdfs: Optional[Dict[str, Path]] = None, top_k: int = TOP_K):
+        """
+        Args:
+            pdfs: PDF à indexer {nom: chemin} (défaut: find_course_pdfs())
+            top_k: Pages retenues par question (meilleure + alternatives)
+        """
+        self.pdfs = pdfs
+        self.top_k = top_k
+        self._store = None
+        self._page_index: Optional[EmbeddingIndex] = None
     
-    if not q_text.strip():
-        aligned_results.append(q)
-        continue
+    @property
+    def store(self):
+        """Stockage des embeddings MiniLM (le modèle n'est chargé que pour un texte inconnu)."""
+        if self._store is None:
+            self._store = get_embedding_store(MODEL_NAME)
+        return self._store
     
-    # Encode la question
-    q_embed = model.encode(q_text, convert_to_tensor=True, show_progress_bar=False)
+    @property
+    def page_index(self) -> EmbeddingIndex:
+        """Index des pages, synchronisé avec les PDF au premier accès."""
+        if self._page_index is None:
+            pdfs = self.pdfs if self.pdfs is not None else find_course_pdfs()
+            self._page_index = get_page_index(pdfs, store=self.store)
+        return self._page_index
     
-    # Trouve la meilleure correspondance
-    best_match = {"pdf": None, "page": None, "score": 0.0}
+    def fingerprint(self) -> str:
+        """Empreinte de l'ensemble des PDF indexés."""
+        return self.page_index.fingerprint()
     
-    for pdf_name, page_embeds in pdf_embeddings.items():
-        for page_idx, page_embed in enumerate(page_embeds):
-            similarity = float(util.cos_sim(q_embed, page_embed))
+    def candidates(self, texts: List[str]) -> List[List[Dict]]:
+        """Pages candidates (pdf, page, score > 0) de chaque texte, de la meilleure à la moins bonne."""
+        q_matrix = self.store.encode(texts, batch_size=QUESTION_BATCH_SIZE,
+                                     show_progress_bar=len(texts) > QUESTION_BATCH_SIZE)
+        top_rows, top_scores = self.page_index.search(q_matrix, self.top_k)
+        entries = self.page_index.entries
+        return [
+            [{"pdf": entries[row]["pdf"], "page": entries[row]["page"], "score": float(score)}
+             for row, score in zip(rows, scores) if row >= 0 and score > 0]
+            for rows, scores in zip(top_rows, top_scores)
+        ]
+    
+    def align(self, questions: List[Dict], previous: Optional[Dict[str, List[Dict]]] = None) -> Dict[str, int]:
+        """
+        Aligne les questions (mises à jour en place).
+        
+        Args:
+            previous: Alignements réutilisables par alignment_hash
+                (voir load_previous_alignments)
+        
+        Returns:
+            Compteurs {'aligned', 'reused', 'changes', 'improvements'}
+        """
+        previous = previous or {}
+        q_texts = [question_text(q) for q in questions]
+        q_hashes = [alignment_hash(q) for q in questions]
+        to_align = [i for i, q_text in enumerate(q_texts) if q_text.strip()]
+        
+        # Réutilise les alignements des questions inchangées, encode les autres
+        matches = {i: previous[q_hashes[i]] for i in to_align if q_hashes[i] in previous}
+        pending = [i for i in to_align if i not in matches]
+        if pending:
+            matches.update(zip(pending, self.candidates([q_texts[i] for i in pending])))
+        
+        stats = {"aligned": len(pending), "reused": len(to_align) - len(pending),
+                 "changes": 0, "improvements": 0}
+        
+        for i in to_align:
+            q = questions[i]
+            candidates = matches[i]
+            
+            # Trouve la meilleure correspondance
+            best_match = candidates[0] if candidates else {"pdf": None, "page": None, "score": 0.0}
             
-            if similarity > best_match["score"]:
-                best_match.update({
-                    "pdf": pdf_name,
-                    "page": page_idx + 1,
-                    "score": similarity
-                })
-    
-    # Vérifie si c'est une amélioration
-    old_pdf = q.get("source_pdf")
-    old_page = q.get("page_number", 0)
-    old_score = q.get("alignment_score", 0)
-    
-    if best_match["pdf"] != old_pdf or best_match["page"] != old_page:
-        changes += 1
+            # Vérifie si c'est une amélioration
+            old_pdf = q.get("source_pdf")
+            old_page = q.get("page_number", 0)
+            old_score = q.get("alignment_score", 0)
+            
+            if best_match["pdf"] != old_pdf or best_match["page"] != old_page:
+                stats["changes"] += 1
+                
+                if best_match["score"] > old_score:
+                    stats["improvements"] += 1
+            
+            # Met à jour
+            q["source_pdf"] = best_match["pdf"]
+            q["page_number"] = best_match["page"]
+            q["alignment_score"] = round(best_match["score"], 3)
+            q["alignment_method"] = ALIGNMENT_METHOD
+            q["alignment_hash"] = q_hashes[i]
+            q["alignment_alternatives"] = [
+                {"pdf": c["pdf"], "page": c["page"], "score": round(c["score"], 3)}
+                for c in candidates[1:]
+            ]
         
-        if best_match["score"] > old_score:
-            improvements += 1
-    
-    # Met à jour
-    q["source_pdf"] = best_match["pdf"]
-    q["page_number"] = best_match["page"]
-    q["alignment_score"] = round(best_match["score"], 3)
-    q["alignment_method"] = "semantic_v1.2"
-    
-    aligned_results.append(q)
-
-# Statistiques
-summary = {
-    "total_questions": len(questions),
-    "changes": changes,
-    "improvements": improvements,
-    "avg_score": round(sum(q["alignment_score"] for q in aligned_results) / len(aligned_results), 3) if aligned_results else 0,
-    "high_confidence": sum(1 for q in aligned_results if q["alignment_score"] >= 0.5),
-    "medium_confidence": sum(1 for q in aligned_results if 0.3 <= q["alignment_score"] < 0.5),
-    "low_confidence": sum(1 for q in aligned_results if q["alignment_score"] < 0.3),
-    "pdf_distribution": {}
-}
-
-# Distribution par PDF
-from collections import Counter
-pdf_counts = Counter(q["source_pdf"] for q in aligned_results)
-summary["pdf_distribution"] = dict(pdf_counts)
-
-# Sauvegarde du corpus corrigé
-data["questions"] = aligned_results
-data["alignment_version"] = "v1.2_semantic"
-data["total_questions"] = len(aligned_results)
-
-with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-    json.dump(data, f, ensure_ascii=False, indent=2)
-
-# Sauvegarde du rapport
-REPORT_FILE.parent.mkdir(parents=True, exist_ok=True)
-with open(REPORT_FILE, "w", encoding="utf-8") as f:
-    json.dump(summary, f, ensure_ascii=False, indent=2)
-
-# Affichage
-print("\n" + "="*60)
-print("✅ ALIGNEMENT SÉMANTIQUE TERMINÉ")
-print("="*60)
-print(f"\n💾 Corpus corrigé : {OUTPUT_FILE}")
-print(f"📊 Rapport : {REPORT_FILE}\n")
-print(f"📈 RÉSULTATS\n")
-print(f"   Score moyen d'alignement : {summary['avg_score']}")
-print(f"   Changements effectués    : {changes}/{len(questions)} ({changes/len(questions)*100:.1f}%)")
-print(f"   Améliorations détectées  : {improvements}/{changes if changes > 0 else 1}")
-print(f"\n   Confiance haute (≥0.5)   : {summary['high_confidence']} QCM ({summary['high_confidence']/len(questions)*100:.1f}%)")
-print(f"   Confiance moyenne (0.3-0.5): {summary['medium_confidence']} QCM ({summary['medium_confidence']/len(questions)*100:.1f}%)")
-print(f"   Confiance faible (<0.3)  : {summary['low_confidence']} QCM ({summary['low_confidence']/len(questions)*100:.1f}%)")
-
-print(f"\n📚 DISTRIBUTION PAR PDF\n")
-for pdf_name, count in sorted(summary['pdf_distribution'].items(), key=lambda x: -x[1]):
-    pct = count / len(questions) * 100
-    print(f"   {pdf_name:45} : {count:3} QCM ({pct:5.1f}%)")
-
-print("\n" + "="*60)
-
-if summary['high_confidence'] >= len(questions) * 0.8:
-    print("✅ ALIGNEMENT EXCELLENT (≥80% haute confiance)")
-else:
-    print("⚠️  ALIGNEMENT PARTIEL - Vérifier manuellement les scores faibles")
-
-print("="*60)
+        return stats
+
+# =============================================================================
+# MAIN
+# =============================================================================
+
+def main():
+    print("="*60)
+    print("🧠 ALIGNEMENT SÉMANTIQUE GLOBAL — Phase 11")
+    print("="*60)
+    
+    # Index des pages (seuls les PDF nouveaux ou modifiés sont réextraits / réencodés)
+    print("\n📚 Index des pages PDF...")
+    all_pdfs = find_course_pdfs()
+    
+    if not all_pdfs:
+        print("❌ Aucun PDF trouvé !")
+        exit(1)
+    
+    aligner = Aligner(all_pdfs)
+    print(f"   ✓ {len(all_pdfs)} PDF : {aligner.page_index.summary()}")
+    
+    # Chargement du corpus
+    print(f"\n📂 Chargement corpus...")
+    with open(DATA_FILE, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    
+    questions = data.get("questions", data)
+    print(f"   ✓ {len(questions)} QCM à aligner\n")
+    
+    # Alignement sémantique (questions inchangées reprises du run précédent)
+    print("🔄 Alignement en cours...\n")
+    index_fingerprint = aligner.fingerprint()
+    previous = {} if "--full" in sys.argv else load_previous_alignments(OUTPUT_FILE, index_fingerprint)
+    counts = aligner.align(questions, previous)
+    if counts["reused"]:
+        print(f"   ♻️  {counts['reused']} QCM inchangés (alignement réutilisé), {counts['aligned']} alignés")
+    print(f"   ✓ {counts['aligned']} QCM × {len(aligner.page_index)} pages comparés")
+    print(f"   Stockage embeddings : {aligner.store.summary()}")
+    
+    aligned_results = questions
+    changes = counts["changes"]
+    improvements = counts["improvements"]
+    
+    # Statistiques
+    summary = {
+        "total_questions": len(questions),
+        "changes": changes,
+        "improvements": improvements,
+        "avg_score": round(sum(q["alignment_score"] for q in aligned_results) / len(aligned_results), 3) if aligned_results else 0,
+        "high_confidence": sum(1 for q in aligned_results if q["alignment_score"] >= 0.5),
+        "medium_confidence": sum(1 for q in aligned_results if 0.3 <= q["alignment_score"] < 0.5),
+        "low_confidence": sum(1 for q in aligned_results if q["alignment_score"] < 0.3),
+        "pdf_distribution": {}
+    }
+    
+    # Distribution par PDF
+    pdf_counts = Counter(q["source_pdf"] for q in aligned_results)
+    summary["pdf_distribution"] = dict(pdf_counts)
+    
+    # Sauvegarde du corpus corrigé
+    data["questions"] = aligned_results
+    data["alignment_version"] = "v1.2_semantic"
+    data["alignment_index"] = index_fingerprint
+    data["total_questions"] = len(aligned_results)
+    
+    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    
+    # Sauvegarde du rapport
+    REPORT_FILE.parent.mkdir(parents=True, exist_ok=True)
+    with open(REPORT_FILE, "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    
+    # Affichage
+    print("\n" + "="*60)
+    print("✅ ALIGNEMENT SÉMANTIQUE TERMINÉ")
+    print("="*60)
+    print(f"\n💾 Corpus corrigé : {OUTPUT_FILE}")
+    print(f"📊 Rapport : {REPORT_FILE}\n")
+    print(f"📈 RÉSULTATS\n")
+    print(f"   Score moyen d'alignement : {summary['avg_score']}")
+    print(f"   Changements effectués    : {changes}/{len(questions)} ({changes/len(questions)*100:.1f}%)")
+    print(f"   Améliorations détectées  : {improvements}/{changes if changes > 0 else 1}")
+    print(f"\n   Confiance haute (≥0.5)   : {summary['high_confidence']} QCM ({summary['high_confidence']/len(questions)*100:.1f}%)")
+    print(f"   Confiance moyenne (0.3-0.5): {summary['medium_confidence']} QCM ({summary['medium_confidence']/len(questions)*100:.1f}%)")
+    print(f"   Confiance faible (<0.3)  : {summary['low_confidence']} QCM ({summary['low_confidence']/len(questions)*100:.1f}%)")
+    
+    print(f"\n📚 DISTRIBUTION PAR PDF\n")
+    for pdf_name, count in sorted(summary['pdf_distribution'].items(), key=lambda x: -x[1]):
+        pct = count / len(questions) * 100
+        print(f"   {pdf_name:45} : {count:3} QCM ({pct:5.1f}%)")
+    
+    print("\n" + "="*60)
+    
+    if summary['high_confidence'] >= len(questions) * 0.8:
+        print("✅ ALIGNEMENT EXCELLENT (≥80% haute confiance)")
+    else:
+        print("⚠️  ALIGNEMENT PARTIEL - Vérifier manuellement les scores faibles")
+    
+    print("="*60)
 
+if __name__ == "__main__":
+    main()
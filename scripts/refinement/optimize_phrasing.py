@@ -3,14 +3,38 @@
 """
 Optimisation linguistique - Phase 10+
 Reformule les questions maladroites ou rigides pour améliorer la fluidité
+
+Options:
+    --no-cache           Ignore le cache des réponses LLM
+    --fixed-concurrency  Toujours MAX_WORKERS requêtes en vol (pas d'AIMD)
+    --max-concurrency N  Plafond de requêtes en vol (défaut: OLLAMA_MAX_CONCURRENCY ou 4)
+    --ollama-hosts H1,H2 Instances Ollama (défaut: OLLAMA_HOSTS / OLLAMA_HOST)
 """
 
 import json
 import requests
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-OLLAMA_URL = "http://localhost:11434/api/generate"
+# Ajoute le chemin pour importer les modules partagés
+sys.path.append(str(Path(__file__).parent.parent))
+
+from ai_generation.llm_cache import configure_cache, get_cache
+from ai_generation.adaptive_concurrency import configure_limiter, get_limiter, max_concurrency_from_argv
+from ai_generation.ollama_pool import configure_pool, get_pool, hosts_from_argv
+from ai_generation.retry_policy import configure_retry, get_retry
+
+OLLAMA_URL = "/api/generate"  # Chemin résolu sur une instance du pool (--ollama-hosts)
 MODEL = "mistral:latest"
+MAX_WORKERS = max_concurrency_from_argv(sys.argv, default=4)  # Plafond de requêtes simultanées (limite adaptative en dessous)
+
+def post_generate(payload, timeout):
+    """Un appel /api/generate sous la limite adaptative, sur une instance du pool."""
+    with get_limiter().slot(), get_pool().lease() as lease:
+        response = requests.post(lease.url(OLLAMA_URL), json=payload, timeout=timeout)
+        response.raise_for_status()
+    return response
 
 def check_phrasing(question_text):
     """Évalue la fluidité d'une question (0-10)"""
@@ -32,16 +56,24 @@ Réponds uniquement par un chiffre 0-10."""
         "options": {"temperature": 0.1}
     }
     
+    cache = get_cache()
+    cache_key = cache.make_key(MODEL, None, prompt, payload["options"])
+    
     try:
-        response = requests.post(OLLAMA_URL, json=payload, timeout=15)
-        response.raise_for_status()
-        result = response.json()
-        score_text = result.get("response", "5").strip()
+        score_text = cache.get(cache_key)
+        cache_hit = score_text is not None
+        
+        if not cache_hit:
+            response = get_retry().call(lambda: post_generate(payload, timeout=15))
+            result = response.json()
+            score_text = result.get("response", "5").strip()
         
         # Extrait le chiffre
         import re
         match = re.search(r'\d+', score_text)
         if match:
+            if not cache_hit:
+                cache.put(cache_key, score_text, model=MODEL)
             return int(match.group())
         return 5  # Score neutre par défaut
     except Exception as e:
@@ -65,8 +97,7 @@ Réponds uniquement par la question reformulée, sans commentaire."""
     }
     
     try:
-        response = requests.post(OLLAMA_URL, json=payload, timeout=20)
-        response.raise_for_status()
+        response = get_retry().call(lambda: post_generate(payload, timeout=20))
         result = response.json()
         return result.get("response", question_text).strip().strip('"')
     except Exception as e:
@@ -91,6 +122,13 @@ def main():
     questions = data.get("questions", data)
     print(f"   ✓ {len(questions)} questions chargées")
     
+    cache = configure_cache(enabled="--no-cache" not in sys.argv)
+    limiter = configure_limiter(adaptive="--fixed-concurrency" not in sys.argv, max_limit=MAX_WORKERS)
+    pool = configure_pool(hosts_from_argv(sys.argv))
+    pool.check_health()
+    retry = configure_retry()
+    executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+    
     # Évaluation + optimisation
     print("\n🔧 Analyse linguistique...")
     print("   (Seuil : score < 7 → reformulation)")
@@ -98,9 +136,10 @@ def main():
     to_optimize = []
     scores = []
     
-    for i, q in enumerate(questions, 1):
-        question_text = q.get("text", "")
-        score = check_phrasing(question_text)
+    # map() conserve l'ordre ; le limiteur borne les appels réels
+    phrasing_scores = executor.map(lambda q: check_phrasing(q.get("text", "")), questions)
+    
+    for i, score in enumerate(phrasing_scores, 1):
         scores.append(score)
         
         if score < 7:
@@ -112,8 +151,10 @@ def main():
     avg_score = sum(scores) / len(scores) if scores else 0
     print(f"\n📊 Score moyen de fluidité : {avg_score:.1f}/10")
     print(f"   → {len(to_optimize)} questions à optimiser ({len(to_optimize)/len(questions)*100:.1f}%)")
+    print(f"   Cache LLM : {cache.summary()}")
     
     if len(to_optimize) == 0:
+        executor.shutdown()
         print(f"\n✅ Aucune optimisation nécessaire !")
         return
     
@@ -121,12 +162,13 @@ def main():
     print(f"\n🔄 Reformulation de {len(to_optimize)} questions...")
     optimized = 0
     
-    for idx in to_optimize:
+    optimized_texts = executor.map(lambda idx: optimize_question(questions[idx].get("text")), to_optimize)
+    
+    for idx, optimized_text in zip(to_optimize, optimized_texts):
         q = questions[idx]
         original = q.get("text")
         
         print(f"   [{idx+1}] Reformulation...", end=" ")
-        optimized_text = optimize_question(original)
         
         if optimized_text != original:
             q["text"] = optimized_text
@@ -136,7 +178,11 @@ def main():
         else:
             print("⊘ (inchangé)")
     
+    executor.shutdown()
     print(f"\n   ✓ {optimized} questions reformulées")
+    print(f"   Concurrence : {limiter.controller.summary()}")
+    print(f"   Instances Ollama : {pool.summary()}")
+    print(f"   Retries : {retry.summary()}")
     
     # Sauvegarde
     data["questions"] = questions
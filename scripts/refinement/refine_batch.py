@@ -3,13 +3,40 @@
 """
 IADE NEW — Réécriture IA ciblée (via Ollama)
 Améliore les QCM identifiés comme faibles, sans changer la réponse correcte.
+
+Requêtes HTTP concurrentes vers Ollama (clients réutilisés par instance,
+sortie JSON imposée) au lieu d'un processus `ollama run` par question.
+Chaque QCM raffiné est journalisé : un run interrompu reprend là où il
+s'était arrêté.
+
+Options:
+    --resume             Reprend depuis le checkpoint (QCM déjà raffinés sautés)
+    --no-cache           Ignore le cache des réponses LLM
+    --fixed-concurrency  Toujours MAX_WORKERS requêtes en vol (pas d'AIMD)
+    --ollama-hosts H1,H2 Instances Ollama (défaut: OLLAMA_HOSTS / OLLAMA_HOST)
 """
 
-import json, subprocess, os, tempfile
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+# Ajoute le chemin pour importer les modules partagés
+sys.path.append(str(Path(__file__).parent.parent))
+
+from ai_generation.llm_cache import configure_cache, get_cache
+from ai_generation.adaptive_concurrency import configure_limiter, get_limiter
+from ai_generation.ollama_pool import configure_pool, get_pool, hosts_from_argv
+from ai_generation.retry_policy import InvalidResponse, configure_retry, get_retry
+from ai_generation.generation_checkpoint import default_checkpoint_path
+from ai_generation.jsonl_stream import JsonlWriter, iter_jsonl
 
 IN_FILE = "src/data/questions/to_refine.json"
 OUT_FILE = "src/data/questions/to_refine_refined.json"
 MODEL = "mistral:latest"
+MAX_WORKERS = 4  # Plafond de requêtes simultanées (limite adaptative en dessous)
+OPTIONS = {"temperature": 0.7, "num_predict": 600}
 
 PROMPT_TEMPLATE = """Tu es un formateur IADE.
 
@@ -19,43 +46,140 @@ Améliore ce QCM sans changer la notion médicale ni la bonne réponse.
 - Reformule l'explication en 2 phrases précises et formatives.
 - Supprime tout placeholder ("Citation.", "..." ou vide).
 
-Retourne uniquement du JSON valide : 
+Retourne uniquement du JSON valide :
 {"text": "...", "options": ["...", "...", "...", "..."], "correctAnswer": X, "explanation": "...", "source_context": "..."}
 """
 
-if not os.path.exists(IN_FILE):
-    raise FileNotFoundError("❌ Fichier à raffiner introuvable")
-
-with open(IN_FILE) as f:
-    questions = json.load(f)
-
-refined = []
-for i, q in enumerate(questions, 1):
-    content = PROMPT_TEMPLATE + "\n\nQCM actuel :\n" + json.dumps(q, ensure_ascii=False)
-    cmd = ["ollama", "run", MODEL, content]
-    try:
-        result = subprocess.check_output(cmd, text=True, stderr=subprocess.DEVNULL)
-        # Parse JSON de la réponse
-        start = result.find("{")
-        end = result.rfind("}") + 1
-        if start >= 0 and end > start:
-            j = json.loads(result[start:end])
-            # Garde métadonnées originales
-            refined_q = q.copy()
-            refined_q.update(j)
-            refined_q['refined'] = True
-            refined.append(refined_q)
-            print(f"[{i}/{len(questions)}] ✅ {q.get('id', 'unknown')}")
-        else:
-            print(f"[{i}/{len(questions)}] ⚠️ JSON invalide")
-            refined.append(q)
-    except Exception as e:
-        print(f"[{i}/{len(questions)}] ⚠️ Erreur : {str(e)[:50]}")
-        refined.append(q)
-
-os.makedirs(os.path.dirname(OUT_FILE), exist_ok=True)
-with open(OUT_FILE, "w") as f:
-    json.dump(refined, f, indent=2, ensure_ascii=False)
-
-print(f"\n✅ {len(refined)} QCM raffinés enregistrés dans {OUT_FILE}")
+def question_key(q, index):
+    """Identifiant stable d'une question dans le checkpoint."""
+    return q.get("id") or f"#{index}"
+
+def parse_refined(content):
+    """
+    Décode la réponse du modèle.
+
+    Raises:
+        InvalidResponse si le JSON ne décrit pas un QCM complet
+    """
+    j = json.loads(content)
+    if not isinstance(j, dict):
+        raise InvalidResponse("réponse JSON non objet")
+
+    options = j.get("options")
+    if not j.get("text") or not j.get("explanation"):
+        raise InvalidResponse("question ou explication manquante")
+    if not isinstance(options, list) or len(options) != 4 or not all(isinstance(o, str) and o for o in options):
+        raise InvalidResponse("4 options attendues")
+
+    # "X" ou valeur hors bornes : on garde la bonne réponse d'origine
+    if j.get("correctAnswer") not in (0, 1, 2, 3):
+        j.pop("correctAnswer", None)
+    return j
+
+def refine_question(q):
+    """
+    Raffine un QCM (cache, retries, limite adaptative).
+
+    Returns:
+        QCM raffiné (métadonnées d'origine conservées), None si échec
+    """
+    user_prompt = "QCM actuel :\n" + json.dumps(q, ensure_ascii=False)
+
+    cache = get_cache()
+    cache_key = cache.make_key(MODEL, PROMPT_TEMPLATE, user_prompt, OPTIONS, format="json")
+
+    def attempt():
+        with get_limiter().slot(), get_pool().lease() as lease:
+            response = get_pool().client(lease.endpoint).chat(
+                model=MODEL,
+                messages=[
+                    {"role": "system", "content": PROMPT_TEMPLATE},
+                    {"role": "user", "content": user_prompt}
+                ],
+                format="json",
+                options=OPTIONS
+            )
+        content = response["message"]["content"].strip()
+        j = parse_refined(content)  # JSON invalide → retry (budget parse)
+        cache.put(cache_key, content, model=MODEL)
+        return j
+
+    j = None
+    cached = cache.get(cache_key)
+    if cached is not None:
+        try:
+            j = parse_refined(cached)
+        except ValueError:
+            j = None
+
+    if j is None:
+        try:
+            j = get_retry().call(attempt)
+        except Exception:
+            return None
+
+    # Garde métadonnées originales
+    refined_q = q.copy()
+    refined_q.update(j)
+    refined_q["refined"] = True
+    return refined_q
+
+def main():
+    if not os.path.exists(IN_FILE):
+        raise FileNotFoundError("❌ Fichier à raffiner introuvable")
+
+    with open(IN_FILE) as f:
+        questions = json.load(f)
+
+    cache = configure_cache(enabled="--no-cache" not in sys.argv)
+    limiter = configure_limiter(adaptive="--fixed-concurrency" not in sys.argv, max_limit=MAX_WORKERS)
+    pool = configure_pool(hosts_from_argv(sys.argv))
+    pool.check_health()
+    retry = configure_retry()
+
+    # Checkpoint : une ligne par QCM raffiné, reprise avec --resume
+    checkpoint_path = default_checkpoint_path(Path(OUT_FILE))
+    done = {}
+    if "--resume" in sys.argv and checkpoint_path.exists():
+        done = {entry["key"]: entry["question"] for entry in iter_jsonl(checkpoint_path)}
+        print(f"♻️  Reprise : {len(done)} QCM déjà raffinés")
+    checkpoint = JsonlWriter(checkpoint_path, append=bool(done))
+
+    refined = [done.get(question_key(q, i)) for i, q in enumerate(questions)]
+    pending = [i for i, r in enumerate(refined) if r is None]
+
+    # Requêtes concurrentes ; le limiteur borne les appels réels
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = {executor.submit(refine_question, questions[i]): i for i in pending}
+
+        for n, future in enumerate(as_completed(futures), 1):
+            i = futures[future]
+            q = questions[i]
+            result = future.result()
+            prefix = f"[{n}/{len(pending)}]"
+            if result:
+                refined[i] = result
+                checkpoint.write({"key": question_key(q, i), "question": result})
+                print(f"{prefix} ✅ {q.get('id', 'unknown')}")
+            else:
+                print(f"{prefix} ⚠️ Échec (QCM d'origine conservé) : {q.get('id', 'unknown')}")
+
+    checkpoint.close()
+
+    # Échecs : QCM d'origine conservé
+    failed = sum(1 for r in refined if r is None)
+    refined = [r if r is not None else q for q, r in zip(questions, refined)]
+
+    os.makedirs(os.path.dirname(OUT_FILE), exist_ok=True)
+    with open(OUT_FILE, "w") as f:
+        json.dump(refined, f, indent=2, ensure_ascii=False)
+
+    print(f"\n✅ {len(refined)} QCM raffinés enregistrés dans {OUT_FILE} ({failed} échecs)")
+    print(f"   Cache LLM : {cache.summary()}")
+    print(f"   Concurrence : {limiter.controller.summary()}")
+    print(f"   Instances Ollama : {pool.summary()}")
+    print(f"   Retries : {retry.summary()}")
+    print(f"   Checkpoint : {checkpoint_path}")
 
+if __name__ == "__main__":
+    main()
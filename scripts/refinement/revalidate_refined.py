@@ -3,29 +3,46 @@
 """
 IADE NEW — Revalidation BioBERT + fusion finale
 Recalcule les scores biomédicaux, sémantiques et fusionne avec le corpus complet.
+Le re-scoring BioBERT se fait dans ce processus (pas de fichier intermédiaire).
 """
 
-import json, os, subprocess
+import json, os, sys
+from pathlib import Path
+
+# Ajoute le chemin pour importer les modules partagés
+sys.path.append(str(Path(__file__).parent.parent))
+
+from ai_generation.biobert_client import BioBERTScorer, score_questions
 
 REFINED = "src/data/questions/to_refine_refined.json"
 COMPILED = "src/data/questions/compiled.json"
 FINAL = "src/data/questions/compiled_refined.json"
+METADATA = "src/data/metadata.json"
 
-if not all(os.path.exists(f) for f in [REFINED, COMPILED]):
+if not all(os.path.exists(f) for f in [REFINED, COMPILED, METADATA]):
     raise FileNotFoundError("❌ Fichiers manquants pour fusion")
 
 print("="*60)
 print("REVALIDATION & FUSION CORPUS RAFFINÉ")
 print("="*60)
 
-# Étape 1 : rescoring biomédical
+# Étape 1 : rescoring biomédical (en mémoire, sans fichier intermédiaire)
 print("\n🔬 Étape 1: Re-scoring BioBERT...")
-subprocess.run([
-    "python", "scripts/ai_generation/biobert_client.py",
-    "--in", REFINED,
-    "--out", "src/data/questions/to_refine_rescored.json",
-    "--metadata", "src/data/metadata.json"
-], check=True)
+with open(REFINED) as f2:
+    refined_data = json.load(f2)
+
+# Extraire les questions du refined (même structure potentielle)
+if isinstance(refined_data, dict) and 'questions' in refined_data:
+    refined = refined_data['questions']
+elif isinstance(refined_data, list):
+    refined = refined_data
+else:
+    refined = []
+
+with open(METADATA) as f3:
+    thresholds = json.load(f3).get('biomedical_thresholds', {})
+
+refined, _ = score_questions(refined, BioBERTScorer(), thresholds)
 
 print("\n✅ Re-scoring terminé")
 
@@ -34,9 +51,6 @@ print("\n🔀 Étape 2: Fusion avec corpus principal...")
 with open(COMPILED) as f1:
     base_data = json.load(f1)
 
-with open("src/data/questions/to_refine_rescored.json") as f2:
-    refined_data = json.load(f2)
-
 # Extraire les questions du compiled.json (structure avec métadonnées)
 if isinstance(base_data, dict) and 'questions' in base_data:
     base = base_data['questions']
@@ -45,14 +59,6 @@ else:
     base = base_data if isinstance(base_data, list) else []
     metadata = {}
 
-# Extraire les questions du refined (même structure potentielle)
-if isinstance(refined_data, dict) and 'questions' in refined_data:
-    refined = refined_data['questions']
-elif isinstance(refined_data, list):
-    refined = refined_data
-else:
-    refined = []
-
 # Crée un dict par ID pour faciliter merge
 base_dict = {q.get("id", q.get("chunk_id", i)): q for i, q in enumerate(base)}
 refined_dict = {q.get("id", q.get("chunk_id", i)): q for i, q in enumerate(refined)}
@@ -5,7 +5,8 @@ Tâche [024b] - Phase 2 : Indexation & Alignement
 
 Objectif:
 - Mesurer distance stylistique entre QCM générés et annales
-- Distance Levenshtein normalisée + similarité phrastique
+- Distance Levenshtein normalisée (tout le corpus contre toutes les annales)
+  + similarité phrastique
 - Auto-calibration des prompts si distance > 0.35
 
 Usage:
@@ -16,51 +17,29 @@ Usage:
 """
 
 import argparse
+import importlib.util
 import json
 import random
+import sys
 from pathlib import Path
 from typing import List, Dict, Tuple
 
 try:
-    from sentence_transformers import SentenceTransformer
     import numpy as np
+    # Vérifié sans l'importer (torch) : chargé à la demande par le stockage d'embeddings
+    if importlib.util.find_spec("sentence_transformers") is None:
+        raise ImportError("sentence_transformers")
 except ImportError:
     print("❌ Dépendances manquantes. Installez: pip install sentence-transformers numpy")
     exit(1)
 
-# =============================================================================
-# DISTANCE LEVENSHTEIN
-# =============================================================================
+# Ajoute le chemin pour importer les modules partagés
+sys.path.append(str(Path(__file__).parent.parent))
 
-def levenshtein_distance(s1: str, s2: str) -> int:
-    """Calcule la distance de Levenshtein entre deux chaînes."""
-    if len(s1) < len(s2):
-        return levenshtein_distance(s2, s1)
-    
-    if len(s2) == 0:
-        return len(s1)
-    
-    previous_row = range(len(s2) + 1)
-    
-    for i, c1 in enumerate(s1):
-        current_row = [i + 1]
-        for j, c2 in enumerate(s2):
-            insertions = previous_row[j + 1] + 1
-            deletions = current_row[j] + 1
-            substitutions = previous_row[j] + (c1 != c2)
-            current_row.append(min(insertions, deletions, substitutions))
-        previous_row = current_row
-    
-    return previous_row[-1]
-
-def normalized_levenshtein(s1: str, s2: str) -> float:
-    """
-    Distance de Levenshtein normalisée (0-1).
-    0 = identique, 1 = complètement différent
-    """
-    distance = levenshtein_distance(s1, s2)
-    max_len = max(len(s1), len(s2))
-    return distance / max_len if max_len > 0 else 0.0
+from ai_generation.embedding_store import get_embedding_store
+from ai_generation.edit_distance import (  # noqa: F401 (levenshtein_distance, normalized_levenshtein réexportés)
+    levenshtein_distance, nearest_distances, normalized_levenshtein
+)
 
 # =============================================================================
 # SIMILARITÉ PHRASTIQUE
@@ -108,7 +87,8 @@ def validate_stylistic_match(
     Args:
         questions: Liste de questions générées (dicts avec 'text')
         annales_samples: Liste de questions des annales
-        sample_size: Nombre de questions à échantillonner
+        sample_size: Nombre de questions à échantillonner (longueur, similarité
+            phrastique ; la distance Levenshtein porte sur tout le corpus)
     
     Returns:
         Stats de validation avec distances
@@ -118,26 +98,21 @@ def validate_stylistic_match(
     # Échantillonnage
     sample_generated = random.sample(questions, min(sample_size, len(questions)))
     
-    # 1. Distance Levenshtein
-    print("   Calcul distances Levenshtein...")
-    levenshtein_distances = []
-    
-    for q in sample_generated[:20]:  # Limite à 20 pour performance
-        q_text = q.get('text', '')
-        
-        # Compare avec toutes les questions annales, prend la plus proche
-        if annales_samples:
-            distances = [normalized_levenshtein(q_text, annale) for annale in annales_samples]
-            min_distance = min(distances)
-            levenshtein_distances.append(min_distance)
+    # 1. Distance Levenshtein (tout le corpus × toutes les annales, tous les cœurs)
+    print(f"   Calcul distances Levenshtein ({len(questions)} × {len(annales_samples)}, rapidfuzz)...")
     
-    avg_levenshtein = np.mean(levenshtein_distances) if levenshtein_distances else 1.0
+    # Compare avec toutes les questions annales, prend la plus proche
+    if annales_samples and questions:
+        levenshtein_distances = nearest_distances([q.get('text', '') for q in questions], annales_samples)
+        avg_levenshtein = float(levenshtein_distances.mean())
+    else:
+        avg_levenshtein = 1.0
     
     # 2. Similarité phrastique (sentence-transformers)
     print("   Calcul similarité sémantique...")
     
-    # Charge modèle léger pour similarité
-    model = SentenceTransformer('all-MiniLM-L6-v2')
+    # Modèle léger pour similarité (embeddings persistés, chargé à la demande)
+    model = get_embedding_store('all-MiniLM-L6-v2')
     
     generated_texts = [q.get('text', '') for q in sample_generated[:30]]
     
@@ -160,6 +135,7 @@ def validate_stylistic_match(
     
     stats = {
         'sample_size': len(sample_generated),
+        'levenshtein_questions': len(questions),
         'avg_levenshtein_distance': float(avg_levenshtein),
         'avg_semantic_similarity': float(semantic_sim),
         'avg_length_generated': float(avg_length_generated),
@@ -4,19 +4,32 @@
 AUDIT COMPLET DU CORPUS - Phase 11
 Vérifie CHAQUE question et s'assure que la page source contient réellement
 les informations de la question. Corrige automatiquement les erreurs.
+
+Note : la vérification reste par mots-clés, mais le script charge MiniLM
+(sentence-transformers requis) et indexe au démarrage les pages de TOUS les
+PDF de cours (page_index, cache/page_index/) pour présélectionner les pages
+candidates. Le premier run encode tout le corpus ; les suivants ne
+réencodent que les PDF modifiés.
 """
 
 import json
+import sys
 import fitz
 from pathlib import Path
 from collections import defaultdict
 import re
 
+# Ajoute le chemin pour importer les modules partagés
+sys.path.append(str(Path(__file__).parent.parent))
+
+from ai_generation.page_index import get_page_index
+
 # Configuration
 CORPUS_FILE = Path("src/data/questions/compiled_refined_aligned.json")
 OUTPUT_FILE = Path("src/data/questions/compiled_verified.json")
 REPORT_FILE = Path("reports/full_corpus_audit_report.json")
 PDF_DIR = Path("public/pdfs")
+CANDIDATE_PAGES = 50  # Pages proposées par l'index sémantique (tous PDF confondus)
 
 def extract_keywords(text):
     """Extrait les mots-clés significatifs d'un texte"""
@@ -27,8 +40,14 @@ def extract_keywords(text):
     keywords = [w for w in words if len(w) >= 4 and w not in stopwords]
     return keywords[:10]  # Top 10
 
-def search_best_page(pdf_path, keywords, current_page=None):
-    """Trouve la meilleure page pour un ensemble de mots-clés"""
+def candidate_pages(page_index, pdf_name, full_text):
+    """Pages du PDF les plus proches sémantiquement (None = parcourir tout le PDF)"""
+    hits = page_index.query([full_text], k=CANDIDATE_PAGES)[0]
+    pages = [hit['page'] for hit in hits if hit['pdf'] == pdf_name]
+    return pages or None
+
+def search_best_page(pdf_path, keywords, current_page=None, pages=None):
+    """Trouve la meilleure page pour un ensemble de mots-clés (pages : candidates, défaut toutes)"""
     if not pdf_path.exists():
         return None, 0
     
@@ -36,7 +55,8 @@ def search_best_page(pdf_path, keywords, current_page=None):
     
     try:
         with fitz.open(pdf_path) as doc:
-            for page_num in range(len(doc)):
+            page_nums = [p - 1 for p in pages if 1 <= p <= len(doc)] if pages else range(len(doc))
+            for page_num in page_nums:
                 page = doc[page_num]
                 text = page.get_text('text').lower()
                 
@@ -102,6 +122,11 @@ def main():
     corrections = []
     no_match = []
     
+    # Index des pages : la recherche de correction ne parcourt que les pages candidates
+    print("\n📚 Index des pages PDF...")
+    page_index = get_page_index()
+    print(f"   ✓ {page_index.summary()}")
+    
     print("\n🔄 Vérification en cours...\n")
     
     for i, q in enumerate(questions, 1):
@@ -135,7 +160,8 @@ def main():
             q['page_verification_score'] = round(current_score, 3)
         else:
             # Cherche la meilleure page
-            best_page, best_score = search_best_page(pdf_path, keywords, current_page)
+            pages = candidate_pages(page_index, current_pdf, full_text)
+            best_page, best_score = search_best_page(pdf_path, keywords, current_page, pages)
             
             if best_score > 0 and best_page != current_page:
                 # Correction trouvée